@@ -0,0 +1,200 @@
+'''
+Standard nonlinear programming test problems for benchmarking PySLSQP.
+
+Each problem is returned as a dictionary with the arguments for ``optimize()``,
+i.e., 'x0', 'obj', 'grad', 'con', 'jac', 'meq', 'xl', 'xu', and 'maxiter' (where needed), along with the 'name' of the problem
+and the known optimal objective value 'f_opt'.
+All the derivatives are analytic so that the number of evaluations only depends on the optimizer.
+Constraints follow the SLSQP convention: equality constraints first, then inequality constraints c(x) >= 0.
+
+The problems include a subset of the Hock-Schittkowski test problems [1], the chained Rosenbrock function,
+and scalable convex quadratic programs with equality and inequality constraints or only bounds.
+
+References
+----------
+.. [1] W. Hock and K. Schittkowski, Test Examples for Nonlinear Programming Codes,
+       Lecture Notes in Economics and Mathematical Systems, vol. 187, Springer, 1981.
+'''
+import numpy as np
+
+def hs006():
+    return dict(name='hs006', x0=np.array([-1.2, 1.]), meq=1, f_opt=0.,
+                obj=lambda x: (1 - x[0])**2,
+                grad=lambda x: np.array([-2 * (1 - x[0]), 0.]),
+                con=lambda x: np.array([10 * (x[1] - x[0]**2)]),
+                jac=lambda x: np.array([[-20 * x[0], 10.]]))
+
+def hs007():
+    return dict(name='hs007', x0=np.array([2., 2.]), meq=1, f_opt=-np.sqrt(3.),
+                obj=lambda x: np.log(1 + x[0]**2) - x[1],
+                grad=lambda x: np.array([2 * x[0] / (1 + x[0]**2), -1.]),
+                con=lambda x: np.array([(1 + x[0]**2)**2 + x[1]**2 - 4]),
+                jac=lambda x: np.array([[4 * x[0] * (1 + x[0]**2), 2 * x[1]]]))
+
+def hs014():
+    return dict(name='hs014', x0=np.array([2., 2.]), meq=1, f_opt=9 - 23 * np.sqrt(7) / 8,
+                obj=lambda x: (x[0] - 2)**2 + (x[1] - 1)**2,
+                grad=lambda x: np.array([2 * (x[0] - 2), 2 * (x[1] - 1)]),
+                con=lambda x: np.array([x[0] - 2 * x[1] + 1,
+                                        -x[0]**2 / 4 - x[1]**2 + 1]),
+                jac=lambda x: np.array([[1., -2.],
+                                        [-x[0] / 2, -2 * x[1]]]))
+
+def hs021():
+    return dict(name='hs021', x0=np.array([-1., -1.]), meq=0, f_opt=-99.96,
+                xl=np.array([2., -50.]), xu=np.array([50., 50.]),
+                obj=lambda x: 0.01 * x[0]**2 + x[1]**2 - 100,
+                grad=lambda x: np.array([0.02 * x[0], 2 * x[1]]),
+                con=lambda x: np.array([10 * x[0] - x[1] - 10]),
+                jac=lambda x: np.array([[10., -1.]]))
+
+def hs028():
+    return dict(name='hs028', x0=np.array([-4., 1., 1.]), meq=1, f_opt=0.,
+                obj=lambda x: (x[0] + x[1])**2 + (x[1] + x[2])**2,
+                grad=lambda x: np.array([2 * (x[0] + x[1]), 2 * (x[0] + x[1]) + 2 * (x[1] + x[2]), 2 * (x[1] + x[2])]),
+                con=lambda x: np.array([x[0] + 2 * x[1] + 3 * x[2] - 1]),
+                jac=lambda x: np.array([[1., 2., 3.]]))
+
+def hs035():
+    return dict(name='hs035', x0=np.array([0.5, 0.5, 0.5]), meq=0, f_opt=1. / 9., xl=0.,
+                obj=lambda x: 9 - 8 * x[0] - 6 * x[1] - 4 * x[2] + 2 * x[0]**2 + 2 * x[1]**2 + x[2]**2
+                              + 2 * x[0] * x[1] + 2 * x[0] * x[2],
+                grad=lambda x: np.array([-8 + 4 * x[0] + 2 * x[1] + 2 * x[2],
+                                         -6 + 4 * x[1] + 2 * x[0],
+                                         -4 + 2 * x[2] + 2 * x[0]]),
+                con=lambda x: np.array([3 - x[0] - x[1] - 2 * x[2]]),
+                jac=lambda x: np.array([[-1., -1., -2.]]))
+
+def hs038():
+    def obj(x):
+        return (100 * (x[1] - x[0]**2)**2 + (1 - x[0])**2 + 90 * (x[3] - x[2]**2)**2 + (1 - x[2])**2
+                + 10.1 * ((x[1] - 1)**2 + (x[3] - 1)**2) + 19.8 * (x[1] - 1) * (x[3] - 1))
+    def grad(x):
+        return np.array([-400 * x[0] * (x[1] - x[0]**2) - 2 * (1 - x[0]),
+                         200 * (x[1] - x[0]**2) + 20.2 * (x[1] - 1) + 19.8 * (x[3] - 1),
+                         -360 * x[2] * (x[3] - x[2]**2) - 2 * (1 - x[2]),
+                         180 * (x[3] - x[2]**2) + 20.2 * (x[3] - 1) + 19.8 * (x[1] - 1)])
+    return dict(name='hs038', x0=np.array([-3., -1., -3., -1.]), meq=0, f_opt=0., xl=-10., xu=10., obj=obj, grad=grad)
+
+def hs043():
+    def con(x):
+        return np.array([8 - x[0]**2 - x[1]**2 - x[2]**2 - x[3]**2 - x[0] + x[1] - x[2] + x[3],
+                         10 - x[0]**2 - 2 * x[1]**2 - x[2]**2 - 2 * x[3]**2 + x[0] + x[3],
+                         5 - 2 * x[0]**2 - x[1]**2 - x[2]**2 - 2 * x[0] + x[1] + x[3]])
+    def jac(x):
+        return np.array([[-2 * x[0] - 1, -2 * x[1] + 1, -2 * x[2] - 1, -2 * x[3] + 1],
+                         [-2 * x[0] + 1, -4 * x[1], -2 * x[2], -4 * x[3] + 1],
+                         [-4 * x[0] - 2, -2 * x[1] + 1, -2 * x[2], 1.]])
+    return dict(name='hs043', x0=np.zeros(4), meq=0, f_opt=-44.,
+                obj=lambda x: x[0]**2 + x[1]**2 + 2 * x[2]**2 + x[3]**2 - 5 * x[0] - 5 * x[1] - 21 * x[2] + 7 * x[3],
+                grad=lambda x: np.array([2 * x[0] - 5, 2 * x[1] - 5, 4 * x[2] - 21, 2 * x[3] + 7]),
+                con=con, jac=jac)
+
+def hs048():
+    return dict(name='hs048', x0=np.array([3., 5., -3., 2., -2.]), meq=2, f_opt=0.,
+                obj=lambda x: (x[0] - 1)**2 + (x[1] - x[2])**2 + (x[3] - x[4])**2,
+                grad=lambda x: np.array([2 * (x[0] - 1), 2 * (x[1] - x[2]), -2 * (x[1] - x[2]), 2 * (x[3] - x[4]), -2 * (x[3] - x[4])]),
+                con=lambda x: np.array([np.sum(x) - 5, x[2] - 2 * (x[3] + x[4]) + 3]),
+                jac=lambda x: np.array([[1., 1., 1., 1., 1.],
+                                        [0., 0., 1., -2., -2.]]))
+
+def hs071():
+    def jac(x):
+        return np.array([2 * x,
+                         [x[1] * x[2] * x[3], x[0] * x[2] * x[3], x[0] * x[1] * x[3], x[0] * x[1] * x[2]]])
+    return dict(name='hs071', x0=np.array([1., 5., 5., 1.]), meq=1, f_opt=17.0140173, xl=1., xu=5.,
+                obj=lambda x: x[0] * x[3] * (x[0] + x[1] + x[2]) + x[2],
+                grad=lambda x: np.array([x[3] * (2 * x[0] + x[1] + x[2]), x[0] * x[3], x[0] * x[3] + 1, x[0] * (x[0] + x[1] + x[2])]),
+                con=lambda x: np.array([np.sum(x**2) - 40, np.prod(x) - 25]),
+                jac=jac)
+
+def hs076():
+    return dict(name='hs076', x0=np.array([0.5, 0.5, 0.5, 0.5]), meq=0, f_opt=-4.681818181, xl=0.,
+                obj=lambda x: x[0]**2 + 0.5 * x[1]**2 + x[2]**2 + 0.5 * x[3]**2 - x[0] * x[2] + x[2] * x[3]
+                              - x[0] - 3 * x[1] + x[2] - x[3],
+                grad=lambda x: np.array([2 * x[0] - x[2] - 1, x[1] - 3, 2 * x[2] - x[0] + x[3] + 1, x[3] + x[2] - 1]),
+                con=lambda x: np.array([5 - x[0] - 2 * x[1] - x[2] - x[3],
+                                        4 - 3 * x[0] - x[1] - 2 * x[2] + x[3],
+                                        x[1] + 4 * x[2] - 1.5]),
+                jac=lambda x: np.array([[-1., -2., -1., -1.],
+                                        [-3., -1., -2., 1.],
+                                        [0., 1., 4., 0.]]))
+
+def hs100():
+    def obj(x):
+        return ((x[0] - 10)**2 + 5 * (x[1] - 12)**2 + x[2]**4 + 3 * (x[3] - 11)**2 + 10 * x[4]**6
+                + 7 * x[5]**2 + x[6]**4 - 4 * x[5] * x[6] - 10 * x[5] - 8 * x[6])
+    def grad(x):
+        return np.array([2 * (x[0] - 10), 10 * (x[1] - 12), 4 * x[2]**3, 6 * (x[3] - 11), 60 * x[4]**5,
+                         14 * x[5] - 4 * x[6] - 10, 4 * x[6]**3 - 4 * x[5] - 8])
+    def con(x):
+        return np.array([127 - 2 * x[0]**2 - 3 * x[1]**4 - x[2] - 4 * x[3]**2 - 5 * x[4],
+                         282 - 7 * x[0] - 3 * x[1] - 10 * x[2]**2 - x[3] + x[4],
+                         196 - 23 * x[0] - x[1]**2 - 6 * x[5]**2 + 8 * x[6],
+                         -4 * x[0]**2 - x[1]**2 + 3 * x[0] * x[1] - 2 * x[2]**2 - 5 * x[5] + 11 * x[6]])
+    def jac(x):
+        return np.array([[-4 * x[0], -12 * x[1]**3, -1., -8 * x[3], -5., 0., 0.],
+                         [-7., -3., -20 * x[2], -1., 1., 0., 0.],
+                         [-23., -2 * x[1], 0., 0., 0., -12 * x[5], 8.],
+                         [-8 * x[0] + 3 * x[1], -2 * x[1] + 3 * x[0], -4 * x[2], 0., 0., -5., 11.]])
+    return dict(name='hs100', x0=np.array([1., 2., 0., 4., 0., 1., 1.]), meq=0, f_opt=680.6300573,
+                obj=obj, grad=grad, con=con, jac=jac)
+
+def rosenbrock(n):
+    '''
+    Unconstrained chained Rosenbrock function of n variables.
+    '''
+    def obj(x):
+        return np.sum(100 * (x[1:] - x[:-1]**2)**2 + (1 - x[:-1])**2)
+    def grad(x):
+        g = np.zeros_like(x)
+        g[:-1] = -400 * x[:-1] * (x[1:] - x[:-1]**2) - 2 * (1 - x[:-1])
+        g[1:] += 200 * (x[1:] - x[:-1]**2)
+        return g
+    x0 = np.tile([-1.2, 1.], n // 2 + 1)[:n]
+    return dict(name=f'rosenbrock_{n}', x0=x0, meq=0, f_opt=0., obj=obj, grad=grad, maxiter=500)
+
+def _quadratic(n, seed):
+    '''
+    Return the Hessian, the linear term, and the random generator for a strictly convex quadratic objective.
+    '''
+    rng = np.random.default_rng(seed)
+    Q = 4 * np.eye(n) - np.eye(n, k=1) - np.eye(n, k=-1) # Tridiagonal, symmetric positive definite
+    q = rng.standard_normal(n)
+    return Q, q, rng
+
+def qp(n, m, meq, seed=0):
+    '''
+    Strictly convex quadratic program of n variables with meq linear equality and (m - meq) linear inequality constraints.
+    The optimal objective value is not known in closed form and is None.
+    '''
+    Q, q, rng = _quadratic(n, seed)
+    A = rng.standard_normal((m, n))
+    # The constraints are satisfied at a random point so that the problem is feasible
+    b = A @ rng.standard_normal(n)
+    b[meq:] -= 1.
+    return dict(name=f'qp_{n}_{m}_{meq}', x0=np.zeros(n), meq=meq, f_opt=None,
+                obj=lambda x: 0.5 * x @ Q @ x + q @ x,
+                grad=lambda x: Q @ x + q,
+                con=lambda x: A @ x - b,
+                jac=lambda x: A)
+
+def bound_qp(n, seed=0):
+    '''
+    Strictly convex quadratic objective of n variables with only bounds, about half of which are active at the optimum.
+    '''
+    Q, q, rng = _quadratic(n, seed)
+    q = 4 * q
+    return dict(name=f'bound_qp_{n}', x0=np.zeros(n), meq=0, f_opt=None, xl=-0.5, xu=0.5,
+                obj=lambda x: 0.5 * x @ Q @ x + q @ x,
+                grad=lambda x: Q @ x + q)
+
+def get_problems():
+    '''
+    Return the list of all the benchmark problems.
+    '''
+    problems = [hs006(), hs007(), hs014(), hs021(), hs028(), hs035(), hs038(), hs043(), hs048(), hs071(), hs076(), hs100()]
+    problems += [rosenbrock(n) for n in [2, 10, 50]]
+    problems += [qp(20, 10, 5), qp(100, 50, 20), qp(200, 100, 0)]
+    problems += [bound_qp(n) for n in [50, 200]]
+    return problems
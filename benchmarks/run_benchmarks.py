@@ -0,0 +1,182 @@
+'''
+Run the benchmark problems and compare the results with a saved baseline to catch performance regressions.
+
+For each problem, the number of function and derivative evaluations, the number of major iterations, and
+the median of the optimizer, processing, function evaluation, and derivative evaluation times over
+a number of repeated runs are recorded.
+The evaluation and iteration counts only depend on the Fortran build and the wrapper,
+while the times also depend on the machine. The committed baseline therefore only contains the counts;
+save a baseline with ``--save-baseline --with-times`` on the machine used for comparing the times.
+Note that the counts can also differ slightly across compilers and platforms.
+
+Usage
+-----
+    python benchmarks/run_benchmarks.py                     # Run and compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline     # Run and save the counts as the new baseline
+    python benchmarks/run_benchmarks.py --save-baseline --with-times --baseline local.json # Also save the times and machine info
+    python benchmarks/run_benchmarks.py --counts-only       # Compare only the evaluation and iteration counts
+    python benchmarks/run_benchmarks.py --problems hs rosen # Run only the problems with names containing 'hs' or 'rosen'
+
+The script exits with a nonzero status if any regression is found.
+It can be run from a checkout without installing pyslsqp, provided the Fortran extension is built in place;
+an installed pyslsqp takes precedence over the checkout.
+'''
+import os
+import sys
+import io
+import json
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Fall back to the package in the checkout if pyslsqp is not installed (the Fortran extension must be built in place)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from problems import get_problems
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+COUNTS = ['nfev', 'ngev', 'num_majiter']
+TIMES  = ['optimizer_time', 'processing_time', 'fev_time', 'gev_time', 'total_time']
+
+def run_problem(problem, repeat=3, **options):
+    '''
+    Solve the problem ``repeat`` times and return the record of the results.
+    The counts are taken from the first run and the times are the medians over all the runs.
+    '''
+    from pyslsqp import optimize
+    kwargs = {key: value for key, value in problem.items() if key not in ['name', 'f_opt', 'x0']}
+    kwargs.update(options)
+    runs = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        summary_filename = os.path.join(tmpdir, 'slsqp_summary.out')
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs.append(optimize(problem['x0'], iprint=0, summary_filename=summary_filename, **kwargs))
+
+    results = runs[0]
+    record = {'n': len(problem['x0']), 'm': len(results['constraints']), 'meq': problem['meq'],
+              'success': bool(results['success']), 'objective': float(results['objective'])}
+    record['error'] = None if problem['f_opt'] is None else abs(float(results['objective']) - problem['f_opt'])
+    for key in COUNTS:
+        record[key] = int(results[key])
+    for key in TIMES:
+        record[key] = float(np.median([run[key] for run in runs]))
+    return record
+
+def run_benchmarks(problems=None, repeat=3, **options):
+    '''
+    Run all the problems (or the given list of problems) and return the records with the environment information.
+    '''
+    import pyslsqp
+    if problems is None:
+        problems = get_problems()
+    records = {}
+    for problem in problems:
+        records[problem['name']] = run_problem(problem, repeat=repeat, **options)
+
+    info = {'pyslsqp': pyslsqp.__version__, 'numpy': np.__version__, 'python': platform.python_version(),
+            'platform': platform.platform(), 'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d'), 'repeat': repeat}
+    return {'info': info, 'problems': records}
+
+def get_baseline(results, with_times=False):
+    '''
+    Return the baseline to save from the results. 
+    Unless ``with_times`` is True, the times and the machine information are removed so that only the counts are kept.
+    '''
+    if with_times:
+        return results
+    problems = {name: {key: value for key, value in record.items() if key not in TIMES}
+                for name, record in results['problems'].items()}
+    return {'info': {'pyslsqp': results['info']['pyslsqp']}, 'problems': problems}
+
+def compare(results, baseline, count_tol=0.0, time_tol=1.5, time_floor=1e-3, counts_only=False):
+    '''
+    Compare the results with the baseline and return the list of regressions as strings.
+
+    A count is a regression if it is larger than ``(1 + count_tol)`` times the baseline count.
+    A time is a regression if it is larger than ``time_tol`` times the baseline time plus ``time_floor`` seconds,
+    where the floor prevents flagging the noise in very short times.
+    Problems that are not in the baseline, and times that are not in the baseline, are ignored.
+    '''
+    regressions = []
+    for name, record in results['problems'].items():
+        if name not in baseline['problems']:
+            continue
+        base = baseline['problems'][name]
+        if base['success'] and not record['success']:
+            regressions.append(f"{name}: failed to converge")
+        for key in COUNTS:
+            if record[key] > (1 + count_tol) * base[key]:
+                regressions.append(f"{name}: {key} increased from {base[key]} to {record[key]}")
+        if counts_only:
+            continue
+        for key in TIMES:
+            if key in base and record[key] > time_tol * base[key] + time_floor:
+                regressions.append(f"{name}: {key} increased from {base[key]:.6f} s to {record[key]:.6f} s")
+    return regressions
+
+def print_results(results, baseline=None):
+    '''
+    Print the results as a table with the baseline counts in parentheses if a baseline is given.
+    '''
+    header = "%-16s %4s %4s %7s %12s %12s %12s %10s %10s %10s" % ('problem', 'n', 'm', 'success', 'nfev', 'ngev', 'majiter',
+                                                                 'opt [ms]', 'proc [ms]', 'fev [ms]')
+    print(header)
+    print('-' * len(header))
+    for name, record in results['problems'].items():
+        counts = []
+        for key in COUNTS:
+            if baseline is not None and name in baseline['problems']:
+                counts.append(f"{record[key]} ({baseline['problems'][name][key]})")
+            else:
+                counts.append(str(record[key]))
+        print("%-16s %4i %4i %7s %12s %12s %12s %10.3f %10.3f %10.3f" % (name, record['n'], record['m'], record['success'], *counts,
+                                                                        record['optimizer_time']*1e3, record['processing_time']*1e3, record['fev_time']*1e3))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the PySLSQP benchmarks and compare with a baseline.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Path to the baseline JSON file.')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline.')
+    parser.add_argument('--with-times', action='store_true', help='Save the times and the machine information in the baseline.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per problem for the timings.')
+    parser.add_argument('--problems', nargs='*', default=None, help='Run only the problems with names containing any of these strings.')
+    parser.add_argument('--counts-only', action='store_true', help='Compare only the evaluation and iteration counts.')
+    parser.add_argument('--count-tol', type=float, default=0.0, help='Allowed relative increase in the counts.')
+    parser.add_argument('--time-tol', type=float, default=1.5, help='Allowed ratio of the times to the baseline times.')
+    args = parser.parse_args(argv)
+
+    problems = get_problems()
+    if args.problems:
+        problems = [problem for problem in problems if any(name in problem['name'] for name in args.problems)]
+    results = run_benchmarks(problems, repeat=args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(get_baseline(results, with_times=args.with_times), f, indent=2)
+        print_results(results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if baseline is None:
+        print(f"Baseline {args.baseline} not found. Run with --save-baseline to create it.")
+        return 0
+
+    regressions = compare(results, baseline, count_tol=args.count_tol, time_tol=args.time_tol, counts_only=args.counts_only)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) found compared to the baseline:")
+        for regression in regressions:
+            print("    " + regression)
+        return 1
+    print("\nNo regressions found compared to the baseline.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,5 @@
 __version__ = '0.1.3-dev'
 
-from pyslsqp.main import optimize, get_default_options
\ No newline at end of file
+from pyslsqp.main import optimize, get_default_options
+from pyslsqp.solver import Solver, BatchSolver
+from pyslsqp.parallel import optimize_many, multistart
\ No newline at end of file
@@ -0,0 +1,142 @@
+EVENT_TYPES = ['eval_start', 'eval_end', 'solver_call', 'major_iter', 'record_write', 'plot_update']
+
+class Event:
+    '''
+    Event emitted by ``optimize()`` to the listeners registered in an ``EventStream``.
+
+    Attributes
+    ----------
+    type : str
+        Type of the event. One of
+
+            - 'eval_start'   : start of a function ('funcs') or derivative ('derivs') evaluation
+            - 'eval_end'     : end of a function or derivative evaluation
+            - 'solver_call'  : call to the SLSQP Fortran subroutine
+            - 'major_iter'   : completion of a major iteration
+            - 'record_write' : saving of an iteration to the recorder
+            - 'plot_update'  : update of the plot
+    start : int
+        Start time of the event from ``time.perf_counter_ns()`` [ns].
+    end : int
+        End time of the event from ``time.perf_counter_ns()`` [ns].
+        Same as ``start`` for 'eval_start' and 'major_iter' events.
+    iter : int
+        Iteration number when the event occurred.
+    majiter : int
+        Major iteration number when the event occurred.
+    nbytes : int
+        Size of the payload of the event [bytes], i.e., the size of x for 'eval_start',
+        the size of the computed values for 'eval_end', the size of the arrays passed to SLSQP for 'solver_call',
+        and the size of the saved variables for 'record_write'.
+    data : dict
+        Additional information depending on the type of the event, e.g.,
+        ``{'kind': 'funcs'}`` for evaluation events, ``{'mode': mode}`` for 'solver_call' events,
+        and the objective, optimality, feasibility, nfev, and ngev for 'major_iter' events.
+    '''
+    __slots__ = ['type', 'start', 'end', 'iter', 'majiter', 'nbytes', 'data']
+
+    def __init__(self, type, start, end=None, iter=0, majiter=0, nbytes=0, data=None):
+        self.type = type
+        self.start = start
+        self.end = start if end is None else end
+        self.iter = iter
+        self.majiter = majiter
+        self.nbytes = nbytes
+        self.data = {} if data is None else data
+
+    @property
+    def duration(self):
+        '''
+        Duration of the event [ns].
+        '''
+        return self.end - self.start
+
+    def to_dict(self):
+        '''
+        Return the event as a dictionary, e.g., for serializing to JSON.
+        '''
+        return {'type': self.type, 'start': self.start, 'end': self.end, 'iter': self.iter, 'majiter': self.majiter,
+                'nbytes': self.nbytes, **self.data}
+
+    def __repr__(self):
+        return (f"Event(type={self.type!r}, start={self.start}, duration={self.duration}, iter={self.iter}, "
+                f"majiter={self.majiter}, nbytes={self.nbytes}, data={self.data})")
+
+class EventStream:
+    '''
+    Stream of the events emitted during an optimization for instrumenting and monitoring the optimization.
+    Listeners are callables that are called as ``listener(event)`` with an ``Event`` for each event of the types
+    they are subscribed to. Listeners are called synchronously by the optimization, so they should return quickly.
+    Events are created only for the types with at least one listener,
+    so the overhead of the stream is negligible for the other types.
+    Pass the stream to ``optimize()`` as ``event_stream``.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import optimize
+    >>> from pyslsqp.events import EventStream
+    >>> stream = EventStream()
+    >>> majors = []
+    >>> stream.subscribe(majors.append, 'major_iter')
+    >>> evals = []
+    >>> stream.subscribe(evals.append, ['eval_end'])
+    >>> results = optimize(np.array([0.5, 0.5]), obj=lambda x: np.sum(x**2), grad=lambda x: 2*x, iprint=0, event_stream=stream)
+    No constraints defined. Running an unconstrained optimization problem...
+    >>> len(majors) == results['num_majiter']
+    True
+    >>> len(evals) == results['nfev'] + results['ngev']
+    True
+    >>> majors[-1].data['objective']
+    0.0
+    '''
+    def __init__(self):
+        self.listeners = {}
+
+    def subscribe(self, listener, types=None):
+        '''
+        Register the listener for the given event types.
+
+        Parameters
+        ----------
+        listener : callable
+            Function called as ``listener(event)`` for each event.
+        types : str or list of str, default=None
+            Types of events to listen to. If None, the listener is registered for all types.
+        '''
+        if not callable(listener):
+            raise TypeError("listener must be callable.")
+        if types is None:
+            types = EVENT_TYPES
+        elif isinstance(types, str):
+            types = [types]
+        for type in types:
+            if type not in EVENT_TYPES:
+                raise ValueError(f"Invalid event type {type}. Must be one of {EVENT_TYPES}.")
+            self.listeners.setdefault(type, []).append(listener)
+
+    def unsubscribe(self, listener):
+        '''
+        Remove the listener from all event types.
+        '''
+        for type in list(self.listeners):
+            self.listeners[type] = [l for l in self.listeners[type] if l is not listener]
+            if not self.listeners[type]:
+                del self.listeners[type]
+
+    def wants(self, type):
+        '''
+        Return True if any listener is subscribed to the given event type.
+        '''
+        return type in self.listeners
+
+    def emit(self, type, start, end=None, iter=0, majiter=0, nbytes=0, **data):
+        '''
+        Create an event and call the listeners subscribed to its type.
+        '''
+        listeners = self.listeners.get(type)
+        if not listeners:
+            return
+        event = Event(type, start, end, iter, majiter, nbytes, data)
+        for listener in listeners:
+            listener(event)
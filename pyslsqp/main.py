@@ -18,71 +18,215 @@ The original algorithm is described in the following papers:
 
 import warnings
 import os, sys
+import shutil
 import time
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
 from numpy import array, isfinite, linalg
 
 _epsilon = np.sqrt(np.finfo(float).eps)
+_cs_step  = 1e-30 # Step size for complex-step derivatives, free of subtractive cancellation errors
 
-from pyslsqp.save_and_load import save_iteration
+from pyslsqp.save_and_load import open_recorder_file, NpyFile, get_num_saves, load_iterate, load_all_iterates, get_saved_vars, EvaluationStore, Recorder, AsyncRecorder, SummaryWriter, _import_h5py
 from pyslsqp._slsqp import slsqp
-from pyslsqp.visualize import Visualizer
+from pyslsqp.visualize import Visualizer, ProcessVisualizer
+from pyslsqp.events import EventStream
 # from visualize_plotly import Visualizer
 # from visualize_plotly_tabs import Visualizer
 
-try:
-    import h5py
-except ImportError:
-    warnings.warn("h5py not found, saving and loading data disabled")
-    h5py = None
-
 
 class Problem:
     '''
     Container class for optimization objective, constraints, gradient, and Jacobian functions.
     Keeps track of the number of function and gradient evaluations and time taken for each.
-    Caches the function and derivatives values for the same input x to avoid redundant, consecutive evaluations.
+    Caches the function and derivatives values for the ``cache_size`` most recently used inputs x 
+    to avoid redundant evaluations, e.g., when a line search backtracks to a previous iterate.
+    Cached points are evicted in least-recently-used order.
+    If ``cache_tol`` > 0, a cached point within ``cache_tol`` of x (in the infinity norm) is also treated as a match.
+    The objective and constraints can optionally be computed together by ``funcs(x) -> (f, c)``,
+    the gradient and Jacobian by ``derivs(x) -> (g, j)``, and all four by ``evaluate_all(x) -> (f, c, g, j)``.
+    The fused hooks take precedence over the corresponding individual functions.
+    If an ``EvaluationStore`` is given as ``store``, evaluations saved in the store are reused on cache misses
+    and new evaluations are saved to the store.
+    If an ``EventStream`` is given as ``events``, 'eval_start' and 'eval_end' events are emitted for each evaluation
+    with the iteration numbers in the ``iter`` and ``majiter`` attributes, which are updated by the optimizer.
+    Functions are evaluated lazily, i.e., nothing is evaluated at initialization.
+    Values already known at a point, e.g., loaded for hot starting, can be seeded into the cache with ``_seed()``.
     '''
-    def __init__(self, x0, obj, con, grad, jac):
+    def __init__(self, x0, obj, con, grad, jac, funcs=None, derivs=None, evaluate_all=None, cache_size=1, cache_tol=0.0, store=None, events=None):
         self.x0 = x0
         self.obj = obj
         self.con = con
         self.grad = grad
         self.jac = jac
+        self.funcs = funcs
+        self.derivs = derivs
+        self.evaluate_all = evaluate_all
 
         self.nfev = 0
         self.ngev = 0
         self.fev_time = 0.0
         self.gev_time = 0.0
-        self.warm_x = np.random.rand(len(x0))
-        self.warm_x_derivs = np.random.rand(len(x0))
-        self._funcs(x0)
-        self._derivs(x0)
+
+        self.cache_size = cache_size
+        self.cache_tol = cache_tol
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.funcs_cache = OrderedDict()
+        self.derivs_cache = OrderedDict()
+
+        self.store = store
+        self.store_hits = 0
+
+        self.events = events
+        self.iter = 0
+        self.majiter = 0
+
+    def _emit(self, type, start, end=None, values=(), **data):
+        '''
+        Emit an evaluation event with the total size of the values as the payload size, if any listener is subscribed to it.
+        '''
+        if self.events is not None and self.events.wants(type):
+            nbytes = sum(np.asarray(value).nbytes for value in values if value is not None)
+            self.events.emit(type, start, end, self.iter, self.majiter, nbytes, **data)
+
+    def _lookup(self, cache, x):
+        '''
+        Return the cached values for the given x and mark them as most recently used.
+        Returns None if x is not in the cache.
+        '''
+        key = (x + 0.0).tobytes() # Adding 0.0 maps -0.0 to 0.0 so that both have the same key
+        if key not in cache and self.cache_tol > 0:
+            for cached_key, (cached_x, _) in cache.items():
+                if np.max(np.abs(x - cached_x), initial=0.) <= self.cache_tol:
+                    key = cached_key
+                    break
+        if key in cache:
+            cache.move_to_end(key)
+            self.cache_hits += 1
+            return cache[key][1]
+        self.cache_misses += 1
+        return None
+    
+    def _store(self, cache, x, values):
+        '''
+        Store the values computed at the given x in the cache and evict the least recently used entries if the cache is full.
+        '''
+        cache[(x + 0.0).tobytes()] = (x * 1.0, values)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _seed(self, x, f, c, g, j):
+        '''
+        Seed the cache with known function and derivative values at the given x
+        without counting them as evaluations.
+        '''
+        self.f, self.c, self.g, self.j = f, c, g, j
+        self._store(self.funcs_cache, x, (f, c))
+        self._store(self.derivs_cache, x, (g, j))
 
     def _funcs(self, x):
         '''
-        Compute the objective and constraints at the given x, if x is different from the previous x.
+        Compute the objective and constraints at the given x, if x is not in the cache.
+        '''
+        cached = self._lookup(self.funcs_cache, x)
+        if cached is not None:
+            self.f, self.c = cached
+            return self.f, self.c
+        if self._load_from_store(x, derivs=False):
+            return self.f, self.c
+        return self._compute_funcs(x)
+
+    def _load_from_store(self, x, derivs):
         '''
-        if not np.array_equal(x, self.warm_x):
-            f_start = time.time()
+        Load the functions (or derivatives, if derivs is True) at the given x from the store, if available, into the cache.
+        Returns True if the values were loaded.
+        If evaluate_all is given, the functions and derivatives are loaded together.
+        '''
+        if self.store is None:
+            return False
+        if self.evaluate_all is not None:
+            vars = ['objective', 'constraints', 'gradient', 'jacobian']
+        else:
+            vars = ['gradient', 'jacobian'] if derivs else ['objective', 'constraints']
+        stored = self.store.load(x, vars)
+        if stored is None:
+            return False
+        
+        self.store_hits += 1
+        if self.evaluate_all is not None or not derivs:
+            self.f, self.c = stored[:2]
+            self._store(self.funcs_cache, x, (self.f, self.c))
+        if self.evaluate_all is not None or derivs:
+            self.g, self.j = stored[-2:]
+            self._store(self.derivs_cache, x, (self.g, self.j))
+        return True
+    
+    def _compute_funcs(self, x):
+        '''
+        Evaluate the objective and constraints at the given x (and also the derivatives if evaluate_all is given),
+        and store them in the cache.
+        '''
+        kind = 'all' if self.evaluate_all is not None else 'funcs'
+        if self.events is not None:
+            e_start = time.perf_counter_ns()
+            self._emit('eval_start', e_start, values=(x,), kind=kind)
+        f_start = time.time()
+        if self.evaluate_all is not None:
+            # Derivatives are computed along with the functions, so the evaluation time is counted as fev_time
+            self.f, self.c, self.g, self.j = self.evaluate_all(x)
+            self._store(self.derivs_cache, x, (self.g, self.j))
+            self.ngev += 1
+        elif self.funcs is not None:
+            self.f, self.c = self.funcs(x)
+        else:
             self.f = self.obj(x)
             self.c = self.con(x)
-            self.warm_x = x * 1.0
-            self.nfev += 1
-            self.fev_time += time.time() - f_start
+        self._store(self.funcs_cache, x, (self.f, self.c))
+        self.nfev += 1
+        self.fev_time += time.time() - f_start
+        if self.events is not None:
+            values = (self.f, self.c, self.g, self.j) if self.evaluate_all is not None else (self.f, self.c)
+            self._emit('eval_end', e_start, time.perf_counter_ns(), values=values, kind=kind)
+        if self.store is not None:
+            values = {'objective': self.f, 'constraints': self.c}
+            if self.evaluate_all is not None:
+                values.update({'gradient': self.g, 'jacobian': self.j})
+            self.store.save(x, values)
         return self.f, self.c
 
     def _derivs(self, x):
         '''
-        Compute the gradient and Jacobian at the given x, if x is different from the previous x.
+        Compute the gradient and Jacobian at the given x, if x is not in the cache.
         '''
-        if not np.array_equal(x, self.warm_x_derivs):
-            g_start = time.time()
+        cached = self._lookup(self.derivs_cache, x)
+        if cached is not None:
+            self.g, self.j = cached
+            return self.g, self.j
+        if self._load_from_store(x, derivs=True):
+            return self.g, self.j
+        
+        if self.evaluate_all is not None:
+            self._compute_funcs(x)
+            return self.g, self.j
+        
+        if self.events is not None:
+            e_start = time.perf_counter_ns()
+            self._emit('eval_start', e_start, values=(x,), kind='derivs')
+        g_start = time.time()
+        if self.derivs is not None:
+            self.g, self.j = self.derivs(x)
+        else:
             self.g = self.grad(x)
             self.j = self.jac(x)
-            self.warm_x_derivs = x * 1.0
-            self.ngev += 1
-            self.gev_time += time.time() - g_start
+        self._store(self.derivs_cache, x, (self.g, self.j))
+        self.ngev += 1
+        self.gev_time += time.time() - g_start
+        if self.events is not None:
+            self._emit('eval_end', e_start, time.perf_counter_ns(), values=(self.g, self.j), kind='derivs')
+        if self.store is not None:
+            self.store.save(x, {'gradient': self.g, 'jacobian': self.j})
         return self.g, self.j
 
     
@@ -98,6 +242,63 @@ def check_update_scalar(scalar, name, size, ref_name):
         raise ValueError(f"{name} must have the same length as the {ref_name} ({size},).")
     return np.asfarray(scalar) # Convert to float array if an integer array is provided
 
+def get_column_groups(rows, cols, n):
+    """
+    Partition the columns of a sparse Jacobian into groups of structurally independent columns,
+    i.e., columns that do not have nonzeros in the same row, using greedy graph coloring.
+    All columns in a group can be perturbed together for computing finite differences.
+    Structurally empty columns are not assigned to any group.
+
+    Parameters
+    ----------
+    rows : array_like
+        Row indices of the nonzero entries of the Jacobian.
+    cols : array_like
+        Column indices of the nonzero entries of the Jacobian.
+    n : int
+        Number of columns of the Jacobian.
+
+    Returns
+    -------
+    groups : list
+        List of arrays of column indices, one array for each group.
+    colors : np.ndarray
+        Array of size `(n,)` with the group index of each column, or -1 for empty columns.
+
+    Examples
+    --------
+    >>> groups, colors = get_column_groups([0, 0, 1, 1, 2, 2], [0, 1, 1, 2, 2, 3], 4)
+    >>> groups
+    [array([0, 2]), array([1, 3])]
+    >>> colors
+    array([0, 1, 0, 1])
+    """
+    rows = np.asarray(rows, dtype=int).flatten()
+    cols = np.asarray(cols, dtype=int).flatten()
+    if rows.shape != cols.shape:
+        raise ValueError("rows and cols of the sparsity pattern must have the same length.")
+    if np.any(rows < 0) or np.any(cols < 0) or np.any(cols >= n):
+        raise ValueError(f"Invalid indices in the sparsity pattern. Column indices must be in [0, {n}) and row indices must be non-negative.")
+
+    col_rows = [[] for _ in range(n)]
+    row_cols = {}
+    for r, c in set(zip(rows.tolist(), cols.tolist())):
+        col_rows[c].append(r)
+        row_cols.setdefault(r, []).append(c)
+
+    colors = np.full(n, -1, dtype=int)
+    for j in range(n):
+        if not col_rows[j]:
+            continue
+        forbidden = {colors[k] for r in col_rows[j] for k in row_cols[r]}
+        color = 0
+        while color in forbidden:
+            color += 1
+        colors[j] = color
+
+    groups = [np.flatnonzero(colors == k) for k in range(colors.max() + 1)]
+    return groups, colors
+
 def check_load_variables(read_file, iter, x, vars):
     """
     Check if the given x matches the x from the loaded read_file at given iteration.
@@ -115,8 +316,7 @@ def check_load_variables(read_file, iter, x, vars):
     vars : list
         List of variables to load from the saved file.
     """
-    grp = read_file['iter_' + str(iter)]
-    x_hs = grp['x'][()]
+    x_hs = load_iterate(read_file, iter, 'x')
 
     if not np.array_equal(x, x_hs):
         if iter == 0:
@@ -125,7 +325,365 @@ def check_load_variables(read_file, iter, x, vars):
             warnings.warn(f"The optimization variables x do not match the saved x at iteration {iter}. Falling back to normal function evaluations...")
             return 
 
-    return [grp[var][()] for var in vars]
+    return [load_iterate(read_file, iter, var) for var in vars]
+
+
+class HotStartIndex:
+    '''
+    Index over all the saved iterates in a recorder file, hashed by x, for hot starting.
+    Saved evaluations can be looked up for any x irrespective of the iteration number,
+    so that hot starting can continue after the optimization path diverges from the saved path.
+    The objective and constraints saved at an iteration are indexed only if they were evaluated at the saved x,
+    i.e., at the 0th iteration and at iterations with mode 1 or -1.
+    The gradient and Jacobian are indexed only at the 0th iteration and at iterations with mode -1.
+    For files without saved modes, mode -1 iterations are identified as iterations where x did not change.
+
+    Parameters
+    ----------
+    read_file : h5py.File
+        The file object to load the variables from.
+    tol : float, default=0.0
+        Tolerance (in the infinity norm) for matching x with the saved x. 
+        If 0, only saved x exactly equal to x are matched.
+    '''
+    def __init__(self, read_file, tol=0.0):
+        self.read_file = read_file
+        self.tol = tol
+        self.index = {'funcs': {}, 'derivs': {}}
+        self.x = {'funcs': [], 'derivs': []}
+        self.iters = {'funcs': [], 'derivs': []}
+
+        x_saved = load_all_iterates(read_file, 'x')
+        has_mode = 'mode' in get_saved_vars(read_file)
+        if has_mode:
+            modes = load_all_iterates(read_file, 'mode')
+        x_prev = None
+        for k, x in enumerate(x_saved):
+            if has_mode:
+                mode = int(modes[k])
+                funcs_valid = (k == 0) or (abs(mode) == 1)
+                derivs_valid = (k == 0) or (mode == -1)
+            else:
+                funcs_valid = True
+                derivs_valid = (k == 0) or np.array_equal(x, x_prev)
+            for kind, valid in [('funcs', funcs_valid), ('derivs', derivs_valid)]:
+                if valid:
+                    # Keep the first saved iteration for each x
+                    self.index[kind].setdefault((x + 0.0).tobytes(), k)
+                    self.x[kind].append(x)
+                    self.iters[kind].append(k)
+            x_prev = x
+        self.niter = len(x_saved) - 1 # Number of iterations saved in the file [excludes 0th iteration]
+
+        for kind in ['funcs', 'derivs']:
+            self.x[kind] = np.array(self.x[kind]).reshape(len(self.iters[kind]), -1)
+
+    def load(self, x, derivs=False):
+        '''
+        Return the saved objective and constraints (or the gradient and Jacobian, if derivs is True) at the given x.
+        Returns None if no saved evaluation matches x.
+        '''
+        kind = 'derivs' if derivs else 'funcs'
+        k = self.index[kind].get((x + 0.0).tobytes())
+        if k is None and self.tol > 0 and len(self.iters[kind]) > 0:
+            dist = np.max(np.abs(self.x[kind] - x), axis=1, initial=0.)
+            i = np.argmin(dist)
+            if dist[i] <= self.tol:
+                k = self.iters[kind][i]
+        if k is None:
+            return None
+        vars = ['gradient', 'jacobian'] if derivs else ['objective', 'constraints']
+        return [load_iterate(self.read_file, k, var) for var in vars]
+
+class Workspace:
+    '''
+    Arrays passed to the Fortran SLSQP subroutine for a problem with ``n`` variables, ``m`` constraints,
+    and ``meq`` equality constraints, i.e., the real and integer workspaces ``w`` and ``jw``, the accuracy,
+    the mode, the major iteration counter, and the zero-dimensional arrays holding the internal state of SLSQP
+    between the calls in the reverse communication loop, and the buffers for the scaled constraints and derivatives.
+    The arrays are allocated once and are reset in place by ``reset()`` before each optimization,
+    so that the same workspace can be reused to solve many problems of the same size.
+    A workspace must not be shared by optimizations running at the same time.
+
+    Parameters
+    ----------
+    n : int
+        Number of optimization variables.
+    m : int
+        Number of constraints.
+    meq : int
+        Number of equality constraints.
+    '''
+    def __init__(self, n, m, meq):
+        self.n = n
+        self.m = m
+        self.meq = meq
+        # la: The number of constraints, or 1 if there are no constraints
+        self.la = max(1, m)
+
+        n1 = n + 1
+        mineq = m - meq + n1 + n1
+        self.len_w = (3*n1+m)*(n1+1)+(n1-meq+1)*(mineq+2) + 2*mineq+(n1+mineq)*(n1-meq) \
+                     + 2*meq + n1 + ((n+1)*n)//2 + 2*m + 3*n + 3*n1 + 1
+        self.len_jw = mineq
+        self.w = np.zeros(self.len_w)
+        # jw is allocated with the Fortran integer type so that it is not converted to a new array at every call.
+        # It is only used as a scratch space within each call.
+        self.jw = np.zeros(self.len_jw, dtype=np.intc)
+
+        self.acc = array(0, float)
+        self.mode = array(0, int)
+        self.majiter = array(0, int)
+
+        # Internal SLSQP state variables
+        self.alpha = array(0, float)
+        self.f0 = array(0, float)
+        self.gs = array(0, float)
+        self.h1 = array(0, float) # h1 is the optimality (~complementarity) measure,  h1 = mu*max(0, -c[:meq])
+        # h2 is the feasibility measure, h2 = sum(constraint violations) ; con_viol > 0 for infeasible constraints
+        self.h2 = array(0, float) # h2 is the feasibility measure, h2 = sum(abs(c[:meq]) + sum(max(0, -c[meq:]))
+        self.h3 = array(0, float)
+        self.h4 = array(0, float)
+        self.t = array(0, float)
+        self.t0 = array(0, float)
+        self.tol = array(0, float)
+        self.iexact = array(0, int)
+        self.incons = array(0, int)
+        self.ireset = array(0, int)
+        self.itermx = array(0, int)
+        self.line = array(0, int)
+        self.n1 = array(0, int)
+        self.n2 = array(0, int)
+        self.n3 = array(0, int)
+        self.state = [self.alpha, self.f0, self.gs, self.h1, self.h2, self.h3, self.h4, self.t, self.t0, self.tol,
+                      self.iexact, self.incons, self.ireset, self.itermx, self.line, self.n1, self.n2, self.n3]
+
+        # Although Lagrange multipliers `mu `are supposed to be in w[:m], it is only used in the L1 test function and gets updated there with estimates
+        # so we use the lsq multipliers r() which are the actual Lagrange multipliers
+        # wref indicates where lsq multipliers start in w
+        self.wref = int(self.la + (n+1)*n/2 + 1 + n)
+
+        # Buffers for the scaled constraints, gradient, and Jacobian passed to SLSQP at each call.
+        # The gradient and Jacobian have an extra zero column as required by SLSQP, and
+        # the Jacobian is stored in Fortran order so that it is not copied at every call.
+        self.c = np.zeros(self.la)
+        self.g = np.zeros(n1)
+        self.a = np.zeros((self.la, n1), order='F')
+
+    def reset(self, acc, maxiter):
+        '''
+        Zero the workspaces and the state variables in place, and set the accuracy as acc,
+        the mode as 0, and the major iteration counter as maxiter-1 for a new optimization.
+        '''
+        self.w.fill(0.)
+        self.jw.fill(0)
+        self.acc[...] = acc
+        self.mode[...] = 0
+        self.majiter[...] = maxiter - 1
+        for var in self.state:
+            var[...] = 0
+
+    def multipliers(self):
+        '''
+        Return a view of the Lagrange multipliers in the workspace.
+        '''
+        return self.w[self.wref:self.wref+self.m]
+
+    def call(self, x, xl, xu, f, c, g, a):
+        '''
+        Call the Fortran SLSQP subroutine for one step of the reverse communication loop.
+        x is updated in place, and the mode indicates what SLSQP requires next:
+        1 for the objective and constraints, -1 for the gradient and Jacobian, and any other value on exit.
+        '''
+        slsqp(self.m, self.meq, x, xl, xu, f, c, g, a, self.acc, self.majiter, self.mode, self.w, self.jw,
+              self.alpha, self.f0, self.gs, self.h1, self.h2, self.h3, self.h4, self.t, self.t0, self.tol,
+              self.iexact, self.incons, self.ireset, self.itermx, self.line,
+              self.n1, self.n2, self.n3)
+
+    def step(self, x, xl, xu, f, c, g, a, majiter_prev):
+        '''
+        Call SLSQP (see ``call()``) and return the number of major iterations completed,
+        given the number ``majiter_prev`` completed before the call.
+        The counter is corrected for the jumps and missed updates of the major iteration counter in SLSQP,
+        without modifying the counter in the workspace, which is part of the internal state of SLSQP.
+        '''
+        self.call(x, xl, xu, f, c, g, a)
+        majiter = int(self.majiter)
+        if majiter > majiter_prev and majiter != majiter_prev + 1:
+            warnings.warn(f"SLSQP Bug: Major iteration counter jumped from {majiter_prev} to {majiter}. Resetting to {majiter_prev + 1}.")
+            majiter = majiter_prev + 1
+        # SLSQP sometimes forgets to update the majiter when it exits with abs(mode) != 1 (Possible bug?)
+        # If majiter has not incremented when exiting, increment it
+        if abs(self.mode) != 1 and majiter == majiter_prev:
+            majiter += 1
+        return majiter
+
+exit_modes = {-1: "Gradient evaluation required (g & a)",
+               0: "Optimization terminated successfully",
+               1: "Function evaluation required (f & c)",
+               2: "More equality constraints than independent variables",
+               3: "More than 3*n iterations in LSQ subproblem",
+               4: "Inequality constraints incompatible",
+               5: "Singular matrix E in LSQ subproblem",
+               6: "Singular matrix C in LSQ subproblem",
+               7: "Rank-deficient equality constraint subproblem HFTI",
+               8: "Positive directional derivative for linesearch",
+               9: "Iteration limit reached"}
+
+def _fd_step(x, r_step, a_step, xu):
+    '''
+    Compute the forward finite difference step for each variable at the given x, or at each of the stacked points x.
+    The step is reversed for variables where a forward step would exceed the upper bound xu, marked with nans for infinite bounds.
+    '''
+    if a_step is None:
+        h = r_step * np.maximum(1, np.abs(x))
+    else:
+        h = a_step * np.ones(np.shape(x))
+    # h is always positive so no need to check for lower bound (comparisons with nan bounds are False)
+    h[x + h > xu] *= -1
+    return h
+
+def _fd_points(x, h, groups=None):
+    '''
+    Return the stacked perturbed points.
+    If groups is None, row i is the point x + h[i]*e_i for each of the n variables
+    (for stacked points x and steps h of shape (k, n), the points are of shape (k, n, n)).
+    Otherwise, row k is the point x + sum(h[i]*e_i for i in groups[k]) for each group of variables.
+    '''
+    if groups is None:
+        n = np.shape(x)[-1]
+        return x[..., None, :] + np.where(np.eye(n, dtype=bool), h[..., None, :], 0.)
+    
+    X = np.tile(x.astype(h.dtype), (len(groups), 1))
+    for k, group in enumerate(groups):
+        X[k, group] += h[group]
+    return X
+
+def _fd_evaluate_batch(func_batch, x, h, groups=None):
+    '''
+    Evaluate the vectorized function at the base point x and all the perturbed points (see _fd_points) with a single call.
+    Returns the function value at x and the array of function values at the perturbed points.
+    '''
+    n = len(x)
+    k = n if groups is None else len(groups)
+    # Row 0 is the base point x and row i+1 is the i-th perturbed point
+    X = np.empty((k+1, n), dtype=h.dtype)
+    X[0] = x
+    X[1:] = _fd_points(x, h, groups)
+    out = np.asarray(func_batch(X), dtype=h.dtype)
+    if out.shape[:1] != (k+1,):
+        raise ValueError(f"Vectorized function must return an array with first dimension {k+1} for an input of shape {X.shape}, but returned shape {out.shape}.")
+    return out[0], out[1:]
+
+def _fd_evaluate(func, x, h, groups=None, executor=None):
+    '''
+    Evaluate the function at all the perturbed points (see _fd_points), serially or using the executor.
+    Returns a list of function values in the order of the perturbed points.
+    '''
+    if executor is None:
+        out = []
+        e = np.zeros(len(x), dtype=h.dtype)
+        for i in (range(len(x)) if groups is None else groups):
+            e[i] = h[i]
+            out.append(func(x + e))
+            e[i] = 0.
+        return out
+    
+    return list(executor.map(func, _fd_points(x, h, groups)))
+
+def _run_slsqp(workspace, prob, x, fx, c, g, a, xl_scaled, xu_scaled, x_scaler, obj_scaler, con_scaler, load=None, iteration=None):
+    '''
+    Run the reverse communication loop of SLSQP on the reset workspace, starting from x with the objective fx,
+    the constraints c of size (la,), the gradient g of size (n+1,), and the Jacobian a of size (la, n+1) at x,
+    where g and a have the extra zero column required by SLSQP.
+    The functions and derivatives required by SLSQP are evaluated with the Problem ``prob``,
+    unless ``load(x, mode)`` is given and returns the values, i.e., (fx, c) for mode 1 or (g, a) for mode -1.
+    ``iteration(iter, majiter, ismajor, x, fx, c, g, a)`` is called, if given, after each call to SLSQP
+    and the evaluations it required.
+    Returns the final x, fx, c, g, a, the number of major iterations, and the time spent in SLSQP.
+    '''
+    la = workspace.la
+    mode = workspace.mode
+    events = prob.events
+
+    x_inv_scaler = np.append(1.0 / x_scaler, 0.0) # size of (n+1,)
+    g_scaler = obj_scaler * x_inv_scaler
+    a_scaler = np.outer(con_scaler, x_inv_scaler)
+    x_scaled = x * x_scaler
+    c_scaled, g_scaled, a_scaled = workspace.c, workspace.g, workspace.a
+
+    iter = 0
+    majiter = majiter_prev = 0
+    opt_time = 0.0
+    while 1:
+        # Scale the objective, constraints, gradients and jacobian
+        fx_scaled = fx * obj_scaler                         # scalar
+        np.multiply(c, con_scaler, out=c_scaled)            # size of (la,)
+        np.multiply(g, g_scaler, out=g_scaled)              # size of (n+1,)
+        np.multiply(a, a_scaler, out=a_scaled)              # size of (la, n+1)
+
+        iter += 1
+        # Call SLSQP
+        opt_start = time.time()
+        e_start = time.perf_counter_ns()
+        majiter = workspace.step(x_scaled, xl_scaled, xu_scaled, fx_scaled, c_scaled, g_scaled, a_scaled, majiter_prev)
+        opt_time += time.time() - opt_start
+        if events is not None and events.wants('solver_call'):
+            nbytes = sum(arr.nbytes for arr in [x_scaled, xl_scaled, xu_scaled, c_scaled, g_scaled, a_scaled, workspace.w, workspace.jw])
+            events.emit('solver_call', e_start, time.perf_counter_ns(), iter, majiter, nbytes, mode=int(mode))
+
+        prob.iter, prob.majiter = iter, majiter # Iteration numbers for the evaluation events
+        x = x_scaled / x_scaler
+
+        if abs(mode) == 1:
+            values = None if load is None else load(x, int(mode))
+            if mode == 1:   # objective and constraint evaluation required
+                fx, c = prob._funcs(x) if values is None else values
+            else:           # derivative evaluation required
+                g, a = prob._derivs(x) if values is None else values
+                g = np.append(g, 0.0)
+                a = np.concatenate((a, np.zeros([la, 1])), 1)
+
+        if iteration is not None:
+            iteration(iter, majiter, majiter > majiter_prev, x, fx, c, g, a)
+
+        # If exit mode is not -1 or 1, slsqp has completed
+        if abs(mode) != 1:
+            break
+
+        majiter_prev = majiter
+
+    return x, fx, c, g, a, majiter, opt_time
+
+def _get_results(workspace, prob, x, fx, c, g, a, majiter):
+    '''
+    Return the dictionary of the results of the optimization on the workspace with the values at the final x
+    (see _run_slsqp), the evaluation counts of the Problem ``prob`` (if not None), and the exit status.
+    The multipliers are copied from the workspace so that they are not modified if the workspace is reused.
+    '''
+    m, meq = workspace.m, workspace.meq
+    c = np.asarray(c, dtype=float)
+    mode = int(workspace.mode)
+
+    results = {}
+    results['x'] = x
+    results['objective'] = fx
+    results['optimality'] = float(workspace.h1)
+    results['feasibility'] = np.sum(np.abs(c[:meq])) + np.sum(np.maximum(0, -c[meq:]))
+    results['constraints'] = c[:m]
+    results['multipliers'] = workspace.multipliers().copy()
+    results['gradient'] = g[:-1]
+    results['jacobian'] = a[:m, :-1]
+    results['num_majiter'] = int(majiter)
+    if prob is not None:
+        results['nfev'] = prob.nfev
+        results['ngev'] = prob.ngev
+        results['cache_hits'] = prob.cache_hits
+        results['cache_misses'] = prob.cache_misses
+    results['status'] = mode
+    results['message'] = exit_modes[mode]
+    results['success'] = (mode == 0)
+    return results
 
 
 def get_default_options():
@@ -138,10 +696,15 @@ def get_default_options():
     >>> options # doctest: +NORMALIZE_WHITESPACE
     {'obj': None, 'grad': None, 'con': None, 'jac': None, 'meq': 0, 'callback': None, 'xl': None, 'xu': None, 
     'x_scaler': 1.0, 'obj_scaler': 1.0, 'con_scaler': 1.0, 'maxiter': 100, 'acc': 1e-06, 'iprint': 1, 
-    'finite_diff_abs_step': None, 'finite_diff_rel_step': 1.4901161193847656e-08, 'summary_filename': 'slsqp_summary.out', 
-    'warm_start': False, 'hot_start': False, 'load_filename': None, 'save_itr': None, 'save_filename': 'slsqp_recorder.hdf5', 
+    'finite_diff_abs_step': None, 'finite_diff_rel_step': 1.4901161193847656e-08, 'fd_executor': None, 'fd_workers': None, 
+    'obj_batch': None, 'con_batch': None, 'jac_sparsity': None, 'funcs': None, 'derivs': None, 'evaluate_all': None, 
+    'cache_size': 1, 'cache_tol': 0.0, 'eval_store': None, 'eval_store_tag': '', 'event_stream': None, 
+    'summary_filename': 'slsqp_summary.out', 'summary_format': 'table', 'summary_flush_interval': 1, 
+    'warm_start': False, 'hot_start': False, 'hot_start_tol': 0.0, 'load_filename': None, 'save_itr': None, 'save_filename': 'slsqp_recorder.hdf5', 
     'save_vars': ['x', 'objective', 'optimality', 'feasibility', 'step', 'iter', 'majiter', 'ismajor', 'mode'], 
-    'visualize': False, 'visualize_vars': ['objective', 'optimality', 'feasibility'], 'keep_plot_open': False, 
+    'save_backend': None, 'save_layout': 'groups', 'save_compression': None, 'save_async': False, 'save_queue_size': 16, 
+    'visualize': False, 'visualize_vars': ['objective', 'optimality', 'feasibility'], 'visualize_interval': 1, 'visualize_min_time': 0.0, 
+    'visualize_mode': 'inline', 'keep_plot_open': False, 
     'save_figname': 'slsqp_plot.pdf'}
     """
     options = {
@@ -161,15 +724,39 @@ def get_default_options():
         'iprint': 1,
         'finite_diff_abs_step': None,
         'finite_diff_rel_step': _epsilon,
+        'fd_executor': None,
+        'fd_workers': None,
+        'obj_batch': None,
+        'con_batch': None,
+        'jac_sparsity': None,
+        'funcs': None,
+        'derivs': None,
+        'evaluate_all': None,
+        'cache_size': 1,
+        'cache_tol': 0.0,
+        'eval_store': None,
+        'eval_store_tag': '',
+        'event_stream': None,
         'summary_filename': 'slsqp_summary.out',
+        'summary_format': 'table',
+        'summary_flush_interval': 1,
         'warm_start': False,
         'hot_start': False,
+        'hot_start_tol': 0.0,
         'load_filename': None,
         'save_itr': None,
         'save_filename': 'slsqp_recorder.hdf5',
         'save_vars': ['x', 'objective', 'optimality', 'feasibility', 'step', 'iter', 'majiter', 'ismajor', 'mode'],
+        'save_backend': None,
+        'save_layout': 'groups',
+        'save_compression': None,
+        'save_async': False,
+        'save_queue_size': 16,
         'visualize': False,
         'visualize_vars': ['objective', 'optimality', 'feasibility'],
+        'visualize_interval': 1,
+        'visualize_min_time': 0.0,
+        'visualize_mode': 'inline',
         'keep_plot_open': False,
         'save_figname': 'slsqp_plot.pdf',
     }
@@ -181,10 +768,12 @@ def optimize(x0, obj=None, grad=None,
             con=None, jac=None, meq=0, callback=None,
             xl=None, xu=None, x_scaler=1.0, obj_scaler=1.0, con_scaler=1.0,
             maxiter=100, acc=1.0E-6, iprint=1,
-            finite_diff_abs_step=None, finite_diff_rel_step=_epsilon, 
-            summary_filename='slsqp_summary.out', warm_start=False, hot_start=False, load_filename=None,
+            finite_diff_abs_step=None, finite_diff_rel_step=_epsilon, fd_executor=None, fd_workers=None,
+            obj_batch=None, con_batch=None, jac_sparsity=None, funcs=None, derivs=None, evaluate_all=None,
+            cache_size=1, cache_tol=0.0, eval_store=None, eval_store_tag='', event_stream=None, summary_filename='slsqp_summary.out', summary_format='table', summary_flush_interval=1, warm_start=False, hot_start=False, hot_start_tol=0.0, load_filename=None,
             save_itr=None, save_filename='slsqp_recorder.hdf5', save_vars=['x', 'objective', 'optimality', 'feasibility', 'step', 'iter', 'majiter', 'ismajor', 'mode'],
-            visualize=False, visualize_vars=['objective', 'optimality', 'feasibility'], keep_plot_open= False, save_figname='slsqp_plot.pdf'):
+            save_backend=None, save_layout='groups', save_compression=None, save_async=False, save_queue_size=16,
+            visualize=False, visualize_vars=['objective', 'optimality', 'feasibility'], visualize_interval=1, visualize_min_time=0.0, visualize_mode='inline', keep_plot_open= False, save_figname='slsqp_plot.pdf'):
     """
     Minimize a scalar function of one or more variables using Sequential
     Least Squares Programming (SLSQP).
@@ -244,18 +833,23 @@ def optimize(x0, obj=None, grad=None,
         If np.ndarray of size `(m,)`, each constraint is scaled by the corresponding factor.
     meq : int, default=0
         The number of equality constraints. Defaults to 0.
-    grad : callable, default=None
+    grad : callable or 'cs', default=None
         Gradient of the objective function. If `None`, the gradient will be
         approximated using finite differences.
-    jac : callable, default=None
+        If 'cs', the gradient will be computed using the complex-step method,
+        which requires ``obj`` (or ``obj_batch``) to support complex inputs.
+    jac : callable or 'cs', default=None
         Jacobian of the constraint function. If `None`, the Jacobian will be
         approximated using finite differences.
+        If 'cs', the Jacobian will be computed using the complex-step method,
+        which requires ``con`` (or ``con_batch``) to support complex inputs.
     maxiter : int, default=100
         Maximum number of iterations.
     acc : float, default=1.0E-6
         abs(acc) is the stopping criterion and controls the final accuracy.
-        If ``acc`` < 0, a maximization problem is solved.
-        Otherwise, a minimization problem is solved.
+        If ``acc`` < 0, an exact line search is used instead of the default inexact (Armijo-type) line search.
+        The exact line search keeps its state in static variables of the Fortran subroutine ``LINMIN``,
+        so optimizations with ``acc`` < 0 must not run concurrently on multiple threads.
     iprint : int, default=1
         Controls the verbosity of the SLSQP algorithm. 
         Set ``iprint <= 0`` to suppress all console outputs.
@@ -270,6 +864,79 @@ def optimize(x0, obj=None, grad=None,
         possibly adjusted to fit into the bounds. Not used if finite_diff_abs_step is given.
         By default, it is selected automatically as 
         ``_epsilon = np.sqrt(np.finfo(float).eps)`` approximately 1e-8.
+    fd_executor : {None, 'thread', 'process'} or concurrent.futures.Executor, default=None
+        Executor used to evaluate the perturbed points for finite-difference gradients and Jacobians.
+        If None (default), the perturbed points are evaluated serially.
+        If 'thread' or 'process', a ``ThreadPoolExecutor`` or ``ProcessPoolExecutor`` is created 
+        with ``fd_workers`` workers and shut down when the optimization is complete or raises an exception.
+        An existing ``Executor`` instance can also be provided, in which case it is not shut down.
+        Note that ``obj`` and ``con`` must be picklable when using a process pool.
+    fd_workers : int, default=None
+        Maximum number of workers for the executor created when ``fd_executor`` is 'thread' or 'process'.
+        If None, the default number of workers for the executor is used.
+    obj_batch : callable, default=None
+        Vectorized objective function called as ``obj_batch(X)``, where ``X`` is an array of shape `(k, n)` 
+        whose rows are points in the design space. Must return the `(k,)` array of objective values at these points.
+        If provided and ``grad`` is None, the finite-difference gradient is computed with a single ``obj_batch`` call
+        on the stacked base and perturbed points, instead of `n+1` calls to ``obj``. 
+        If ``obj`` is None, the objective is evaluated as ``obj_batch(x[None, :])[0]``.
+    con_batch : callable, default=None
+        Vectorized constraint function called as ``con_batch(X)``, where ``X`` is an array of shape `(k, n)`.
+        Must return the `(k, m)` array of constraint values at the `k` points.
+        If provided and ``jac`` is None, the finite-difference Jacobian is computed with a single ``con_batch`` call.
+        If ``con`` is None, the constraints are evaluated as ``con_batch(x[None, :])[0]``.
+    jac_sparsity : tuple or np.ndarray, default=None
+        Sparsity pattern of the constraint Jacobian, given either as a tuple ``(rows, cols)`` 
+        of the row and column indices of the nonzero entries (COO format), or as a boolean array of shape `(m, n)`
+        that is True for nonzero entries.
+        If provided, structurally independent columns of the Jacobian are grouped using graph coloring 
+        and perturbed together, so that the finite-difference or complex-step Jacobian 
+        requires one constraint evaluation per group instead of one per variable.
+        Only supported when ``con`` or ``con_batch`` is given and ``jac`` is None or 'cs'; 
+        a ValueError is raised if it is given with a callable ``jac`` or the fused functions 
+        ``derivs``, ``funcs``, or ``evaluate_all``.
+    funcs : callable, default=None
+        Fused objective and constraint function called as ``f, c = funcs(x)``.
+        Replaces ``obj`` and ``con`` when both are computed from the same expensive model evaluation.
+        For problems without constraints, ``c`` should be an empty array.
+        If ``derivs`` is None, the gradient and Jacobian are approximated together using finite differences
+        with one ``funcs`` call per perturbed point (``fd_executor`` is supported, but ``jac_sparsity`` is not).
+    derivs : callable, default=None
+        Fused gradient and Jacobian function called as ``g, j = derivs(x)``.
+        Replaces ``grad`` and ``jac`` when both are computed from the same model evaluation (e.g. an adjoint solve).
+    evaluate_all : callable, default=None
+        Fused function that computes the objective, constraints, gradient, and Jacobian with a single call 
+        as ``f, c, g, j = evaluate_all(x)``. Replaces ``obj``, ``con``, ``grad``, and ``jac``.
+        Since derivatives are computed at every function evaluation, the evaluation time is counted as function evaluation time.
+        For problems without constraints, ``c`` and ``j`` should be empty arrays.
+    cache_size : int, default=1
+        Number of most recently evaluated points x for which the function and derivative values are cached.
+        A point that is revisited, e.g., when the line search backtracks to a previous iterate,
+        is not re-evaluated if it is still in the cache. The least recently used points are evicted first.
+        The number of cache hits and misses are returned in the results as ``'cache_hits'`` and ``'cache_misses'``.
+    cache_tol : float, default=0.0
+        Tolerance for matching x with a cached point. If ``cache_tol`` > 0, the cached values at a point 
+        within ``cache_tol`` of x (in the infinity norm) are reused for x.
+        By default, only points exactly equal to x are matched.
+    eval_store : str, default=None
+        Name of the HDF5 file for a persistent store of the function and derivative evaluations.
+        Requires h5py (``pip install pyslsqp[hdf5]``).
+        Evaluations are saved to and reused from the store using a hash of x and ``eval_store_tag`` as the key. 
+        This allows reusing evaluations across runs irrespective of the scaling, options, 
+        or the path taken by the optimizer, e.g., for parameter sweeps or reruns after small changes in options.
+        The number of reused evaluations is returned in the results as ``'store_hits'``.
+        The store is flushed to disk after each major iteration and closed when the optimization completes or raises an exception.
+        By default, ``eval_store`` is None, and no evaluations are stored.
+    eval_store_tag : str, default=''
+        Model version tag used along with x to identify the evaluations in ``eval_store``.
+        Change the tag whenever the model functions change so that outdated evaluations are not reused.
+    event_stream : pyslsqp.events.EventStream, default=None
+        Stream of events for instrumenting the optimization. The listeners subscribed to the stream are called with
+        an ``Event`` for the start and end of each function and derivative evaluation ('eval_start', 'eval_end'), 
+        each call to the SLSQP subroutine ('solver_call'), each major iteration ('major_iter'), 
+        each iteration saved ('record_write'), and each plot update ('plot_update').
+        Events carry ``time.perf_counter_ns()`` timestamps, the iteration numbers, and the sizes of their payloads.
+        See ``pyslsqp.events.EventStream`` for more details.
     callback : callable, default=None
         Function to be called after each major iteration. The function is called as
         ``callback(x)``, where ``x`` is the optimization variable vector from the current major iteration.
@@ -279,31 +946,88 @@ def optimize(x0, obj=None, grad=None,
     summary_filename : str, default='slsqp.out'
         Name of the file to save the summary of the optimization process. 
         By default, the file is saved as ``'slsqp_summary.out'``.
+        The file is kept open during the optimization and closed even if the optimization raises an exception.
+    summary_format : {'table', 'csv', 'jsonl'}, default='table'
+        Format of the summary file. 
+        If 'table', the summary is written as a fixed-width table. 
+        If 'csv' or 'jsonl', the same columns are written as comma-separated values with a header line
+        or as one JSON object per major iteration, respectively, for reading the summary with other tools.
+    summary_flush_interval : int, default=1
+        Number of major iterations after which the summary file is flushed to the disk.
+        If 0, the file is flushed only at the end of the optimization. 
+        Larger intervals reduce the file system traffic, e.g., on network file systems, at the cost of
+        the summary file lagging behind the optimization.
     save_filename : str, default='slsqp_recorder.hdf5'
         Name of the file to save the iterations. 
         By default, the file is saved as ``'slsqp_recorder.hdf5'``.
+        For ``save_backend='npy'``, this is the name of the directory to save the iterations in.
     save_vars : list, default=['x', 'objective', 'optimality', 'feasibility', 'step', 'mode', 'iter', 'majiter', 'ismajor']
         List of variables to save. The full list of variables available are 
         ``['x', 'objective', 'optimality', 'feasibility', 'step', 'mode', 'iter', 'majiter', 'ismajor', 'constraints', 'gradient', 'multipliers', 'jacobian']``.
+    save_backend : {'hdf5', 'npy'}, default=None
+        Backend for saving the iterations. 
+        If None, 'hdf5' is used if h5py is installed, and 'npy' otherwise.
+        If 'hdf5', the iterations are saved in an HDF5 file, which requires h5py (``pip install pyslsqp[hdf5]``).
+        If 'npy', ``save_filename`` is a directory where each saved variable is written as a growing raw .npy file
+        along with a small JSON header, which does not require h5py. 
+        Saved variables are memory-mapped when loaded from these directories, so that opening them is fast irrespective of 
+        the length of the optimization. The 'npy' backend always uses a columnar layout and no compression.
+        All loading functions, and warm and hot starting, support both backends.
+    save_layout : {'groups', 'columnar'}, default='groups'
+        Layout of the saved iterations in the file.
+        If 'groups', each iteration is saved in a separate group ``iter_k`` with one dataset for each variable.
+        If 'columnar', each variable is saved as a single resizable, chunked dataset in the group ``iterates``
+        with one row appended per saved iteration, e.g., ``x`` of shape ``(num_saves, n)``.
+        The columnar layout is recommended for long optimizations since it avoids creating many small objects in the file.
+        Files saved with either layout can be used for loading, warm starting and hot starting.
+    save_compression : str, default=None
+        Compression filter for the datasets in the 'columnar' layout, e.g., 'gzip' or 'lzf'. 
+        No compression is used by default. Ignored for the 'groups' layout.
+    save_async : bool, default=False
+        If True, the iterations are saved by a background writer thread so that the optimization does not wait 
+        for the file I/O at every iteration. The saved variables are copied at each iteration and queued for writing.
+        The optimization waits for the writer only if the queue is full and at the end of the optimization 
+        until all the queued iterations are written.
+        The time spent by the writer and the time the optimization waited for the writer are reported in the summary.
+    save_queue_size : int, default=16
+        Maximum number of iterations waiting to be written by the background writer if ``save_async`` is True.
     warm_start : bool, default=False
         If True, the optimization algorithm will use the previous solution from the last optimization as the initial guess.
     hot_start : bool, default=None
         If True, the optimization algorithm will use the saved objective, constraints, gradient, and jacobian 
-        functions from the previous optimization until the iterations reach the last saved iteration.
+        values from the previous optimization for any x that matches a saved iterate, irrespective of the iteration number.
+        The functions are evaluated only for x that are not found in the saved file, 
+        so hot starting continues to reuse saved values even after the path diverges from the saved path.
         Note that this only works if save_itr for the previous optimization was set to 'all'.
         This is useful when the objective, constraints, gradient, and jacobian functions are expensive to compute
         and the optimization process was interrupted in a prior run.
+    hot_start_tol : float, default=0.0
+        Tolerance (in the infinity norm) for matching x with the saved iterates during hot start.
+        By default, only saved iterates exactly equal to x are matched.
     load_filename : str, default=None
         Name of the file to load the previous optimization solution or iterates for warm or hot start.
         If None, the ``load_filename`` is assumed to be the same as the save_filename.
         If ``load_filename`` is same as the provided ``save_filename`` will be updated as:
-        'save_filename without extension' + '_warm.hdf5' or '_hot.hdf5' depending on the warm_start or hot_start.
+        'save_filename without extension' + '_warm' or '_hot' + 'extension' depending on the warm_start or hot_start,
+        e.g., 'slsqp_recorder_hot.hdf5' for hot start with the default ``save_filename``.
     visualize : bool, default=False
         Set to True to visualize the optimization process.
         Only major iterations are visualized.
     visualize_vars : list, default=['objective', 'optimality', 'feasibility']
         List of scalar variables to visualize. Available variables are
         ``['x[i]', 'objective', 'optimality', 'feasibility', 'constraints[i]', 'gradient[i]', 'multipliers[i]', 'jacobian[i,j]']``.
+    visualize_interval : int, default=1
+        Number of major iterations between updates of the plot. 
+        The values from all major iterations are plotted irrespective of the interval.
+    visualize_min_time : float, default=0.0
+        Minimum time in seconds between updates of the plot. 
+        Increase ``visualize_interval`` or ``visualize_min_time`` to reduce the visualization time for long optimizations.
+    visualize_mode : {'inline', 'process', 'headless'}, default='inline'
+        If 'inline', the plot is drawn by the optimization process after the major iterations.
+        If 'process', the plot is drawn in a separate plotting process that receives the values of ``visualize_vars`` 
+        over a pipe, so that the optimization never waits for drawing the plot or for the plot window.
+        If 'headless', the separate plotting process does not open a plot window and saves snapshots of the plot
+        to ``save_figname`` after each update instead, e.g., for monitoring optimizations running without a display.
     keep_plot_open : bool, default=False
         Set to True to keep the plot window open after the optimization process is complete.
     save_figname : str, default='slsqp_plot.pdf'
@@ -368,12 +1092,41 @@ def optimize(x0, obj=None, grad=None,
     in_xl = copy.copy(xl)
     in_xu = copy.copy(xu)
 
-    if (obj is None) and (con is None):
+    if obj is None and obj_batch is not None:
+        obj = lambda x: obj_batch(x[None, :])[0]
+    if con is None and con_batch is not None:
+        con = lambda x: con_batch(x[None, :])[0]
+
+    fused = (funcs is not None) or (evaluate_all is not None)
+    if fused:
+        if any(func is not None for func in [obj, con, obj_batch, con_batch]):
+            raise ValueError("obj, con, obj_batch, and con_batch cannot be used with the fused functions 'funcs' or 'evaluate_all'.")
+        if funcs is not None and evaluate_all is not None:
+            raise ValueError("funcs and evaluate_all are mutually exclusive. Only one of funcs or evaluate_all can be provided.")
+    if (derivs is not None) or fused:
+        if (grad is not None) or (jac is not None):
+            raise ValueError("grad and jac cannot be used with the fused functions 'derivs', 'funcs', or 'evaluate_all'.")
+    if (derivs is not None) and (evaluate_all is not None):
+        raise ValueError("derivs and evaluate_all are mutually exclusive. Only one of derivs or evaluate_all can be provided.")
+    if (jac_sparsity is not None) and (fused or (derivs is not None) or (con is None) or callable(jac)):
+        raise ValueError("jac_sparsity is only used for the finite-difference or complex-step Jacobian of 'con' or 'con_batch'. "
+                         "It cannot be used with a user-defined 'jac', the fused functions 'derivs', 'funcs', or 'evaluate_all', "
+                         "or without constraints.")
+
+    if (obj is None) and (con is None) and not fused:
         raise ValueError("At least one of the objective or constraint functions must be defined.")
     
     if x0 is None:
         raise ValueError("Some initial guess 'x0' must be provided to inform the optimizer about the number of optimization variables n.")
-                         
+
+    if event_stream is not None and not isinstance(event_stream, EventStream):
+        raise TypeError("event_stream must be an instance of pyslsqp.events.EventStream.")
+
+    if summary_format not in ['table', 'csv', 'jsonl']:
+        raise ValueError("summary_format must be 'table', 'csv', or 'jsonl'.")
+    if not isinstance(summary_flush_interval, int) or summary_flush_interval < 0:
+        raise ValueError("summary_flush_interval must be a non-negative integer.")
+
     if visualize:
         if not isinstance(visualize_vars, (list, str)):
             raise TypeError("visualize_vars must be a list of strings or a string.")
@@ -398,7 +1151,8 @@ def optimize(x0, obj=None, grad=None,
                 else:
                     raise ValueError(f"Invalid variable {var} in visualize_vars. Must be one of ['objective', 'optimality', 'feasibility', 'x[i]', 'constraint[i]', 'gradient[i]', 'multipliers[i]', 'jacobian[i,j]'].")
         
-        visualizer = Visualizer(visualize_vars, summary_filename, save_figname)
+        if visualize_mode not in ['inline', 'process', 'headless']:
+            raise ValueError("visualize_mode must be 'inline', 'process', or 'headless'.")
 
     # Transform x0 into an array.
     x = np.asfarray(x0).flatten()
@@ -411,16 +1165,18 @@ def optimize(x0, obj=None, grad=None,
         if load_filename is None:
             load_filename = save_filename
         if save_filename == load_filename:
+            root, ext = os.path.splitext(save_filename) # ext is '' for directories saved with the 'npy' backend
             if warm_start:
-                save_filename = save_filename.split('.')[0] + '_warm.hdf5'
+                save_filename = root + '_warm' + ext
             else:
-                save_filename = save_filename.split('.')[0] + '_hot.hdf5'
-        if h5py is None:
-            raise ImportError("h5py is required for loading previous solution. Install h5py to use warm or hot start.")
+                save_filename = root + '_hot' + ext
+        if not os.path.isdir(load_filename) and _import_h5py() is None:
+            raise ImportError("h5py is required for loading previous solution from HDF5 files. Install h5py to use warm or hot start, "
+                              "or load from a directory saved with save_backend='npy'.")
         try:
-            read_file = h5py.File(load_filename, 'r')
+            read_file = open_recorder_file(load_filename)
         except FileNotFoundError:
-            raise FileNotFoundError(f"File {load_filename} not found or not a valid h5py file. Cannot perform warm or hot start.")
+            raise FileNotFoundError(f"File {load_filename} not found or not a valid h5py file or npy recorder directory. Cannot perform warm or hot start.")
         
     if warm_start:
         print(f"Warm starting from previous optimization solution x from {load_filename}...")
@@ -428,18 +1184,11 @@ def optimize(x0, obj=None, grad=None,
             x = read_file['results']['x'][()]
         else:
             print(f"No results found for warm-start in {load_filename}. Trying to load the last iteration...")
-            warm_start_success = False
-            num_saves = len(read_file.keys()) # = number of iter/majiter - 1 (since results were not found and counting starts from 0th iteration)
-            for k in range(num_saves-1, -1, -1):
-                if f'iter_{k}' in read_file.keys():
-                    x = read_file[f'iter_{k}']['x'][()]
-                    warm_start_success = True
-                    print(f"Success loading x from iteration {k} for warm-start.")
-                    break
-            if not warm_start_success:
+            num_saves = get_num_saves(read_file) # = number of iter/majiter + 1 (since counting starts from 0th iteration)
+            if num_saves == 0:
                 raise ValueError(f"No iterations found in {load_filename}. Cannot perform warm start.")
-
-            x = read_file['iter_0']['x'][()]
+            x = load_iterate(read_file, num_saves-1, 'x')
+            print(f"Success loading x from iteration {num_saves-1} for warm-start.")
         if len(x) != len(x0.flatten()):
             raise ValueError(f"Given x0 and saved x do not have the same length. Expected {len(x0)} but got {len(x)} from {load_filename}.")
 
@@ -453,7 +1202,7 @@ def optimize(x0, obj=None, grad=None,
         if not all(ms_var in saved_vars for ms_var in minimum_saved_vars):
             raise ValueError(f"All of [objective, constraints, gradient, and jacobian] are not available in {load_filename}. Cannot perform hot start.")
         
-        hot_niter = len(read_file.keys()) - 2 # Number of iterations saved in the file [excludes 0th iteration and results]
+        hot_index = HotStartIndex(read_file, tol=hot_start_tol)
         
         print(f"Hot starting using saved x, objective, constraints, gradient, and jacobian from {load_filename}...")
 
@@ -485,18 +1234,6 @@ def optimize(x0, obj=None, grad=None,
     # clip the initial guess to bounds
     x = np.clip(x, lb, ub)
 
-    exit_modes = {-1: "Gradient evaluation required (g & a)",
-                   0: "Optimization terminated successfully",
-                   1: "Function evaluation required (f & c)",
-                   2: "More equality constraints than independent variables",
-                   3: "More than 3*n iterations in LSQ subproblem",
-                   4: "Inequality constraints incompatible",
-                   5: "Singular matrix E in LSQ subproblem",
-                   6: "Singular matrix C in LSQ subproblem",
-                   7: "Rank-deficient equality constraint subproblem HFTI",
-                   8: "Positive directional derivative for linesearch",
-                   9: "Iteration limit reached"}
-
     # Define a function to clip x to bounds before calling the objective, constraint, gradient, or jacobian functions    
     def _clip_x_for_func(func, lb, ub):
         def _func(x):
@@ -508,8 +1245,59 @@ def optimize(x0, obj=None, grad=None,
     
     r_step = finite_diff_rel_step
     a_step = finite_diff_abs_step
-    
-    if obj is None:
+
+    # Check the executor for evaluating the perturbed points in the finite difference calculations.
+    # Executors for 'thread' and 'process' are created after all the options are checked.
+    if fd_executor in ['thread', 'process']:
+        if fd_workers is not None and (not isinstance(fd_workers, int) or fd_workers < 1):
+            raise ValueError("fd_workers must be a positive integer.")
+    elif fd_executor is not None and not isinstance(fd_executor, Executor):
+        raise ValueError("fd_executor must be None, 'thread', 'process', or an instance of concurrent.futures.Executor.")
+
+    def cs_step(x):
+        '''
+        Compute the imaginary perturbation for the complex-step derivatives at the given x.
+        The step does not perturb the real part of x, so no bound checks are needed.
+        '''
+        return 1j * np.full(n, _cs_step)
+
+    # Group structurally independent columns of the Jacobian to reduce the number of perturbed points
+    jac_groups = None
+    if jac_sparsity is not None:
+        if isinstance(jac_sparsity, tuple):
+            if len(jac_sparsity) != 2:
+                raise ValueError("jac_sparsity must be a tuple (rows, cols) of the nonzero entries or a boolean array of shape (m, n).")
+            jac_rows, jac_cols = jac_sparsity
+        else:
+            jac_sparsity = np.asarray(jac_sparsity)
+            if jac_sparsity.ndim != 2 or jac_sparsity.shape[1] != n:
+                raise ValueError(f"jac_sparsity must be a tuple (rows, cols) of the nonzero entries or a boolean array of shape (m, {n}).")
+            jac_rows, jac_cols = np.nonzero(jac_sparsity)
+        jac_groups, jac_colors = get_column_groups(jac_rows, jac_cols, n)
+        jac_rows = np.asarray(jac_rows, dtype=int).flatten()
+        jac_cols = np.asarray(jac_cols, dtype=int).flatten()
+
+    def assemble_jac(dc, h):
+        '''
+        Assemble the (m, n) Jacobian from the constraint differences dc at the perturbed points 
+        (see _fd_points) and the steps h.
+        '''
+        if jac_groups is None:
+            return dc.T / h # Note: dc.T has shape (m, n) and h has shape (n,) so broadcasting is done correctly
+        
+        if jac_rows.size > 0 and jac_rows.max() >= dc.shape[1]:
+            raise ValueError(f"Row indices in jac_sparsity must be less than the number of constraints ({dc.shape[1]}).")
+        fd_jac = np.zeros((dc.shape[1], n), dtype=float)
+        fd_jac[jac_rows, jac_cols] = dc[jac_colors[jac_cols], jac_rows] / h[jac_cols]
+        return fd_jac
+
+    for name, deriv in [('grad', grad), ('jac', jac)]:
+        if isinstance(deriv, str) and deriv != 'cs':
+            raise ValueError(f"{name} must be a callable, None, or 'cs'.")
+
+    if fused:
+        _obj = _grad = None # Objective and gradient are computed by the fused functions
+    elif obj is None:
         _obj  = lambda x: 0.0
         _grad = lambda x: np.zeros(n, dtype=float)
         warnings.warn("Objective function 'obj' is not defined. Running a feasibility problem...")
@@ -521,26 +1309,30 @@ def optimize(x0, obj=None, grad=None,
             # Note: FD grad() uses unclipped objective function to avoid errors in the finite difference calculation.
             # Note also that input x for grad() is already clipped and within bounds when it is called through _grad().
             def grad(x):
-                if a_step is None:
-                    h = r_step * np.maximum(1, np.abs(x))
+                h = _fd_step(x, r_step, a_step, xu)
+                if obj_batch is not None:
+                    f0, f = _fd_evaluate_batch(obj_batch, x, h)
+                    fd_grad = f - f0
                 else:
-                    h = a_step * np.ones(n)
-
-                fd_grad = np.full((n,), -obj(x), dtype=float)
-                for i in range(n):
-                    # Check if the step will exceed the bounds and reverse the step if necessary
-                    if x[i]+h[i] > xu[i]: # h is always positive so no need to check for lower bound
-                        h[i] = -h[i]
-                    e = np.zeros(n)
-                    e[i] = h[i]
-                    fd_grad[i] += obj(x + e)
-
+                    f0 = obj(x)
+                    fd_grad = np.array(_fd_evaluate(obj, x, h, executor=fd_executor), dtype=float) - f0
                 fd_grad /= h
                 return fd_grad
+            
+        elif grad == 'cs':
+            def grad(x):
+                h = cs_step(x)
+                if obj_batch is not None:
+                    f = _fd_evaluate_batch(obj_batch, x, h)[1]
+                else:
+                    f = np.array(_fd_evaluate(obj, x, h, executor=fd_executor), dtype=complex)
+                return f.imag / h.imag
 
         _grad = _clip_x_for_func(grad, lb, ub)
 
-    if con is None:
+    if fused:
+        _con = _jac = None # Constraints and Jacobian are computed by the fused functions
+    elif con is None:
         print("No constraints defined. Running an unconstrained optimization problem...")
         _con = lambda x: np.array([0.], dtype=float)
         _jac = lambda x: np.zeros((1, n), dtype=float)
@@ -550,87 +1342,97 @@ def optimize(x0, obj=None, grad=None,
             # Note: FD jac() uses unclipped constraint function to avoid errors in the finite difference calculation.
             # Note also that input x for jac() is already clipped and within bounds when it is called through _jac().
             def jac(x):
-                if a_step is None:
-                    h = r_step * np.maximum(1, np.abs(x))
+                h = _fd_step(x, r_step, a_step, xu)
+                if con_batch is not None:
+                    c0, c = _fd_evaluate_batch(con_batch, x, h, jac_groups)
                 else:
-                    h = a_step * np.ones(n)
-
-                fd_jac = np.outer(con(x), -np.ones(n))
-                for i in range(n):
-                    # Check if the step will exceed the bounds and reverse the step if necessary
-                    if x[i]+h[i] > xu[i]: # h is always positive so no need to check for lower bound
-                        h[i] = -h[i]
-                    e = np.zeros(n)
-                    e[i] = h[i]
-                    fd_jac[:, i] += con(x + e)
-                fd_jac /= h # Note: fd_jac has shape (m, n) and h has shape (n,) so broadcasting is done correctly
-                return fd_jac
+                    c0 = np.asarray(con(x), dtype=float)
+                    c = np.array(_fd_evaluate(con, x, h, jac_groups, executor=fd_executor), dtype=float).reshape(-1, c0.size)
+                return assemble_jac(c - c0, h)
+            
+        elif jac == 'cs':
+            def jac(x):
+                h = cs_step(x)
+                if con_batch is not None:
+                    c = _fd_evaluate_batch(con_batch, x, h, jac_groups)[1]
+                else:
+                    c = _fd_evaluate(con, x, h, jac_groups, executor=fd_executor)
+                    # If no column is perturbed (empty sparsity pattern), evaluate con(x) only to get the number of constraints
+                    c = np.array(c, dtype=complex) if c else np.zeros((0, np.size(con(x))))
+                return assemble_jac(c.imag, h.imag)
             
         _jac = _clip_x_for_func(jac, lb, ub)
 
-    prob = Problem(x, _obj, _con, _grad, _jac)
-    fx, c = prob._funcs(x)
-    
-    # Compute the constants that Fortran SLSQP module needs
-    # m: total number of constraints
-    m = len(c) if con is not None else 0
-    # la: The number of constraints, or 1 if there are no constraints
-    la = max(1, m)
-
-    # Allocate the array workspaces needed by the Fortran SLSQP module
-    n1 = n + 1
-    mineq = m - meq + n1 + n1
-    len_w = (3*n1+m)*(n1+1)+(n1-meq+1)*(mineq+2) + 2*mineq+(n1+mineq)*(n1-meq) \
-            + 2*meq + n1 + ((n+1)*n)//2 + 2*m + 3*n + 3*n1 + 1
-    len_jw = mineq
-    w = np.zeros(len_w)
-    jw = np.zeros(len_jw)
-
-    # Set the accuracy as acc, the mode as 0, and the major iteration counter as maxiter
-    mode = array(0, int)
-    acc = array(acc, float)
-    majiter = array(maxiter-1, int)
-    majiter_prev = 0
-
-    # Initialize internal SLSQP state variables
-    alpha = array(0, float)
-    f0 = array(0, float)
-    gs = array(0, float)
-    h1 = array(0, float) # h1 is the optimality (~complementarity) measure,  h1 = mu*max(0, -c[:meq])
-    # h2 is the feasibility measure, h2 = sum(constraint violations) ; con_viol > 0 for infeasible constraints
-    h2 = array(0, float) # h2 is the feasibility measure, h2 = sum(abs(c[:meq]) + sum(max(0, -c[meq:]))
-    h3 = array(0, float)
-    h4 = array(0, float)
-    t = array(0, float)
-    t0 = array(0, float)
-    tol = array(0, float)
-    iexact = array(0, int)
-    incons = array(0, int)
-    ireset = array(0, int)
-    itermx = array(0, int)
-    line = array(0, int)
-    n1 = array(0, int)
-    n2 = array(0, int)
-    n3 = array(0, int)
-    # Although Lagrange multipliers `mu `are supposed to be in w[:m], it is only used in the L1 test function and gets updated there with estimates
-    # so we use the lsq multipliers r() which are the actual Lagrange multipliers
-    # wref indicates where lsq multipliers start in w 
-    wref = int(la+ (n+1)*n/2 + 1 + n)
+    # For fused functions, an empty constraint vector indicates an unconstrained problem
+    # where the dummy constraint and Jacobian are used as in the case when con is None.
+    # This is also used for the constraints loaded for hot starting which are empty for unconstrained problems.
+    has_con = None if fused else (con is not None)
+    def _fused_con(c, j=None):
+        nonlocal has_con
+        c = np.asarray(c, dtype=float).flatten()
+        if has_con is None:
+            has_con = c.size > 0
+            if not has_con:
+                print("No constraints defined. Running an unconstrained optimization problem...")
+        if not has_con:
+            return np.array([0.], dtype=float), np.zeros((1, n), dtype=float)
+        return c, j
+
+    _funcs = _derivs = _evaluate_all = None
+    if funcs is not None:
+        def _raw_funcs(x):
+            f, c = funcs(x)
+            return f, _fused_con(c)[0]
+        _funcs = _clip_x_for_func(_raw_funcs, lb, ub)
+        if derivs is None:
+            # Note: FD derivs() uses unclipped fused function to avoid errors in the finite difference calculation.
+            # The gradient and Jacobian are computed together with one funcs() call per perturbed point.
+            def derivs(x):
+                h = _fd_step(x, r_step, a_step, xu)
+                f0, c0 = funcs(x)
+                fc = _fd_evaluate(funcs, x, h, executor=fd_executor)
+                f = np.array([out[0] for out in fc], dtype=float)
+                c = np.array([out[1] for out in fc], dtype=float).reshape(n, -1)
+                return (f - f0) / h, (c - np.asarray(c0, dtype=float).flatten()).T / h
+    if derivs is not None:
+        def _raw_derivs(x):
+            g, j = derivs(x)
+            if not has_con:
+                return g, np.zeros((1, n), dtype=float)
+            return g, j
+        _derivs = _clip_x_for_func(_raw_derivs, lb, ub)
+    if evaluate_all is not None:
+        def _raw_evaluate_all(x):
+            f, c, g, j = evaluate_all(x)
+            c, j = _fused_con(c, j)
+            return f, c, g, j
+        _evaluate_all = _clip_x_for_func(_raw_evaluate_all, lb, ub)
+
+    if not isinstance(cache_size, int) or cache_size < 1:
+        raise ValueError("cache_size must be a positive integer.")
+    if cache_tol < 0:
+        raise ValueError("cache_tol must be non-negative.")
 
     if save_itr is not None:
         if save_itr not in ['all', 'major']:
             raise ValueError("'save_itr' must be 'all' or 'major'")
         
-        if h5py is None:
-            raise ImportError("h5py is required for saving iterations. Install h5py to use this feature.")
-        # If file exists, delete it
-        try:
-            os.remove(save_filename)
-        except FileNotFoundError:
-            pass
+        if save_backend is None:
+            save_backend = 'hdf5' if _import_h5py() is not None else 'npy'
+        if save_backend not in ['hdf5', 'npy']:
+            raise ValueError("'save_backend' must be 'hdf5' or 'npy'")
+        if save_backend == 'hdf5' and _import_h5py() is None:
+            raise ImportError("h5py is required for saving iterations with save_backend='hdf5'. Install h5py or use save_backend='npy'.")
+        if os.path.isdir(save_filename):
+            if save_backend == 'hdf5' or not os.path.exists(os.path.join(save_filename, 'header.json')):
+                raise ValueError(f"Cannot save iterations to {save_filename} since it is an existing directory that is not an npy recorder directory.")
 
         # 'ismajor', 'iter', `majiter` are appended to the save_vars list by default to indicate if the iteration is a major iteration
+        # 'mode' is appended to indicate whether the saved functions or derivatives were evaluated at the saved x (used for hot start)
         in_save_vars = copy.copy(save_vars)
+        save_vars = copy.copy(save_vars) # Copied so that the input list is not modified
+        if 'mode' not in save_vars:
+            save_vars.append('mode')
         if 'ismajor' not in save_vars:
             save_vars.append('ismajor')
         if 'iter' not in save_vars:
@@ -638,230 +1440,293 @@ def optimize(x0, obj=None, grad=None,
         if 'majiter' not in save_vars:
             save_vars.append('majiter')
 
+        if save_layout not in ['groups', 'columnar']:
+            raise ValueError("'save_layout' must be 'groups' or 'columnar'")
+        
         if not set(save_vars).issubset(['x', 'objective', 'optimality', 'feasibility', 'step', 'mode', 'iter', 'majiter', 'ismajor', 'constraints', 'gradient', 'multipliers', 'jacobian']):
             raise ValueError("Invalid variable in save_vars. Must be one of " \
                              "'x', 'objective', 'optimality', 'feasibility', 'step', 'mode', 'iter', 'majiter', 'ismajor', 'constraints', 'gradient', 'multipliers', or 'jacobian'.")
-        
-        file = h5py.File(save_filename, 'a')
-        file.attrs['n'] = n
-        file.attrs['m'] = m
-        file.attrs['meq'] = meq
-        
-        file.attrs['x0'] = x0
-        file.attrs['xl'] = in_xl if in_xl is not None else 'None (undefined)'
-        file.attrs['xu'] = in_xu if in_xu is not None else 'None (undefined)'
-
-        file.attrs['x_scaler'] = x_scaler
-        file.attrs['obj_scaler'] = obj_scaler
-        file.attrs['con_scaler'] = con_scaler
 
-        file.attrs['maxiter'] = maxiter
-        file.attrs['acc'] = acc
-        file.attrs['iprint'] = iprint
+        if save_async and (not isinstance(save_queue_size, int) or save_queue_size < 1):
+            raise ValueError("save_queue_size must be a positive integer.")
 
-        if finite_diff_abs_step is not None:
-            file.attrs['finite_diff_abs_step'] = finite_diff_abs_step
-        else:
-            file.attrs['finite_diff_abs_step'] = 'None (undefined)'
-        
-        file.attrs['finite_diff_rel_step'] = finite_diff_rel_step
-        file.attrs['summary_filename'] = summary_filename
-        file.attrs['save_itr'] = save_itr
-        file.attrs['save_filename'] = save_filename
-        file.attrs['save_vars'] = in_save_vars
-        file.attrs['warm_start'] = warm_start
-        file.attrs['hot_start'] = hot_start
-        if load_filename is not None:
-            file.attrs['load_filename'] = load_filename
+    # Create the executor for evaluating the perturbed points in the finite difference calculations.
+    # The executor is shut down even if the optimization raises an exception.
+    shutdown_fd_executor = False
+    if fd_executor in ['thread', 'process']:
+        if fd_executor == 'thread':
+            fd_executor = ThreadPoolExecutor(max_workers=fd_workers)
         else:
-            file.attrs['load_filename'] = 'None (undefined)'
-        file.attrs['visualize'] = visualize
-        file.attrs['visualize_vars'] = visualize_vars
-        file.attrs['keep_plot_open'] = keep_plot_open
-        file.attrs['save_figname'] = save_figname
-
-    # mode is zero on entry, so call objective, constraints and gradients
-    # there should be no func evaluations here because it's cached from prob
-    if hot_start:
-        hot_run = True # Turn on hot_run which indicates that the optimization is using the saved variables until hot_run is turned off
-        x, fx, c, g, a = check_load_variables(read_file, 0, x, vars=['x', 'objective', 'constraints', 'gradient', 'jacobian'])
-        prob.nfev = 1 # Counter for number of function evaluations in the hot start
-        prob.ngev = 1 # Counter for number of gradient evaluations in the hot start
-    else:
-        fx, c = prob._funcs(x)
-        g,  a = prob._derivs(x)
-    g = np.append(g, 0.0)
-    a = np.concatenate((a, np.zeros([la, 1])), 1)
-
-    iter = 0
-    opt_time = 0.0
+            from concurrent.futures import ProcessPoolExecutor # Imported here since it imports multiprocessing
+            fd_executor = ProcessPoolExecutor(max_workers=fd_workers)
+        shutdown_fd_executor = True
+
+    store = file = recorder = visualizer = None
+    completed = recorder_closed = False
+    try:
+        # The visualizer is created after all the options are checked so that the plot (or the plotting process)
+        # is always closed below
+        if visualize:
+            if visualize_mode == 'inline':
+                visualizer = Visualizer(visualize_vars, summary_filename, save_figname, visualize_interval, visualize_min_time)
+            else:
+                visualizer = ProcessVisualizer(visualize_vars, summary_filename, save_figname, visualize_interval, visualize_min_time, 
+                                               headless=(visualize_mode == 'headless'))
 
-    out_dict = {}
-    out_dict['iter'] = iter
-    out_dict['majiter'] = 0
-    out_dict['ismajor'] = True
-    out_dict['mode'] = mode
-    out_dict['x'] = x
-    out_dict['objective'] = fx
-    out_dict['constraints'] = c[:m]
-    out_dict['gradient'] = g[:-1]
-    out_dict['multipliers'] = w[wref:wref+m]
-    out_dict['jacobian'] = a[:, :-1]
-    out_dict['optimality'] = 99.0    # Optimality is not available in the 0th iteration
-    out_dict['feasibility'] = 99.0   # Feasibility is not available in the 0th iteration
-    out_dict['step'] = 99.0          # Step is undefined in the 0th iteration
-
-    if save_itr is not None: # Note majiter and iter are the same for the first iteration
-        save_iteration(file, iter, save_vars, out_dict)
-
-    # Print the header if iprint >= 2
-    if iprint >= 2:
-        print("%5s %5s %5s %16s %16s %16s %16s %16s %16s" % ("MAJOR", "NFEV", "NGEV", "OBJFUN", "GNORM", "CNORM", "FEAS", "OPT", "STEP"))
-        print("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E" % (0, 1, 1, fx, linalg.norm(g), linalg.norm(c), 99.0, 99.0, 99.0))
-
-        # with open('duals_slsqp_maj.out', 'w') as f:
-        #     np.savetxt(f, w[wref:wref+m].reshape(1,m))
-
-    # Write the header to the summary file regardless of the iprint value
-    with open(summary_filename, 'w') as f:
-        f.write("%5s %5s %5s %16s %16s %16s %16s %16s %16s \n" % ("MAJOR", "NFEV", "NGEV", "OBJFUN", "GNORM", "CNORM", "FEAS", "OPT", "STEP"))
-        f.write("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E \n" % (0, 1, 1, fx, linalg.norm(g), linalg.norm(c), 99.0, 99.0, 99.0))
+        if eval_store is not None:
+            store = EvaluationStore(eval_store, tag=eval_store_tag)
 
-    if visualize:
-        visualizer.update_plot(out_dict)
-
-    # Scaler check and initialization
-    x_scaler   = copy.copy(x_scaler)     # Copied so that the original is not modified, if used later by the user
-    con_scaler = copy.copy(con_scaler)   # Copied so that the original is not modified, if used later by the user
-    obj_scaler = copy.copy(obj_scaler)   # Copied so that the original is not modified, if used later by the user
-    x_scaler   = check_update_scalar(x_scaler, 'x_scaler', n, 'optimization variables x0')
-    con_scaler = check_update_scalar(con_scaler, 'con_scaler', la, 'constraints con(x)') # size of (la,)
-    obj_scaler = check_update_scalar(obj_scaler, 'obj_scaler', 1, 'objective function f(x)')[0]
+        prob = Problem(x, _obj, _con, _grad, _jac, funcs=_funcs, derivs=_derivs, evaluate_all=_evaluate_all, events=event_stream, 
+                       cache_size=cache_size, cache_tol=cache_tol, store=store)
     
-    x_inv_scaler = np.append(1.0 / x_scaler, 0.0) # size of (n+1,)
-    g_scaler = obj_scaler * x_inv_scaler
+        # mode is zero on entry, so the objective, constraints and derivatives at x are computed before calling SLSQP
+        if hot_start:
+            # Seed the problem with the values saved at the 0th iteration so that no functions are evaluated at x0
+            hot_run = True # Turn on hot_run which indicates that the optimization is using the saved variables for x found in the file
+            hot_diverged = False
+            hot_nfev = 1 # Number of function evaluations that used saved variables
+            hot_ngev = 1 # Number of derivative evaluations that used saved variables
+            x, fx, c, g, a = check_load_variables(read_file, 0, x, vars=['x', 'objective', 'constraints', 'gradient', 'jacobian'])
+            c, a = _fused_con(c, a)
+            prob._seed(x, fx, c, g, a)
+            prob.nfev = 1 # Counter for number of function evaluations in the hot start
+            prob.ngev = 1 # Counter for number of gradient evaluations in the hot start
+        else:
+            fx, c = prob._funcs(x)
+            g,  a = prob._derivs(x)
     
-    # Apply scaling to optimization variables and its bounds
-    xl_scaled = xl * x_scaler
-    xu_scaled = xu * x_scaler
-    x_scaled  = x  * x_scaler
+        # Compute the constants that Fortran SLSQP module needs
+        # m: total number of constraints
+        m = len(c) if has_con else 0
+        # la: The number of constraints, or 1 if there are no constraints
+        la = max(1, m)
+
+        # Allocate the array workspaces and the internal state variables needed by the Fortran SLSQP module.
+        # Set the accuracy as acc, the mode as 0, and the major iteration counter as maxiter-1
+        workspace = Workspace(n, m, meq)
+        workspace.reset(acc, maxiter)
+        mode = workspace.mode
 
-    while 1:
-        # Scale the objective, constraints, gradients and jacobian
-        fx_scaled = fx * obj_scaler                         # scalar
-        c_scaled  = c  * con_scaler                         # size of (la,)
-        g_scaled  = g  * g_scaler                           # size of (n+1,)
-        a_scaled  = a  * np.outer(con_scaler, x_inv_scaler) # size of (la, n+1)
-
-        iter += 1
-        # Call SLSQP
-        opt_start = time.time()
-        slsqp(m, meq, x_scaled, xl_scaled, xu_scaled, fx_scaled, c_scaled, g_scaled, a_scaled, acc, majiter, mode, w, jw,
-              alpha, f0, gs, h1, h2, h3, h4, t, t0, tol,
-              iexact, incons, ireset, itermx, line,
-              n1, n2, n3)
-        opt_time += time.time() - opt_start
+        if save_itr is not None:
+            # If file exists, delete it
+            if os.path.isdir(save_filename):
+                shutil.rmtree(save_filename)
+            try:
+                os.remove(save_filename)
+            except FileNotFoundError:
+                pass
+
+            if save_backend == 'npy':
+                file = NpyFile(save_filename, 'w')
+            else:
+                file = _import_h5py().File(save_filename, 'a')
+            file.attrs['n'] = n
+            file.attrs['m'] = m
+            file.attrs['meq'] = meq
+        
+            file.attrs['x0'] = x0
+            file.attrs['xl'] = in_xl if in_xl is not None else 'None (undefined)'
+            file.attrs['xu'] = in_xu if in_xu is not None else 'None (undefined)'
 
-        if majiter > majiter_prev and majiter != majiter_prev + 1:
-            warnings.warn(f"SLSQP Bug: Major iteration counter jumped from {majiter_prev} to {majiter}. Resetting to {majiter_prev + 1}.")
-            majiter = majiter_prev + 1
+            file.attrs['x_scaler'] = x_scaler
+            file.attrs['obj_scaler'] = obj_scaler
+            file.attrs['con_scaler'] = con_scaler
 
-        x = x_scaled / x_scaler
+            file.attrs['maxiter'] = maxiter
+            file.attrs['acc'] = acc
+            file.attrs['iprint'] = iprint
 
-        if hot_run:
-            if iter == hot_niter:
-                # Hot start is complete. Turn off hot_run and begin normal function evaluations
-                print(f"Hot start is complete at iteration {iter}. Starting normal function evaluations...")
-                hot_run = False
-                hot_nfev = prob.nfev * 1    # Number of function evaluations that used saved variables
-                hot_ngev = prob.ngev * 1    # Number of derivative evaluations that used saved variables
+            if finite_diff_abs_step is not None:
+                file.attrs['finite_diff_abs_step'] = finite_diff_abs_step
             else:
-                try:
-                    if mode == 1:   # objective and constraint evaluation required
-                        fx, c = check_load_variables(read_file, iter, x, vars=['objective', 'constraints'])
-                        prob.nfev += 1      # update problem nfev counter along with hot fevals
-                    if mode == -1:   # derivative evaluation required
-                        g, a = check_load_variables(read_file, iter, x, vars=['gradient', 'jacobian'])
-                        g = np.append(g, 0.0)
-                        a = np.concatenate((a, np.zeros([la, 1])), 1)
-                        prob.ngev += 1      # update problem ngev counter along with hot gevals
-                    
-                except:
-                    # Hot start failed. Turn off hot_run and begin normal function evaluations
-                    print(f"Hot start failed at iteration {iter}. Starting normal function evaluations...")
-                    hot_run = False
-                    hot_nfev = prob.nfev * 1    # Number of function evaluations that used saved variables
-                    hot_ngev = prob.ngev * 1    # Number of derivative evaluations that used saved variables
+                file.attrs['finite_diff_abs_step'] = 'None (undefined)'
         
-        # Below should not be else, as hot_run can be turned off in the above block 
-        if not hot_run:
-            if mode == 1:  # objective and constraint evaluation required
-                fx, c = prob._funcs(x)
-        
-            if mode == -1:  # derivative evaluation required
-                g, a = prob._derivs(x)
-                g = np.append(g, 0.0)
-                a = np.concatenate((a, np.zeros([la, 1])), 1)
+            file.attrs['finite_diff_rel_step'] = finite_diff_rel_step
+            file.attrs['summary_filename'] = summary_filename
+            file.attrs['save_itr'] = save_itr
+            file.attrs['save_filename'] = save_filename
+            file.attrs['save_vars'] = in_save_vars
+            file.attrs['warm_start'] = warm_start
+            file.attrs['hot_start'] = hot_start
+            if load_filename is not None:
+                file.attrs['load_filename'] = load_filename
+            else:
+                file.attrs['load_filename'] = 'None (undefined)'
+            file.attrs['visualize'] = visualize
+            file.attrs['visualize_vars'] = visualize_vars
+            file.attrs['keep_plot_open'] = keep_plot_open
+            file.attrs['save_figname'] = save_figname
+
+            if save_async:
+                recorder = AsyncRecorder(file, save_vars, layout=save_layout, compression=save_compression, maxsize=save_queue_size)
+            else:
+                recorder = Recorder(file, save_vars, layout=save_layout, compression=save_compression)
 
-        # Check if slsqp exits with a mode other than +/- 1 meaning it has completed
-        # SLSQP sometimes forgets to update the majiter when it exits with abs(mode) != 1 (Possible bug?)
-        if abs(mode) != 1:
-            if majiter == majiter_prev: # If majiter has not incremented when exiting, increment it
-                majiter = int(majiter) + 1
-            
+        g = np.append(g, 0.0)
+        a = np.concatenate((a, np.zeros([la, 1])), 1)
+
+        iter = 0
+
+        out_dict = {}
         out_dict['iter'] = iter
-        out_dict['majiter'] = majiter * 1 # Copy the value of majiter to out_dict
-        out_dict['ismajor'] = True if majiter > majiter_prev else False
+        out_dict['majiter'] = 0
+        out_dict['ismajor'] = True
         out_dict['mode'] = mode
         out_dict['x'] = x
         out_dict['objective'] = fx
         out_dict['constraints'] = c[:m]
         out_dict['gradient'] = g[:-1]
-        out_dict['multipliers'] = w[wref:wref+m]
+        out_dict['multipliers'] = workspace.multipliers()
         out_dict['jacobian'] = a[:, :-1]
-        out_dict['optimality'] = h1
-        # out_dict['feasibility'] = h2
-        out_dict['feasibility'] = feas_calc = np.sum(np.abs(c[:meq])) + np.sum(np.maximum(0, -c[meq:]))
-        out_dict['step'] = alpha
-
-        if save_itr == 'all':
-            save_iteration(file, iter, save_vars, out_dict)
-
-        if majiter > majiter_prev:
-            if save_itr == 'major':
-                save_iteration(file, majiter*1, save_vars, out_dict)
-            # call callback if major iteration has incremented
-            if callback is not None:
-                callback(np.copy(x))
-
-            # Print the status of the current major iterate if iprint >= 2
-            if iprint >= 2:
-                # print('abs sum of constraint violations', h2)
-                # print('some measure of optimality (~complementarity)', h3)
-                print("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E" % (majiter, prob.nfev, prob.ngev,
-                                                   fx, linalg.norm(g), linalg.norm(c), feas_calc, h1, alpha))
-                # with open('obj_slsqp.out', 'a') as f:
-                #     np.savetxt(f, [fx])
-                # with open('opt_slsqp.out', 'a') as f:
-                #     np.savetxt(f, [h2])
-                # with open('feas_slsqp.out', 'a') as f:
-                #     np.savetxt(f, [h1])
-                # with open('duals_slsqp_maj.out', 'a') as f:
-                #     np.savetxt(f, w[wref:wref+m].reshape(1,m))
-
-            # Write the status of the current iteration to the summary file regardless of the iprint value
-            with open(summary_filename, 'a') as f:
-                f.write("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E \n" % (majiter, prob.nfev, prob.ngev,
-                                                fx, linalg.norm(g), linalg.norm(c), feas_calc, h1, alpha))
-                                                # fx, linalg.norm(g), np.sum(np.abs(c[:meq]))+np.sum(np.maximum(0, -c[meq:])), h2, h1, alpha))
-            if visualize:
-                visualizer.update_plot(out_dict)
-
-        # If exit mode is not -1 or 1, slsqp has completed
-        if abs(mode) != 1:            
-            break
+        out_dict['optimality'] = 99.0    # Optimality is not available in the 0th iteration
+        out_dict['feasibility'] = 99.0   # Feasibility is not available in the 0th iteration
+        out_dict['step'] = 99.0          # Step is undefined in the 0th iteration
+
+        def record(save_iter):
+            '''
+            Save the current iteration as save_iter to the recorder and emit the 'record_write' event.
+            '''
+            e_start = time.perf_counter_ns()
+            recorder.save(save_iter, out_dict)
+            if event_stream is not None and event_stream.wants('record_write'):
+                nbytes = sum(np.asarray(out_dict[var]).nbytes for var in save_vars)
+                event_stream.emit('record_write', e_start, time.perf_counter_ns(), out_dict['iter'], int(out_dict['majiter']), nbytes, 
+                                  save_iter=int(save_iter))
+
+        def update_plot():
+            '''
+            Update the plot with the current iteration and emit the 'plot_update' event.
+            '''
+            e_start = time.perf_counter_ns()
+            visualizer.update_plot(out_dict)
+            if event_stream is not None:
+                event_stream.emit('plot_update', e_start, time.perf_counter_ns(), out_dict['iter'], int(out_dict['majiter']))
+
+        if save_itr is not None: # Note majiter and iter are the same for the first iteration
+            record(iter)
+
+        # Print the header if iprint >= 2
+        if iprint >= 2:
+            print("%5s %5s %5s %16s %16s %16s %16s %16s %16s" % ("MAJOR", "NFEV", "NGEV", "OBJFUN", "GNORM", "CNORM", "FEAS", "OPT", "STEP"))
+            print("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E" % (0, 1, 1, fx, linalg.norm(g), linalg.norm(c), 99.0, 99.0, 99.0))
+
+            # with open('duals_slsqp_maj.out', 'w') as f:
+            #     np.savetxt(f, w[wref:wref+m].reshape(1,m))
 
-        majiter_prev = int(majiter)
+        if visualize:
+            update_plot()
+
+        # Scaler check and initialization
+        x_scaler   = copy.copy(x_scaler)     # Copied so that the original is not modified, if used later by the user
+        con_scaler = copy.copy(con_scaler)   # Copied so that the original is not modified, if used later by the user
+        obj_scaler = copy.copy(obj_scaler)   # Copied so that the original is not modified, if used later by the user
+        x_scaler   = check_update_scalar(x_scaler, 'x_scaler', n, 'optimization variables x0')
+        con_scaler = check_update_scalar(con_scaler, 'con_scaler', la, 'constraints con(x)') # size of (la,)
+        obj_scaler = check_update_scalar(obj_scaler, 'obj_scaler', 1, 'objective function f(x)')[0]
+    
+        # Apply scaling to the bounds
+        xl_scaled = xl * x_scaler
+        xu_scaled = xu * x_scaler
+
+        def load(x, mode):
+            '''
+            Load the saved evaluations from the hot start file if x is found in the file.
+            Returns None if x is not found, so that the functions are evaluated.
+            '''
+            nonlocal hot_nfev, hot_ngev, hot_diverged
+            saved = hot_index.load(x, derivs=(mode == -1))
+            if saved is not None:
+                if mode == 1:   # objective and constraint evaluation required
+                    fx, c = saved
+                    if m == 0:
+                        c = np.array([0.], dtype=float) # dummy constraint for unconstrained problems
+                    prob.nfev += 1      # update problem nfev counter along with hot fevals
+                    hot_nfev += 1
+                    return fx, c
+                else:           # derivative evaluation required
+                    prob.ngev += 1      # update problem ngev counter along with hot gevals
+                    hot_ngev += 1
+                    return saved
+            if not hot_diverged:
+                # The path diverged from the saved path. Saved evaluations are still used for any x found in the file.
+                print(f"Saved evaluations not found for x at iteration {prob.iter}. Evaluating functions for x not found in {load_filename}...")
+                hot_diverged = True
+
+        def iteration(iter, majiter, ismajor, x, fx, c, g, a):
+            '''
+            Save, print, and plot the current iteration, and call the callback after major iterations.
+            '''
+            out_dict['iter'] = iter
+            out_dict['majiter'] = majiter
+            out_dict['ismajor'] = ismajor
+            out_dict['mode'] = mode
+            out_dict['x'] = x
+            out_dict['objective'] = fx
+            out_dict['constraints'] = c[:m]
+            out_dict['gradient'] = g[:-1]
+            out_dict['multipliers'] = workspace.multipliers()
+            out_dict['jacobian'] = a[:, :-1]
+            out_dict['optimality'] = workspace.h1
+            # out_dict['feasibility'] = workspace.h2
+            out_dict['feasibility'] = feas_calc = np.sum(np.abs(c[:meq])) + np.sum(np.maximum(0, -c[meq:]))
+            out_dict['step'] = alpha = workspace.alpha
+
+            if save_itr == 'all':
+                record(iter)
+
+            if ismajor:
+                if save_itr == 'major':
+                    record(majiter)
+                # Flush the evaluations saved in the store once per major iteration rather than after every evaluation
+                if store is not None:
+                    store.flush()
+                # call callback if major iteration has incremented
+                if callback is not None:
+                    callback(np.copy(x))
+
+                # Print the status of the current major iterate if iprint >= 2
+                if iprint >= 2:
+                    # print('abs sum of constraint violations', workspace.h2)
+                    # print('some measure of optimality (~complementarity)', workspace.h3)
+                    print("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E" % (majiter, prob.nfev, prob.ngev,
+                                                       fx, linalg.norm(g), linalg.norm(c), feas_calc, workspace.h1, alpha))
+
+                # Write the status of the current iteration to the summary file regardless of the iprint value
+                summary.write(majiter, prob.nfev, prob.ngev, fx, linalg.norm(g), linalg.norm(c), feas_calc, workspace.h1, alpha)
+                if visualize:
+                    update_plot()
+                if event_stream is not None:
+                    event_stream.emit('major_iter', time.perf_counter_ns(), None, iter, majiter, 0, 
+                                      objective=float(fx), optimality=float(workspace.h1), feasibility=float(feas_calc), step=float(alpha),
+                                      nfev=prob.nfev, ngev=prob.ngev)
+
+        # Write the header and the 0th iteration to the summary file regardless of the iprint value.
+        # The summary file is kept open during the optimization and closed even if the optimization raises an exception.
+        with SummaryWriter(summary_filename, summary_format, summary_flush_interval) as summary:
+            summary.write(0, 1, 1, fx, linalg.norm(g), linalg.norm(c), 99.0, 99.0, 99.0)
+            x, fx, c, g, a, majiter, opt_time = _run_slsqp(workspace, prob, x, fx, c, g, a, xl_scaled, xu_scaled,
+                                                           x_scaler, obj_scaler, con_scaler,
+                                                           load=load if hot_run else None, iteration=iteration)
+        completed = True
+    finally:
+        if shutdown_fd_executor:
+            fd_executor.shutdown()
+        if store is not None:
+            store.close()
+        try:
+            if recorder is not None:
+                # Waits for the background writer to save all the queued iterations if save_async is True,
+                # and writes the index of the saved iterations even if the optimization raised an exception
+                recorder.close()
+                recorder_closed = True
+        finally:
+            # The file is kept open for saving the results only if the optimization and the recorder completed successfully
+            if file is not None and not (completed and recorder_closed):
+                file.close()
+            # If the optimization raised an exception, close the plot and stop the plotting process.
+            # Otherwise, the plot is kept open or closed below as requested.
+            if visualizer is not None and not completed:
+                visualizer.close_plot()
 
     vis_time = 0.0
     vis_wait = 0.0
@@ -889,13 +1754,18 @@ def optimize(x0, obj=None, grad=None,
         else:
             print("            Number of function evaluations       : {:d}".format(prob.nfev))
             print("            Number of derivative evaluations     : {:d}".format(prob.ngev))
-        print("            Average Derivative evaluation time   : {:.6f} s per evaluation".format(prob.fev_time/prob.nfev))
-        print("            Average Function evaluation time     : {:.6f} s per evaluation".format(prob.gev_time/prob.ngev))
+        if store is not None:
+            print("            Evaluations reused from store        : {:d}".format(prob.store_hits))
+        print("            Average Derivative evaluation time   : {:.6f} s per evaluation".format(prob.fev_time/max(prob.nfev, 1)))
+        print("            Average Function evaluation time     : {:.6f} s per evaluation".format(prob.gev_time/max(prob.ngev, 1)))
         print("            Total Function evaluation time       : {:.6f} s [{:6.2f}%]".format(prob.fev_time, prob.fev_time/total_time*100))
         print("            Total Derivative evaluation time     : {:.6f} s [{:6.2f}%]".format(prob.gev_time, prob.gev_time/total_time*100))
         print("            Optimizer time                       : {:.6f} s [{:6.2f}%]".format(opt_time, opt_time/total_time*100))
         print("            Processing time                      : {:.6f} s [{:6.2f}%]".format(processing_time, processing_time/total_time*100))
         print("            Visualization time                   : {:.6f} s [{:6.2f}%]".format(vis_time, vis_time/total_time*100))
+        if save_itr is not None and save_async:
+            print("            Recorder write time (background)     : {:.6f} s".format(recorder.write_time))
+            print("            Recorder wait time                   : {:.6f} s [{:6.2f}%]".format(recorder.wait_time, recorder.wait_time/total_time*100))
         print("            Total optimization time              : {:.6f} s [{:6.2f}%]".format(total_time, 100.00))
         print("            Summary saved to                     : " + summary_filename)
         if save_itr is not None:
@@ -903,18 +1773,9 @@ def optimize(x0, obj=None, grad=None,
         if visualize:
             print("            Plot saved to                        : " + save_figname)
 
-    results = {}
-    results['x'] = x
-    results['objective'] = fx
-    results['optimality'] = h1
-    results['feasibility'] = feas_calc
-    results['constraints'] = c[:m]
-    results['multipliers'] = w[wref:wref+m]
-    results['gradient'] = g[:-1]
-    results['jacobian'] = a[:m, :-1]
-    results['num_majiter'] = int(majiter)
-    results['nfev'] = prob.nfev
-    results['ngev'] = prob.ngev
+    results = _get_results(workspace, prob, x, fx, c, g, a, majiter)
+    if store is not None:
+        results['store_hits'] = prob.store_hits
     if hot_start:
         results['nfev_reused_in_hotstart'] = hot_nfev if hot_start else 0
         results['ngev_reused_in_hotstart'] = hot_ngev if hot_start else 0
@@ -924,9 +1785,9 @@ def optimize(x0, obj=None, grad=None,
     results['processing_time'] = processing_time
     results['visualization_time'] = vis_time
     results['total_time'] = total_time
-    results['status'] = int(mode)
-    results['message'] = exit_modes[int(mode)]
-    results['success'] = (mode == 0)
+    if save_itr is not None and save_async:
+        results['recorder_write_time'] = recorder.write_time
+        results['recorder_wait_time'] = recorder.wait_time
     results['summary_filename'] = summary_filename
     if save_itr is not None:
         results['save_filename'] = save_filename
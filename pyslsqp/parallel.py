@@ -0,0 +1,457 @@
+"""
+This module provides drivers for running many independent optimizations in parallel,
+e.g., for design sweeps over a grid of parameters or multi-start optimization.
+"""
+
+import os
+import time
+import pickle
+import inspect
+import warnings
+import itertools
+import threading
+import numpy as np
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from pyslsqp.main import optimize
+from pyslsqp.solver import Solver
+
+# Specs of the problems shared with the worker processes forked with executor='fork', keyed by the id of the batch
+_shared_specs = {}
+
+# Unique ids of the multistart runs for identifying the solvers cached in the worker threads
+_run_ids = itertools.count()
+
+# Solver of the latest multistart run in each worker thread
+_local = threading.local()
+
+def _import_cloudpickle():
+    '''
+    Import cloudpickle on first use for pickling the functions that the standard pickle cannot serialize, e.g., lambdas.
+    Returns None if cloudpickle is not installed.
+    '''
+    try:
+        import cloudpickle
+    except ImportError:
+        return None
+    return cloudpickle
+
+def _import_qmc():
+    '''
+    Import the quasi-Monte Carlo module of SciPy on first use for Sobol sampling.
+    '''
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("scipy is required for Sobol sampling. Install scipy or use sampling='lhs'.")
+    return qmc
+
+def _run_spec(spec):
+    return optimize(**spec)
+
+def _run_shared(key, k):
+    return optimize(**_shared_specs[key][k])
+
+def _run_pickled(data):
+    return optimize(**pickle.loads(data))
+
+def _suffix_filename(filename, k):
+    '''
+    Return the filename with the index k appended to its root, e.g., 'slsqp_summary_3.out' for 'slsqp_summary.out'.
+    '''
+    root, ext = os.path.splitext(filename) # ext is '' for directories saved with the 'npy' backend
+    return f"{root}_{k}{ext}"
+
+def _get_specs(problems, params, options):
+    '''
+    Return the list of keyword arguments to ``optimize()`` for each problem and the list of parameters (or None).
+    '''
+    names = list(inspect.signature(optimize).parameters)
+    if params is not None:
+        if not callable(problems):
+            raise ValueError("problems must be a callable that returns a problem for the given parameters when params is given.")
+        if isinstance(params, dict):
+            # Cartesian product of the lists of values for each parameter
+            keys = list(params.keys())
+            params = [dict(zip(keys, values)) for values in itertools.product(*params.values())]
+        params = list(params)
+        problems = [problems(**p) for p in params]
+
+    specs = []
+    for k, problem in enumerate(problems):
+        if isinstance(problem, dict):
+            spec = dict(problem)
+        elif isinstance(problem, (tuple, list)):
+            if len(problem) > len(names):
+                raise ValueError(f"Problem {k} has more entries than the arguments of optimize().")
+            spec = dict(zip(names, problem))
+        else:
+            raise ValueError(f"Problem {k} must be a dict of keyword arguments or a tuple of positional arguments to optimize().")
+        if spec.get('x0') is None:
+            raise ValueError(f"Problem {k} must provide the initial guess 'x0'.")
+        unknown = set(spec) - set(names)
+        if unknown:
+            raise ValueError(f"Problem {k} has invalid arguments {sorted(unknown)} for optimize().")
+
+        # Options for all the problems are overridden by the options given for each problem.
+        # Each run writes to its own summary file (and recorder file, if saving) unless given in the problem.
+        given = set(spec)
+        spec = {**options, **spec}
+        if 'summary_filename' not in given:
+            spec['summary_filename'] = _suffix_filename(spec.get('summary_filename', 'slsqp_summary.out'), k)
+        if spec.get('save_itr') is not None and 'save_filename' not in given:
+            spec['save_filename'] = _suffix_filename(spec.get('save_filename', 'slsqp_recorder.hdf5'), k)
+        specs.append(spec)
+    return specs, params
+
+def _get_executor(executor, workers):
+    '''
+    Return the executor for the given option, whether it should be shut down after use,
+    and whether its worker processes are forked from this process.
+    '''
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        raise ValueError("workers must be a positive integer.")
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers=workers), True, False
+    if executor in ['process', 'fork']:
+        import multiprocessing # Imported here since it is only needed for the process executors
+        from concurrent.futures import ProcessPoolExecutor
+        if executor == 'process':
+            return ProcessPoolExecutor(max_workers=workers), True, False
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError("executor='fork' is not supported on this platform. Use executor='process' instead.")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')), True, True
+    if executor is not None and not isinstance(executor, Executor):
+        raise ValueError("executor must be None, 'thread', 'process', 'fork', or an instance of concurrent.futures.Executor.")
+    return executor, False, False
+
+def _check_thread_acc(executor, accs):
+    '''
+    Raise an error if any of the optimizations with the given accuracies uses the exact line search (acc < 0)
+    on threads (see ``acc`` in ``optimize()``).
+    '''
+    if (executor == 'thread' or isinstance(executor, ThreadPoolExecutor)) and any(acc < 0 for acc in accs):
+        raise ValueError("acc < 0 is not thread-safe and cannot be used with a thread executor.")
+
+def _dumps(obj):
+    '''
+    Pickle the object for the worker processes using cloudpickle, if installed, to support lambdas and closures.
+    '''
+    cloudpickle = _import_cloudpickle()
+    dumps = pickle.dumps if cloudpickle is None else cloudpickle.dumps
+    try:
+        return dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError) as error:
+        raise ValueError("The problems could not be pickled for the worker processes. Install cloudpickle "
+                         "to pickle lambdas and closures, or use executor='thread' or 'fork'.") from error
+
+def optimize_many(problems, params=None, workers=None, executor='process', **options):
+    """
+    Solve many independent optimization problems in parallel using ``optimize()``
+    and return the results in the same order as the problems.
+
+    Each problem is given as a dictionary of keyword arguments to ``optimize()``, e.g.,
+    ``{'x0': x0, 'obj': obj, 'con': con, 'meq': 1}``, or as a tuple of positional arguments
+    in the order of the arguments of ``optimize()``, e.g., ``(x0, obj, grad, con, jac, meq)``.
+    Alternatively, the problems can be generated from a grid of parameters
+    by giving a function that returns a problem for the given parameters as ``problems``
+    and the parameters as ``params``.
+
+    Each run writes its summary to a separate file, named by appending the index of the problem
+    to the summary filename, e.g., ``slsqp_summary_3.out`` for the 4th problem, unless the problem specifies
+    its own ``summary_filename``. The recorder files are named similarly when saving iterations.
+
+    With the 'process' executor (or a given process pool), the problems are pickled for the worker processes 
+    using cloudpickle, if installed, or the standard pickle module, which cannot pickle lambdas or closures.
+    With the 'fork' executor, which is only available on POSIX platforms, the worker processes are forked 
+    after the problems are set up, so the problems are not pickled and the functions can be lambdas or closures.
+    Forking is opt-in since it is unsafe if other threads are running in this process, 
+    e.g., the threads of an ``fd_executor``, an asynchronous recorder, or concurrent optimizations.
+    The 'thread' executor runs the optimizations on threads; the SLSQP subroutine releases the GIL,
+    but the Python functions are evaluated while holding the GIL.
+    ``acc`` < 0 cannot be used with a thread executor (see ``acc`` in ``optimize()``).
+
+    Parameters
+    ----------
+    problems : list or callable
+        List of problems, each a dictionary of keyword arguments or a tuple of positional arguments to ``optimize()``.
+        If ``params`` is given, a function that returns a problem for the given parameters
+        as keyword arguments, i.e., ``problems(**p)`` for each ``p`` in ``params``.
+    params : list of dict or dict of lists, optional
+        Parameters for generating the problems. A dictionary of lists is expanded into
+        all the combinations of the values (a parameter grid), e.g., ``{'a': [1, 2], 'b': [3, 4]}``
+        generates the parameters ``{'a': 1, 'b': 3}``, ``{'a': 1, 'b': 4}``, ``{'a': 2, 'b': 3}``, and ``{'a': 2, 'b': 4}``.
+        The parameters for each problem are added to its results as 'params'.
+    workers : int, optional
+        Maximum number of workers. If None, the default of the executor is used.
+    executor : {'process', 'fork', 'thread', None} or concurrent.futures.Executor, default='process'
+        Executor for running the optimizations. If None, the problems are solved serially.
+        A given Executor is not shut down after use.
+    **options
+        Keyword arguments to ``optimize()`` for all the problems, e.g., ``maxiter=200``.
+        The options given for each problem take precedence. ``iprint`` defaults to 0.
+
+    Returns
+    -------
+    list of dict
+        Results of ``optimize()`` for each problem, in the same order as the problems.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import optimize_many
+    >>> def problem(a):
+    ...     return {'x0': np.zeros(2), 'obj': lambda x: np.sum((x - a)**2), 'grad': lambda x: 2*(x - a),
+    ...             'con': lambda x: np.array([1. - x[0] - x[1]])}
+    >>> results = optimize_many(problem, params={'a': [0., 1.]}, executor=None, summary_filename='many_summary.out')
+    >>> [(r['params'], np.round(r['x'], 6), r['summary_filename']) for r in results] # doctest: +NORMALIZE_WHITESPACE
+    [({'a': 0.0}, array([0., 0.]), 'many_summary_0.out'), ({'a': 1.0}, array([0.5, 0.5]), 'many_summary_1.out')]
+    """
+    options.setdefault('iprint', 0)
+    specs, params = _get_specs(problems, params, options)
+
+    _check_thread_acc(executor, [spec.get('acc', 1.0E-6) for spec in specs])
+    executor, shutdown, forked = _get_executor(executor, workers)
+
+    key = id(specs)
+    try:
+        if executor is None:
+            results = [optimize(**spec) for spec in specs]
+        elif forked:
+            # Forked workers inherit the specs, so only the indices are sent to the workers
+            _shared_specs[key] = specs
+            results = list(executor.map(_run_shared, itertools.repeat(key), range(len(specs))))
+        elif isinstance(executor, ThreadPoolExecutor):
+            results = list(executor.map(_run_spec, specs))
+        else:
+            results = list(executor.map(_run_pickled, [_dumps(spec) for spec in specs]))
+    finally:
+        _shared_specs.pop(key, None)
+        if shutdown:
+            executor.shutdown()
+
+    if params is not None:
+        for result, p in zip(results, params):
+            result['params'] = p
+    return results
+
+def _get_solver(key, solver_kwargs):
+    '''
+    Return the solver of the multistart run with the given key for this thread, creating it on first use.
+    solver_kwargs can be pickled bytes, which are only unpickled when creating the solver.
+    '''
+    if getattr(_local, 'key', None) != key:
+        if isinstance(solver_kwargs, bytes):
+            solver_kwargs = pickle.loads(solver_kwargs)
+        _local.solver = Solver(**solver_kwargs)
+        _local.key = key
+    return _local.solver
+
+def _solve_start(key, x0, solver_kwargs=None):
+    '''
+    Solve from the starting point x0 with the solver of the multistart run in this thread.
+    Forked workers read the solver options from the shared specs if not given.
+    '''
+    if solver_kwargs is None:
+        solver_kwargs = _shared_specs[key]
+    return _get_solver(key, solver_kwargs).solve(x0)
+
+def sample_starts(num_starts, xl, xu, sampling='lhs', seed=None):
+    '''
+    Sample starting points inside the bounds.
+
+    Parameters
+    ----------
+    num_starts : int
+        Number of starting points.
+    xl, xu : np.ndarray
+        Finite lower and upper bounds of the optimization variables.
+    sampling : {'lhs', 'sobol'}, default='lhs'
+        'lhs' for Latin hypercube sampling, or 'sobol' for a scrambled Sobol sequence (requires scipy).
+    seed : int or np.random.Generator, optional
+        Seed for the random number generator.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape ``(num_starts, n)`` of the starting points.
+    '''
+    xl = np.asfarray(xl).flatten()
+    xu = np.asfarray(xu).flatten()
+    if not (np.all(np.isfinite(xl)) and np.all(np.isfinite(xu))):
+        raise ValueError("Finite lower and upper bounds (xl and xu) are required for sampling the starting points.")
+    n = xl.size
+    rng = np.random.default_rng(seed)
+    if sampling == 'lhs':
+        # One sample in each of the num_starts intervals of each variable, with the intervals randomly paired
+        strata = np.array([rng.permutation(num_starts) for _ in range(n)]).T
+        u = (strata + rng.random((num_starts, n))) / num_starts
+    elif sampling == 'sobol':
+        qmc = _import_qmc()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') # Warning for the number of samples not being a power of 2
+            u = qmc.Sobol(d=n, scramble=True, seed=rng).random(num_starts)
+    else:
+        raise ValueError("sampling must be 'lhs', 'sobol', or an array of starting points.")
+    return xl + u * (xu - xl)
+
+def multistart(obj=None, grad=None, con=None, jac=None, meq=0, xl=None, xu=None, x0=None, num_starts=16, sampling='lhs',
+               seed=None, target=None, x_tol=1e-3, workers=None, executor='process', **options):
+    """
+    Search for the global minimum by solving the problem from multiple starting points sampled inside the bounds,
+    in parallel, and return the best result and the distinct local minima found, ranked by the objective.
+
+    Each worker thread or process creates a ``Solver`` once and reuses it for all the starting points it solves,
+    so the starts do not repeat the setup of the problem, and do not print or write summary files.
+    The results for each start are the same as ``Solver.solve()`` with the additional keys
+    'start' (index of the starting point) and 'x0' (the starting point).
+    Converged solutions within ``x_tol`` of each other (in the infinity norm) are counted as the same local minimum.
+    If ``target`` is given, the pending starts are cancelled once a start converges with an objective
+    less than or equal to ``target``.
+    See ``optimize_many()`` for the executors and the pickling of the functions for the worker processes.
+    ``acc`` < 0 cannot be used with a thread executor (see ``acc`` in ``optimize()``).
+
+    Parameters
+    ----------
+    obj, grad, con, jac, meq :
+        The objective, constraints, their derivatives, and the number of equality constraints as in ``optimize()``.
+    xl, xu : float or np.ndarray
+        Lower and upper bounds of the optimization variables. Must be finite for sampling the starting points.
+    x0 : np.ndarray, optional
+        An initial guess to be used as the first starting point.
+    num_starts : int, default=16
+        Number of starting points sampled, in addition to ``x0``. Can be 0 only if ``x0`` is given.
+    sampling : {'lhs', 'sobol'} or np.ndarray, default='lhs'
+        Sampling method for the starting points (see ``sample_starts()``),
+        or an array of shape ``(num_starts, n)`` of the starting points.
+    seed : int, optional
+        Seed for sampling the starting points.
+    target : float, optional
+        Target objective value for stopping early.
+    x_tol : float, default=1e-3
+        Distance between the solutions below which they are counted as the same local minimum.
+    workers : int, optional
+        Maximum number of workers. If None, the default of the executor is used.
+    executor : {'process', 'fork', 'thread', None} or concurrent.futures.Executor, default='process'
+        Executor for solving from the starting points. If None, the starts are solved serially.
+    **options
+        Other options for the ``Solver``, e.g., ``maxiter``, ``acc``, or the scaling factors.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys
+
+            - 'x', 'objective', 'success' : solution, objective, and success of the best result
+            - 'best'           : results of the best start
+            - 'minima'         : results of the best start for each distinct local minimum ranked by the objective,
+              with the number of starts converged to it as 'num_hits' and their indices as 'starts'
+            - 'results'        : results for all the starts in order, with None for the starts cancelled after reaching the target
+            - 'starts'         : array of the starting points
+            - 'num_solved'     : number of starts solved
+            - 'target_reached' : True if the target objective was reached
+            - 'total_time'     : total time [s]
+
+        Only converged results are ranked if any start converged.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import multistart
+    >>> obj  = lambda x: np.sin(3*x[0]) + 0.1*x[0]**2
+    >>> grad = lambda x: np.array([3*np.cos(3*x[0]) + 0.2*x[0]])
+    >>> res = multistart(obj, grad, xl=-3., xu=3., x0=np.array([1.]), num_starts=8, seed=0, executor=None)
+    >>> res['success'], np.round(res['x'], 4), np.round(res['objective'], 4)
+    (True, array([-0.5122]), -0.9732)
+    >>> [(np.round(minimum['x'], 4), minimum['num_hits']) for minimum in res['minima']]
+    [(array([-0.5122]), 3), (array([1.5366]), 4), (array([-2.5608]), 2)]
+    """
+    start_time = time.time()
+    if not isinstance(num_starts, int) or num_starts < 0:
+        raise ValueError("num_starts must be a non-negative integer.")
+    sizes = [np.size(value) for value in [x0, xl, xu] if value is not None and np.ndim(value) > 0]
+    if not isinstance(sampling, str):
+        sizes.append(np.shape(sampling)[-1])
+    if not sizes:
+        raise ValueError("x0, xl, xu, or the given starting points must be an array to inform the number of optimization variables n.")
+    n = sizes[0]
+    xl_array = np.full(n, -np.inf if xl is None else xl) if np.ndim(xl) == 0 else np.asfarray(xl)
+    xu_array = np.full(n,  np.inf if xu is None else xu) if np.ndim(xu) == 0 else np.asfarray(xu)
+
+    if isinstance(sampling, str):
+        starts = sample_starts(num_starts, xl_array, xu_array, sampling=sampling, seed=seed)
+    else:
+        starts = np.asfarray(sampling).reshape(-1, n)
+    if x0 is not None:
+        starts = np.vstack([np.asfarray(x0).reshape(1, n), starts])
+    if len(starts) == 0:
+        raise ValueError("At least one starting point is required. num_starts must be positive if x0 is not given.")
+
+    solver_kwargs = dict(n=n, obj=obj, grad=grad, con=con, jac=jac, meq=meq, xl=xl, xu=xu, **options)
+    Solver(**solver_kwargs) # Validate the options before starting the workers
+    _check_thread_acc(executor, [options.get('acc', 1.0E-6)])
+
+    executor, shutdown, forked = _get_executor(executor, workers)
+    key = (os.getpid(), next(_run_ids))
+    results = [None] * len(starts)
+    target_reached = False
+
+    def reached(result):
+        return target is not None and result['success'] and result['objective'] <= target
+
+    try:
+        if executor is None:
+            for k, x in enumerate(starts):
+                results[k] = _solve_start(key, x, solver_kwargs)
+                if reached(results[k]):
+                    target_reached = True
+                    break
+            _local.__dict__.clear()
+        else:
+            from concurrent.futures import as_completed, wait
+            if forked:
+                # Forked workers inherit the solver options, so only the starting points are sent to the workers
+                _shared_specs[key] = solver_kwargs
+                futures = {executor.submit(_solve_start, key, x): k for k, x in enumerate(starts)}
+            else:
+                data = solver_kwargs if isinstance(executor, ThreadPoolExecutor) else _dumps(solver_kwargs)
+                futures = {executor.submit(_solve_start, key, x, data): k for k, x in enumerate(starts)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if reached(future.result()):
+                    target_reached = True
+                    for other in futures:
+                        other.cancel()
+                    break
+            # Collect the starts that were already running when the target was reached
+            done = wait([future for future in futures if not future.cancelled()]).done
+            for future in done:
+                results[futures[future]] = future.result()
+    finally:
+        _shared_specs.pop(key, None)
+        if shutdown:
+            executor.shutdown()
+
+    solved = []
+    for k, result in enumerate(results):
+        if result is not None:
+            result['start'] = k
+            result['x0'] = starts[k]
+            solved.append(result)
+
+    # Rank the converged results (or all, if none converged) and group the ones within x_tol as the same minimum
+    candidates = sorted([result for result in solved if result['success']] or solved, key=lambda result: result['objective'])
+    minima = []
+    for result in candidates:
+        for minimum in minima:
+            if np.max(np.abs(result['x'] - minimum['x']), initial=0.) <= x_tol:
+                minimum['num_hits'] += 1
+                minimum['starts'].append(result['start'])
+                break
+        else:
+            minima.append({**result, 'num_hits': 1, 'starts': [result['start']]})
+
+    best = minima[0]
+    return {'x': best['x'], 'objective': best['objective'], 'success': best['success'], 'best': best, 'minima': minima,
+            'results': results, 'starts': starts, 'num_solved': len(solved), 'target_reached': target_reached,
+            'total_time': time.time() - start_time}
@@ -1,2 +1,2 @@
-from pyslsqp.save_and_load import print_file_contents, load_results, load_attributes, load_variables, print_dict_as_table
+from pyslsqp.save_and_load import print_file_contents, load_results, load_attributes, load_variables, iter_variables, print_dict_as_table
 from pyslsqp.visualize import visualize
@@ -1,26 +1,362 @@
+import os
+import json
+import struct
 import warnings
+import hashlib
+import queue
+import threading
+import time
 import numpy as np
-try:
-    import h5py
-except ImportError:
-    warnings.warn("h5py not found, saving and loading data disabled")
-    h5py = None
+h5py = None # Imported on first use by _import_h5py() so that importing pyslsqp does not import h5py
 
-def import_h5py_file(filepath):
+def _import_h5py():
+    '''
+    Import h5py on first use. Returns None if h5py is not installed.
+    '''
+    global h5py
     if h5py is None:
-        raise ImportError("h5py not found, saving and loading data disabled")
+        try:
+            import h5py as h5py_module
+        except ImportError:
+            return None
+        h5py = h5py_module
+    return h5py
+
+def import_h5py_file(filepath):
+    if _import_h5py() is None:
+        raise ImportError("h5py not found, saving and loading data in HDF5 files disabled")
     try:
         return h5py.File(filepath, 'r')
     except:
         raise FileNotFoundError(f"File {filepath} not found or not a valid h5py file.")
-    
-def save_iteration(file, iter, vars, out_dict):
+
+def open_recorder_file(filepath):
+    '''
+    Open a saved file for reading. 
+    Returns an ``NpyFile`` for directories saved with the 'npy' backend and an ``h5py.File`` otherwise.
+    '''
+    if os.path.isdir(filepath):
+        return NpyFile(filepath, 'r')
+    return import_h5py_file(filepath)
+
+def _npy_header(dtype, shape, length=128):
+    '''
+    Return the header of a .npy file (format version 1.0) for an array with the given dtype and shape,
+    padded to a fixed ``length`` so that the header can be rewritten in place as the array grows.
+    '''
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(dtype), tuple(shape))
+    if len(header) > length - 11:
+        raise ValueError(f"Shape {shape} is too large for the .npy header.")
+    header = header.ljust(length - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+class NpyFile:
+    '''
+    Recorder file saved with the 'npy' backend, which does not require h5py.
+    The file is a directory with one raw .npy file per saved variable holding all the iterations along the first axis,
+    e.g., ``x.npy`` of shape ``(num_saves, n)``, a small JSON header ``header.json`` with the types and shapes 
+    of the variables and the index of the saved iterations, and ``attrs.npz`` and ``results.npz``
+    with the attributes and results of the optimization.
+    Rows are appended to the .npy files as the iterations are saved and their headers are updated when the file is closed.
+
+    In the read mode, the saved variables are opened as memory-mapped arrays (copy-on-write),
+    so opening a file takes constant time irrespective of the length of the optimization and 
+    only the accessed iterations are read from the disk.
+    The number of saved iterations is inferred from the sizes of the .npy files, 
+    so files from interrupted optimizations can also be read.
+    The object provides the subset of the ``h5py.File`` interface used by the loading functions, 
+    with the groups ``iterates``, ``index``, and ``results`` represented as dictionaries of arrays.
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory.
+    mode : {'r', 'w'}, default='r'
+        'r' for reading an existing file, 'w' for creating a new file.
+    '''
+    header_length = 128 # Length of the headers of the .npy files [bytes]
+
+    def __init__(self, path, mode='r'):
+        if mode not in ['r', 'w']:
+            raise ValueError("mode must be 'r' or 'w'.")
+        self.path = path
+        self.mode = mode
+        self.attrs = {}
+        self.groups = {}
+        self.var_files = {}
+        self.var_info = {}
+        if mode == 'w':
+            os.makedirs(path, exist_ok=True)
+            self._write_header()
+        else:
+            self._read()
+
+    def _write_header(self):
+        header = {'format': 'pyslsqp-npy', 'version': 1,
+                  'vars': {var: {'dtype': np.lib.format.dtype_to_descr(dtype), 'shape': [int(size) for size in shape], 'num_saves': int(num_rows)}
+                           for var, (dtype, shape, num_rows) in self.var_info.items()}}
+        if 'index' in self.groups:
+            header['index'] = {key: np.asarray(value).tolist() for key, value in self.groups['index'].items()}
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump(header, f)
+
+    def _read(self):
+        try:
+            with open(os.path.join(self.path, 'header.json'), 'r') as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{self.path} is not a valid npy recorder directory.")
+        
+        # Variables, attributes, and results are sorted by name as in HDF5 files.
+        # Variables are found from the .npy files since the JSON header is only updated when the file is closed.
+        iterates = {}
+        for var in sorted(f[:-4] for f in os.listdir(self.path) if f.endswith('.npy')):
+            var_path = os.path.join(self.path, var + '.npy')
+            with open(var_path, 'rb') as f:
+                np.lib.format.read_magic(f)
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                offset = f.tell()
+            row_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+            # The number of rows is inferred from the file size since the .npy header is only updated when the file is closed
+            num_rows = (os.path.getsize(var_path) - offset) // row_bytes if row_bytes > 0 else None
+            iterates[var] = (var_path, dtype, shape[1:], offset, num_rows)
+        
+        # Variables with empty rows, e.g., constraints of unconstrained problems, have as many rows as the other variables
+        num_saves = min((info[4] for info in iterates.values() if info[4] is not None), default=0)
+        self.groups['iterates'] = {}
+        for var, (var_path, dtype, row_shape, offset, num_rows) in iterates.items():
+            num_rows = num_saves if num_rows is None else num_rows
+            if num_rows == 0 or dtype.itemsize * int(np.prod(row_shape)) == 0:
+                self.groups['iterates'][var] = np.zeros((num_rows,) + tuple(row_shape), dtype=dtype)
+            else:
+                self.groups['iterates'][var] = np.memmap(var_path, dtype=dtype, mode='c', offset=offset, shape=(num_rows,) + tuple(row_shape))
+
+        if 'index' in header:
+            self.groups['index'] = {key: np.array(value) for key, value in header['index'].items()}
+        
+        # Attributes are returned as scalars and results as arrays like h5py attributes and datasets
+        attrs_path = os.path.join(self.path, 'attrs.npz')
+        if os.path.exists(attrs_path):
+            with np.load(attrs_path, allow_pickle=False) as data:
+                for key in sorted(data.files):
+                    self.attrs[key] = data[key][()] if data[key].ndim == 0 else data[key]
+        results_path = os.path.join(self.path, 'results.npz')
+        if os.path.exists(results_path):
+            with np.load(results_path, allow_pickle=False) as data:
+                self.groups['results'] = {key: data[key] for key in sorted(data.files)}
+
+    def __contains__(self, name):
+        return name in self.groups
+
+    def __getitem__(self, name):
+        return self.groups[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self):
+        return self.groups.keys()
+
+    def create_group(self, name):
+        self.groups[name] = {}
+        return self.groups[name]
+
+    def require_group(self, name):
+        return self.groups.setdefault(name, {})
+
+    def save_iteration(self, iter, vars, out_dict):
+        '''
+        Write the variables in out_dict to the row ``iter`` of the corresponding .npy files.
+        '''
+        for var in vars:
+            value = np.asarray(out_dict[var])
+            if var not in self.var_files:
+                self.var_files[var] = open(os.path.join(self.path, var + '.npy'), 'wb+')
+                self.var_files[var].write(_npy_header(value.dtype, (0,) + value.shape, self.header_length))
+                self.var_info[var] = (value.dtype, value.shape, 0)
+            dtype, shape, num_rows = self.var_info[var]
+            row = np.ascontiguousarray(value, dtype=dtype).reshape(shape)
+            f = self.var_files[var]
+            f.seek(self.header_length + iter * row.nbytes)
+            f.write(row.tobytes())
+            self.var_info[var] = (dtype, shape, max(num_rows, iter + 1))
+
+    def close(self):
+        '''
+        Close the file. In the write mode, the headers of the .npy files are updated with the number of saved iterations,
+        and the JSON header, the attributes, and the results are written.
+        '''
+        if self.mode == 'w':
+            for var, f in self.var_files.items():
+                dtype, shape, num_rows = self.var_info[var]
+                f.seek(0)
+                f.write(_npy_header(dtype, (num_rows,) + shape, self.header_length))
+                f.close()
+            self.var_files = {}
+            self._write_header()
+            np.savez(os.path.join(self.path, 'attrs.npz'), **self.attrs)
+            if 'results' in self.groups:
+                np.savez(os.path.join(self.path, 'results.npz'), **self.groups['results'])
+        self.groups = {}
+
+class SummaryWriter:
+    '''
+    Writer for the summary file of the optimization that keeps the file open during the optimization
+    and writes one row per major iteration.
+    Rows are buffered and written to the disk every ``flush_interval`` rows and when the writer is closed.
+    The writer can be used as a context manager so that the file is closed even if the optimization raises an exception.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the summary file. An existing file is overwritten.
+    format : {'table', 'csv', 'jsonl'}, default='table'
+        Format of the summary file.
+        If 'table', the rows are written as a fixed-width table for reading.
+        If 'csv', the rows are written as comma-separated values with a header line.
+        If 'jsonl', each row is written as a JSON object on a separate line.
+    flush_interval : int, default=1
+        Number of rows after which the file is flushed.
+        If 1, the file is flushed after every row so that it can be monitored during the optimization.
+        If 0, the file is flushed only when the writer is closed.
+    '''
+    columns  = ['majiter', 'nfev', 'ngev', 'objective', 'gnorm', 'cnorm', 'feasibility', 'optimality', 'step']
+    headings = ['MAJOR', 'NFEV', 'NGEV', 'OBJFUN', 'GNORM', 'CNORM', 'FEAS', 'OPT', 'STEP']
+
+    def __init__(self, filename, format='table', flush_interval=1):
+        if format not in ['table', 'csv', 'jsonl']:
+            raise ValueError("format must be 'table', 'csv', or 'jsonl'.")
+        if not isinstance(flush_interval, int) or flush_interval < 0:
+            raise ValueError("flush_interval must be a non-negative integer.")
+        self.filename = filename
+        self.format = format
+        self.flush_interval = flush_interval
+        self.num_rows = 0
+        self.file = open(filename, 'w')
+        if format == 'table':
+            self.file.write("%5s %5s %5s %16s %16s %16s %16s %16s %16s \n" % tuple(self.headings))
+        elif format == 'csv':
+            self.file.write(','.join(self.columns) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, majiter, nfev, ngev, objective, gnorm, cnorm, feasibility, optimality, step):
+        '''
+        Write the row for a major iteration.
+        '''
+        row = (int(majiter), int(nfev), int(ngev), float(objective), float(gnorm), float(cnorm),
+               float(feasibility), float(optimality), float(step))
+        if self.format == 'table':
+            self.file.write("%5i %5i %5i %16.6E %16.6E %16.6E %16.6E %16.6E %16.6E \n" % row)
+        elif self.format == 'csv':
+            self.file.write(','.join(repr(value) for value in row) + '\n')
+        else:
+            self.file.write(json.dumps(dict(zip(self.columns, row))) + '\n')
+        self.num_rows += 1
+        if self.flush_interval > 0 and self.num_rows % self.flush_interval == 0:
+            self.file.flush()
+
+    def close(self):
+        '''
+        Write the buffered rows and close the file. Closing an already closed writer has no effect.
+        '''
+        if not self.file.closed:
+            self.file.close()
+
+class EvaluationStore:
+    '''
+    Persistent, content-addressed store of function and derivative evaluations in an HDF5 file.
+    Each evaluation is saved in a group named by the SHA-256 hash of the model version ``tag`` and x.
+    Evaluations can therefore be reused by any later optimization using the same file and tag, 
+    irrespective of the scaling, options, or the path taken by the optimizer.
+    The tag should be changed whenever the model changes so that outdated evaluations are not reused.
+    Note that the file should not be shared by concurrently running optimizations.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the store file. The file is created if it does not exist.
+    tag : str, default=''
+        Model version tag that is hashed along with x.
+    '''
+    def __init__(self, filepath, tag=''):
+        if _import_h5py() is None:
+            raise ImportError("h5py is required for the evaluation store. Install h5py to use this feature.")
+        self.filepath = filepath
+        self.tag = str(tag)
+        self.file = h5py.File(filepath, 'a')
+
+    def key(self, x):
+        '''
+        Return the key of the group for the given x.
+        '''
+        x = np.asarray(x, dtype=float) + 0.0 # Adding 0.0 maps -0.0 to 0.0 so that both have the same key
+        return hashlib.sha256(self.tag.encode() + x.tobytes()).hexdigest()
+
+    def load(self, x, vars):
+        '''
+        Return the list of the values of the vars saved for the given x.
+        Returns None if any of the vars is not saved for x.
+        '''
+        key = self.key(x)
+        if key not in self.file:
+            return None
+        grp = self.file[key]
+        if not all(var in grp for var in vars) or not np.array_equal(grp['x'][()], x):
+            return None
+        return [grp[var][()] for var in vars]
+
+    def save(self, x, values):
+        '''
+        Save the values (dictionary with variable names as keys) computed at the given x.
+        The saved values are written to disk when the file is flushed or closed.
+        '''
+        grp = self.file.require_group(self.key(x))
+        if 'x' not in grp:
+            grp['x'] = x
+        for var, value in values.items():
+            if var not in grp:
+                grp[var] = value
+
+    def flush(self):
+        '''
+        Flush the saved evaluations to disk so that they persist even if the optimization is interrupted.
+        '''
+        self.file.flush()
+
+    def close(self):
+        '''
+        Close the store file.
+        '''
+        self.file.close()
+
+def _chunk_rows(value, chunk_bytes=2**20):
+    '''
+    Return the number of iterations per chunk for a columnar dataset so that each chunk is about ``chunk_bytes`` in size.
+    '''
+    row_bytes = max(value.nbytes, 1)
+    return int(min(1024, max(1, chunk_bytes // row_bytes)))
+
+def save_iteration(file, iter, vars, out_dict, layout='groups', compression=None):
     '''
     Save the data from one iteration to an active file.
 
+    For files saved with the 'npy' backend, the data is always saved in a columnar layout (see ``NpyFile``).
+    With the 'groups' layout, a group named ``iter_{iter}`` is created with one dataset for each variable.
+    With the 'columnar' layout, each variable is stored as a single chunked dataset in the ``iterates`` group
+    with the iterations along the first axis, e.g., ``x`` of shape ``(num_saves, n)``, 
+    and the data from the given iteration is written to the row ``iter`` after resizing the dataset if necessary.
+    
     Parameters
     ----------
-    file : str
+    file : h5py.File or NpyFile
         Loaded file.
     iter : int
         Iteration number.
@@ -28,11 +364,302 @@ def save_iteration(file, iter, vars, out_dict):
         List of variable names to save.
     out_dict : dict
         Dictionary with variable names as keys and variable values as values.
+    layout : {'groups', 'columnar'}, default='groups'
+        Layout of the saved iterates in the file.
+    compression : str, default=None
+        Compression filter for the columnar datasets, e.g., 'gzip' or 'lzf'. 
+        Not used with the 'groups' layout.
     '''
-    file.create_group('iter_' + str(iter))
+    if isinstance(file, NpyFile):
+        file.save_iteration(iter, vars, out_dict)
+        return
+
+    if layout == 'groups':
+        file.create_group('iter_' + str(iter))
+        for var in vars:
+            file[f'iter_{iter}'][var] = out_dict[var]
+        return
+    
+    grp = file.require_group('iterates')
     for var in vars:
-        file[f'iter_{iter}'][var] = out_dict[var]
+        value = np.asarray(out_dict[var])
+        if var not in grp:
+            # Chunks must be nonempty along all axes, e.g., for constraints of unconstrained problems with shape (0,),
+            # so empty axes are made resizable to allow chunks larger than the data along those axes
+            chunks   = (_chunk_rows(value),) + tuple(max(1, s) for s in value.shape)
+            maxshape = (None,) + tuple(s if s > 0 else None for s in value.shape)
+            grp.create_dataset(var, shape=(0,) + value.shape, maxshape=maxshape, 
+                               dtype=value.dtype, chunks=chunks, compression=compression)
+        dset = grp[var]
+        if dset.shape[0] <= iter:
+            dset.resize(iter + 1, axis=0)
+        dset[iter] = value
+
+class Recorder:
+    '''
+    Recorder that saves iterations to an active file.
+    Along with the iterations, the recorder keeps an index of the saved iterations which is written to the 
+    ``index`` group of the file when the recorder is closed. 
+    The index contains the number of saved iterations ``num_saves``, and the rows (saved iteration numbers)
+    ``major_rows`` of the major iterations ``major_iters``, so that iterations can be loaded without scanning the file.
+
+    Parameters
+    ----------
+    file : h5py.File
+        Active file to save the iterations to.
+    vars : list
+        List of variable names to save. Must include 'ismajor' and 'majiter'.
+    layout : {'groups', 'columnar'}, default='groups'
+        Layout of the saved iterates in the file.
+    compression : str, default=None
+        Compression filter for the columnar datasets.
+
+    Attributes
+    ----------
+    write_time : float
+        Total time spent on writing the iterations to the file.
+    wait_time : float
+        Total time the optimization waited for the recorder.
+    '''
+    def __init__(self, file, vars, layout='groups', compression=None):
+        self.file = file
+        self.vars = vars
+        self.layout = layout
+        self.compression = compression
+        self.write_time = 0.0
+        self.wait_time = 0.0
+        self.num_saves = 0
+        self.major_rows = []
+        self.major_iters = []
+
+    def _update_index(self, iter, out_dict):
+        self.num_saves = max(self.num_saves, iter + 1)
+        if out_dict['ismajor']:
+            self.major_rows.append(iter)
+            self.major_iters.append(int(out_dict['majiter']))
+
+    def _write(self, iter, out_dict):
+        w_start = time.perf_counter()
+        save_iteration(self.file, iter, self.vars, out_dict, layout=self.layout, compression=self.compression)
+        self.write_time += time.perf_counter() - w_start
+
+    def save(self, iter, out_dict):
+        '''
+        Save the variables in out_dict as the iteration ``iter``.
+        '''
+        self._update_index(iter, out_dict)
+        w_start = time.perf_counter()
+        self._write(iter, out_dict)
+        self.wait_time += time.perf_counter() - w_start
+
+    def close(self):
+        '''
+        Write the index of the saved iterations to the file.
+        '''
+        grp = self.file.require_group('index')
+        grp['num_saves'] = self.num_saves
+        grp['major_rows'] = np.array(self.major_rows, dtype=int)
+        grp['major_iters'] = np.array(self.major_iters, dtype=int)
+
+class AsyncRecorder(Recorder):
+    '''
+    Recorder that saves iterations to an active file in a background writer thread.
+    Snapshots of the saved variables are handed to the writer thread through a bounded queue
+    so that the optimization does not wait for the file I/O at every iteration.
+    If the writer falls behind and the queue is full, ``save()`` blocks until there is space in the queue (backpressure).
+    ``close()`` waits for all queued iterations to be written.
+    Note that the file should not be accessed by other threads until the recorder is closed.
+
+    Parameters
+    ----------
+    file : h5py.File
+        Active file to save the iterations to.
+    vars : list
+        List of variable names to save. Must include 'ismajor' and 'majiter'.
+    layout : {'groups', 'columnar'}, default='groups'
+        Layout of the saved iterates in the file.
+    compression : str, default=None
+        Compression filter for the columnar datasets.
+    maxsize : int, default=16
+        Maximum number of iterations waiting in the queue to be written.
+
+    Attributes
+    ----------
+    write_time : float
+        Total time spent by the writer thread on writing the iterations to the file.
+    wait_time : float
+        Total time the optimization waited for the writer, i.e., when the queue was full or while closing the recorder.
+    '''
+    def __init__(self, file, vars, layout='groups', compression=None, maxsize=16):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive integer.")
+        super().__init__(file, vars, layout=layout, compression=compression)
+        self.error = None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        '''
+        Write the queued iterations to the file until the recorder is closed.
+        After an error, the remaining iterations are discarded and the error is raised in the main thread.
+        '''
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            try:
+                if self.error is None:
+                    self._write(*item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _check_error(self):
+        if self.error is not None:
+            raise RuntimeError("Saving iterations in the background writer thread failed.") from self.error
+
+    def save(self, iter, out_dict):
+        '''
+        Queue a snapshot of the variables in out_dict for saving as the iteration ``iter``.
+        '''
+        self._check_error()
+        self._update_index(iter, out_dict)
+        # Copy the values since arrays in out_dict, e.g., x, are updated in place during the optimization
+        snapshot = {var: np.copy(out_dict[var]) for var in self.vars}
+        w_start = time.perf_counter()
+        self.queue.put((iter, snapshot))
+        self.wait_time += time.perf_counter() - w_start
+
+    def close(self):
+        '''
+        Wait until all the queued iterations are written, stop the writer thread, and write the index.
+        '''
+        w_start = time.perf_counter()
+        self.queue.join() # Drain the queue before stopping the writer thread
+        self.queue.put(None)
+        self.thread.join()
+        self.wait_time += time.perf_counter() - w_start
+        self._check_error()
+        super().close()
+
+def get_num_saves(file):
+    '''
+    Return the number of iterations saved in the given file [includes the 0th iteration] for either layout.
+    For columnar files from interrupted optimizations, only iterations saved for all variables are counted.
+    '''
+    if 'iterates' in file:
+        return min((dset.shape[0] for dset in file['iterates'].values()), default=0)
+    return sum(1 for key in file.keys() if key.startswith('iter_'))
+
+def get_saved_vars(file):
+    '''
+    Return the list of the names of the variables saved at each iteration in the given file for either layout.
+    '''
+    if 'iterates' in file:
+        return list(file['iterates'].keys())
+    return list(file['iter_0'].keys())
+
+def load_iterate(file, iter, var):
+    '''
+    Return the value of the variable ``var`` saved at the iteration ``iter`` in the given file for either layout.
+    '''
+    if 'iterates' in file:
+        return file['iterates'][var][iter]
+    return file[f'iter_{iter}'][var][()]
+
+def load_all_iterates(file, var):
+    '''
+    Return the values of the variable ``var`` saved at all iterations in the given file, stacked along the first axis.
+    '''
+    num_saves = get_num_saves(file)
+    if 'iterates' in file:
+        return file['iterates'][var][:num_saves]
+    return np.array([file[f'iter_{k}'][var][()] for k in range(num_saves)])
     
+def load_rows(file, var, rows, idx=()):
+    '''
+    Return the values of the variable ``var`` (or its entry ``idx``) saved at the given rows (saved iteration numbers)
+    in the given file, stacked along the first axis.
+    For the columnar layout, all the rows are read at once from the dataset.
+    '''
+    rows = np.asarray(rows, dtype=int)
+    if 'iterates' in file:
+        dset = file['iterates'][var]
+        if len(rows) == 0:
+            return np.empty((0,) + dset.shape[1:], dtype=dset.dtype)[(slice(None),) + idx]
+        data = dset[rows[0]:rows[-1]+1]
+        if len(rows) < len(data):
+            data = data[rows - rows[0]]
+        return data[(slice(None),) + idx]
+    return np.array([file[f'iter_{i}'][var][idx] for i in rows])
+
+def parse_var(var):
+    '''
+    Return the variable name and the tuple of indices for a variable string, e.g., ('jacobian', (1, 2)) for 'jacobian[1,2]'.
+    '''
+    name = var.split('[')[0]
+    idx  = tuple(map(int, var.split('[')[1].split(']')[0].split(','))) if '[' in var else ()
+    return name, idx
+
+def get_rows_to_load(file, vars, itr_start=0, itr_end=-1, major_only=False):
+    '''
+    Check the inputs of ``load_variables()`` and return the list of variables 
+    and the rows (saved iteration numbers) to load from the open file.
+    '''
+    if not isinstance(vars, (str, list)):
+        raise ValueError("vars must be a string or a list of strings")
+    if isinstance(vars, str):
+        vars = [vars]
+    if not all(isinstance(var, str) for var in vars):
+        raise ValueError("vars must be a string or a list of strings")
+    
+    if not isinstance(itr_start, int):
+        raise ValueError("itr_start must be an integer.")
+    if not isinstance(itr_end, int):
+        raise ValueError("itr_end must be an integer.")
+    
+    has_index = 'index' in file # Files from interrupted optimizations or older versions do not have an index
+    num_saves = int(file['index']['num_saves'][()]) if has_index else get_num_saves(file) # Number of iterations saved [includes 0th iteration]
+    niter = num_saves - 1 # Number of iterations saved in the file [excludes 0th iteration]
+    if major_only:
+        if 'results' in file:
+            niter = file['results']['num_majiter'][()]
+        else: # Interrupted optimizations do not save the results
+            major_iters = file['index']['major_iters'][()] if has_index else load_all_iterates(file, 'majiter')
+            niter = int(np.max(major_iters, initial=0))
+    if (-(niter+1) <= itr_start <= niter) and (-(niter+1) <= itr_end <= niter):
+        start = itr_start * 1
+        if itr_start < 0:
+            start = niter + itr_start + 1
+        end = itr_end * 1
+        if itr_end < 0:
+            end = niter + itr_end + 1
+        if start > end:
+            raise ValueError(f"itr_start index ({start}) must be less than itr_end index ({end}).")
+    else:
+        raise ValueError(f"itr_start {itr_start} and itr_end {itr_end} must be within bounds (>={-(niter+1)} and <={niter}).")
+    
+    saved_vars = get_saved_vars(file)
+    for var in vars:
+        if var.split('[')[0] not in saved_vars:
+            raise ValueError(f"Variable {var} not found in the file.")
+
+    if major_only:
+        if has_index:
+            major_rows  = file['index']['major_rows'][()]
+            major_iters = file['index']['major_iters'][()]
+        else:
+            major_rows  = np.flatnonzero(load_all_iterates(file, 'ismajor'))
+            major_iters = load_all_iterates(file, 'majiter')[major_rows]
+        rows = major_rows[(major_iters >= start) & (major_iters <= end)]
+    else:
+        rows = np.arange(start, end+1)
+
+    return vars, rows
+
 def print_dict_as_table(data):
     """
     Print any input dictionary as a table.
@@ -102,13 +729,13 @@ def print_file_contents(filepath):
          'hot_start', 'iprint', 'keep_plot_open', 'load_filename', 'm', 'maxiter', 'meq', 'n', 'obj_scaler', 
          'save_figname', 'save_filename', 'save_itr', 'save_vars', 'summary_filename', 'visualize', 'visualize_vars', 
          'warm_start', 'x0', 'x_scaler', 'xl', 'xu']
-         Saved variable iterates     : ['ismajor', 'iter', 'majiter', 'objective', 'optimality', 'x']
-         Results of Optimization     : ['constraints', 'feasibility', 'fev_time', 'gev_time', 'gradient', 'jacobian', 
+         Saved variable iterates     : ['ismajor', 'iter', 'majiter', 'mode', 'objective', 'optimality', 'x']
+         Results of Optimization     : ['cache_hits', 'cache_misses', 'constraints', 'feasibility', 'fev_time', 'gev_time', 'gradient', 'jacobian', 
          'message', 'multipliers', 'nfev', 'ngev', 'num_majiter', 'objective', 'optimality', 'optimizer_time', 'processing_time', 
          'save_filename', 'status', 'success', 'summary_filename', 'total_time', 'visualization_time', 'x']
 
     '''
-    file = import_h5py_file(filepath)
+    file = open_recorder_file(filepath)
     print("Available data in the file:")
     print("---------------------------")
     try:
@@ -116,7 +743,7 @@ def print_file_contents(filepath):
     except:
         warnings.warn("No attributes found in the file.")
     try:
-        print("     Saved variable iterates     :", list(file['iter_0'].keys()))
+        print("     Saved variable iterates     :", get_saved_vars(file))
     except:
         warnings.warn("No variable iterates found in the file.")
     try:
@@ -128,8 +755,11 @@ def print_file_contents(filepath):
 def load_variables(filepath, vars, itr_start=0, itr_end=-1, major_only=False):
     '''
     Load specified variable iterates between ``itr_start`` and ``itr_end`` from the saved file.
-    Returns a dictionary with the variable names as keys and list of variable iterates as values.
+    Returns a dictionary with the variable names as keys and arrays of variable iterates as values.
+    The index of the saved iterations written at the end of the optimization is used to find the iterations to load,
+    and the iterations are read at once for files saved with the 'columnar' layout.
     Note the variables at ``itr_start`` and ``itr_end`` are included in the output.
+    Files saved with either the 'groups' or the 'columnar' layout can be loaded.
 
     Parameters
     ----------
@@ -152,7 +782,7 @@ def load_variables(filepath, vars, itr_start=0, itr_end=-1, major_only=False):
     Returns
     -------
     out_data : dict
-        Dictionary with variable names as keys and list of variable iterates as values.
+        Dictionary with variable names as keys and arrays of variable iterates stacked along the first axis as values.
 
     Examples
     --------
@@ -184,82 +814,107 @@ def load_variables(filepath, vars, itr_start=0, itr_end=-1, major_only=False):
                 Iteration data saved to              : slsqp_recorder.hdf5
     >>> from pyslsqp.postprocessing import load_variables
     >>> load_variables('slsqp_recorder.hdf5', ['objective', 'optimality', 'x[0]'], itr_start=0, itr_end=-1, major_only=True)
-    {'objective': [0.5, 0.0, 0.0], 'optimality': [99.0, 0.0, 0.0], 'x[0]': [0.5, 0.0, 0.0]}
+    {'objective': array([0.5, 0. , 0. ]), 'optimality': array([99.,  0.,  0.]), 'x[0]': array([0.5, 0. , 0. ])}
 
     '''
     if not isinstance(filepath, str):
         raise ValueError("filepath must be a string.")
     
-    if not isinstance(vars, (str, list)):
-        raise ValueError("vars must be a string or a list of strings")
-    if isinstance(vars, str):
-        vars = [vars]
-    if not all(isinstance(var, str) for var in vars):
-        raise ValueError("vars must be a string or a list of strings")
-    
-    if not isinstance(itr_start, int):
-        raise ValueError("itr_start must be an integer.")
-    if not isinstance(itr_end, int):
-        raise ValueError("itr_end must be an integer.")
-    
-    file  = import_h5py_file(filepath)
-    niter = len(file.keys()) - 2 # Number of iterations saved in the file [excludes 0th iteration and results]
-    num_saves = len(file.keys()) - 1 # Number of iterations saved [includes 0th iteration but excludes results]
-    if major_only:
-        niter = file['results']['num_majiter'][()]
-    if (-(niter+1) <= itr_start <= niter) and (-(niter+1) <= itr_end <= niter):
-        start = itr_start * 1
-        if itr_start < 0:
-            start = niter + itr_start + 1
-        end = itr_end * 1
-        if itr_end < 0:
-            end = niter + itr_end + 1
-        if start > end:
-            raise ValueError(f"itr_start index ({start}) must be less than itr_end index ({end}).")
-    else:
-        raise ValueError(f"itr_start {itr_start} and itr_end {itr_end} must be within bounds (>={-(niter+1)} and <={niter}).")
-    
+    file = open_recorder_file(filepath)
+    try:
+        vars, rows = get_rows_to_load(file, vars, itr_start, itr_end, major_only)
+        out_data = {}
+        for var in vars:
+            name, idx = parse_var(var)
+            out_data[var] = load_rows(file, name, rows, idx)
+    finally:
+        file.close()
 
-    out_data = {}
-    for var in vars:
-        if var.split('[')[0] not in file['iter_0'].keys():
-            raise ValueError(f"Variable {var} not found in the file.")
-        
-        out_data[var] = []
+    return out_data
 
-    if major_only:
-        for i in range(num_saves):
-            if file[f'iter_{i}']['ismajor'][()] and file[f'iter_{i}']['majiter'][()] >= start:
-                for var in vars:
-                    if '[' in var:
-                        name = var.split('[')[0]
-                        if name == 'jacobian':
-                            idx1, idx2 = map(int, var.split('[')[1].split(']')[0].split(','))
-                            out_data[var].append(file[f'iter_{i}'][name][idx1, idx2])
-                        else:
-                            idx = int(var.split('[')[1].split(']')[0])
-                            out_data[var].append(file[f'iter_{i}'][name][idx])
-                    else:
-                        out_data[var].append(file[f'iter_{i}'][var][()])
-                if file[f'iter_{i}']['majiter'][()] == end:
-                    break
-    else:
-        for i in range(start, end+1):
-            for var in vars:
-                if '[' in var:
-                    name = var.split('[')[0]
-                    if name == 'jacobian':
-                        idx1, idx2 = map(int, var.split('[')[1].split(']')[0].split(','))
-                        out_data[var].append(file[f'iter_{i}'][name][idx1, idx2])
-                    else:
-                        idx = int(var.split('[')[1].split(']')[0])
-                        out_data[var].append(file[f'iter_{i}'][name][idx])
-                else:
-                    out_data[var].append(file[f'iter_{i}'][var][()])
+def iter_variables(filepath, vars, chunk=None, itr_start=0, itr_end=-1, major_only=False):
+    '''
+    Lazily iterate over the specified variable iterates between ``itr_start`` and ``itr_end`` in the saved file.
+    Unlike ``load_variables()``, only one iteration (or one block of ``chunk`` iterations) is held in memory at a time,
+    so that statistics over long histories of large variables, e.g., the Jacobian, can be computed in constant memory.
+    The arguments ``vars``, ``itr_start``, ``itr_end``, and ``major_only`` are the same as in ``load_variables()``.
+    The inputs are checked when the function is called, and the file is kept open from the start of the iteration
+    until the iterator is exhausted or closed.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the saved file.
+    vars : str or list
+        Variable names to load from the saved file.
+    chunk : int, default=None
+        Number of iterations to load at a time.
+        If None, one iteration is yielded at a time.
+    itr_start : int, default=0
+        Starting iteration to load the variables from.
+    itr_end : int, default=-1
+        Ending iteration to load the variables from. 
+    major_only : bool, default=False
+        If True, only major iterations are loaded.
+
+    Returns
+    -------
+    iterator of dict
+        Iterator over dictionaries with variable names as keys and variable values at one iteration as values if ``chunk`` is None.
+        Otherwise, dictionaries with variable names as keys and arrays of up to ``chunk`` variable iterates 
+        stacked along the first axis as values.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import optimize
+    >>> obj = lambda x: np.sum(x**2)
+    >>> grad = lambda x: 2*x
+    >>> xl = 0.0
+    >>> xu = np.array([1, 1])
+    >>> x0 = np.array([0.5, 0.5])
+    >>> results = optimize(x0, obj=obj, grad=grad, xl=xl, xu=xu, save_itr='major', save_vars=['objective', 'optimality', 'x'], iprint=0)
+    No constraints defined. Running an unconstrained optimization problem...
+    >>> from pyslsqp.postprocessing import iter_variables
+    >>> for data in iter_variables('slsqp_recorder.hdf5', ['objective', 'x[0]']):
+    ...     print(data)
+    {'objective': 0.5, 'x[0]': 0.5}
+    {'objective': 0.0, 'x[0]': 0.0}
+    {'objective': 0.0, 'x[0]': 0.0}
+    >>> for data in iter_variables('slsqp_recorder.hdf5', ['objective', 'x'], chunk=2):
+    ...     print(data)
+    {'objective': array([0.5, 0. ]), 'x': array([[0.5, 0.5],
+           [0. , 0. ]])}
+    {'objective': array([0.]), 'x': array([[0., 0.]])}
+    '''
+    if chunk is not None and (not isinstance(chunk, int) or chunk < 1):
+        raise ValueError("chunk must be a positive integer or None.")
+    if not isinstance(filepath, str):
+        raise ValueError("filepath must be a string.")
     
-    file.close()
+    # Check the inputs when called, as in load_variables(), rather than when the iteration starts.
+    # The file is opened again by the generator so that it is not left open if the iteration never starts.
+    with open_recorder_file(filepath) as file:
+        vars, rows = get_rows_to_load(file, vars, itr_start, itr_end, major_only)
+    return _iter_rows(filepath, vars, rows, chunk)
 
-    return out_data
+def _iter_rows(filepath, vars, rows, chunk):
+    '''
+    Yield the values of the variables at the given rows of the saved file, one row or ``chunk`` rows at a time.
+    '''
+    file = open_recorder_file(filepath)
+    try:
+        parsed_vars = {var: parse_var(var) for var in vars}
+        block = 1 if chunk is None else chunk
+        for k in range(0, len(rows), block):
+            out_data = {}
+            for var, (name, idx) in parsed_vars.items():
+                out_data[var] = load_rows(file, name, rows[k:k+block], idx)
+                if chunk is None:
+                    out_data[var] = out_data[var][0]
+            yield out_data
+    finally:
+        file.close()
 
 def load_results(filepath):
     '''
@@ -305,19 +960,19 @@ def load_results(filepath):
                 Iteration data saved to              : slsqp_recorder.hdf5
     >>> from pyslsqp.postprocessing import load_results
     >>> load_results('slsqp_recorder.hdf5')  # doctest: +NORMALIZE_WHITESPACE +ELLIPSIS
-    {'constraints': array([], dtype=float64), 'feasibility': 0.0, 'fev_time': ..., 'gev_time': ..., 'gradient': array([0., 0.]), 
+    {'cache_hits': 0, 'cache_misses': 4, 'constraints': array([], dtype=float64), 'feasibility': 0.0, 'fev_time': ..., 'gev_time': ..., 'gradient': array([0., 0.]), 
     'jacobian': array([], shape=(0, 2), dtype=float64), 'message': 'Optimization terminated successfully', 
     'multipliers': array([], dtype=float64), 'nfev': 2, 'ngev': 2, 'num_majiter': 2, 'objective': 0.0, 'optimality': 0.0, 
     'optimizer_time': ..., 'processing_time': ..., 'save_filename': 'slsqp_recorder.hdf5', 'status': 0, 'success': True, 
     'summary_filename': 'slsqp_summary.out', 'total_time': ..., 'visualization_time': 0.0, 'x': array([0., 0.])}
 
     '''
-    file = import_h5py_file(filepath)
+    file = open_recorder_file(filepath)
     result_dict = {}
     for key in file['results'].keys():
         result_dict[key] = file['results'][key][()]
         if key in ['message', 'save_filename', 'summary_filename']:
-            result_dict[key] = result_dict[key].decode('utf-8')
+            result_dict[key] = result_dict[key].decode('utf-8') if isinstance(result_dict[key], bytes) else str(result_dict[key])
     file.close()
     return result_dict
 
@@ -372,7 +1027,7 @@ def load_attributes(filepath):
     'x0': array([0.5, 0.5]), 'x_scaler': 1.0, 'xl': 0.0, 'xu': array([1, 1])}
 
     '''
-    file = import_h5py_file(filepath)
+    file = open_recorder_file(filepath)
     attr_dict = {}
     for key in file.attrs.keys():
         attr_dict[key] = file.attrs[key]
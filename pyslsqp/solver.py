@@ -0,0 +1,517 @@
+"""
+This module provides a reusable SLSQP solver for solving many optimization problems
+with the same structure, e.g., the same problem with different data inside an outer loop.
+The options are validated, the derivative functions are set up, and the Fortran workspaces are allocated
+only once, so that each solve only pays for the SLSQP iterations and the function evaluations.
+"""
+
+import time
+import warnings
+import numpy as np
+from numpy import isfinite
+
+from pyslsqp.main import Problem, Workspace, check_update_scalar, _epsilon, _fd_step, _fd_points, _fd_evaluate, _run_slsqp, _get_results
+
+
+class Solver:
+    '''
+    Reusable SLSQP solver for problems with the same number of variables, constraints, and equality constraints.
+    The options are validated, the finite difference derivatives are set up, and the Fortran workspace and
+    the buffers for the scaled arrays are allocated once when the solver is created
+    (or at the first solve, if the number of constraints is only known after evaluating the constraints).
+    Each call to ``solve()`` resets the workspace in place and runs the SLSQP iterations from the given initial guess.
+    Since the functions are called as ``obj(x)``, ``con(x)``, etc., problems with different data are solved
+    by updating the data the functions refer to between the solves.
+
+    ``solve()`` gives the same results as ``optimize()`` with the same options,
+    but does not print, save, or plot anything, so it is suited for solving a large number of small problems.
+    Use ``optimize()`` for the other features such as recording, hot starting, visualization,
+    or the finite difference options other than the serial forward differences.
+    A solver must not be used by multiple threads at the same time; create a solver per thread instead.
+    The Fortran SLSQP subroutine releases the GIL, so solvers on different threads run in parallel,
+    except with ``acc`` < 0 (see ``acc`` in ``optimize()``).
+
+    Parameters
+    ----------
+    n : int
+        Number of optimization variables.
+    obj : callable, optional
+        Objective function to be minimized, called as ``obj(x)``.
+    grad : callable, optional
+        Gradient of the objective function, called as ``grad(x)``.
+        If None, the gradient is computed using forward finite differences.
+    con : callable, optional
+        Vector-valued constraint function, called as ``con(x)``.
+    jac : callable, optional
+        Jacobian of the constraint function, called as ``jac(x)``.
+        If None, the Jacobian is computed using forward finite differences.
+    meq : int, default=0
+        Number of equality constraints. The first ``meq`` constraints are equalities.
+    xl, xu : float or np.ndarray, optional
+        Lower and upper bounds of the optimization variables. Can be overridden for each solve.
+    x_scaler, obj_scaler, con_scaler : float or np.ndarray, default=1.0
+        Scaling factors for the variables, objective, and constraints, as in ``optimize()``.
+    maxiter : int, default=100
+        Maximum number of major iterations.
+    acc : float, default=1.0E-6
+        Requested accuracy of the solution, as in ``optimize()``.
+    finite_diff_abs_step : float, optional
+        Absolute step size for the finite differences. If None, ``finite_diff_rel_step`` is used.
+    finite_diff_rel_step : float, default=sqrt(machine epsilon)
+        Relative step size for the finite differences.
+    cache_size : int, default=1
+        Number of most recently evaluated points cached in each solve.
+    callback : callable, optional
+        Function called as ``callback(x)`` after each major iteration.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import Solver
+    >>> p = np.zeros(2)
+    >>> solver = Solver(2, obj=lambda x: np.sum((x - p)**2), grad=lambda x: 2*(x - p),
+    ...                 con=lambda x: np.array([x[0] + x[1] - 1.]), jac=lambda x: np.array([[1., 1.]]), meq=1)
+    >>> for p[0] in [0., 1.]:
+    ...     results = solver.solve(np.zeros(2))
+    ...     print(results['success'], np.round(results['x'], 6))
+    True [0.5 0.5]
+    True [1. 0.]
+    '''
+    def __init__(self, n, obj=None, grad=None, con=None, jac=None, meq=0, xl=None, xu=None,
+                 x_scaler=1.0, obj_scaler=1.0, con_scaler=1.0, maxiter=100, acc=1.0E-6,
+                 finite_diff_abs_step=None, finite_diff_rel_step=_epsilon, cache_size=1, callback=None):
+        if not isinstance(n, (int, np.integer)) or n < 1:
+            raise ValueError("n must be a positive integer.")
+        if (obj is None) and (con is None):
+            raise ValueError("At least one of the objective or constraint functions must be defined.")
+        for name, func in [('obj', obj), ('grad', grad), ('con', con), ('jac', jac), ('callback', callback)]:
+            if func is not None and not callable(func):
+                raise ValueError(f"{name} must be a callable or None.")
+        if not isinstance(meq, (int, np.integer)) or meq < 0:
+            raise ValueError("meq must be a non-negative integer.")
+        if not isinstance(maxiter, (int, np.integer)) or maxiter < 1:
+            raise ValueError("maxiter must be a positive integer.")
+        if not isinstance(cache_size, int) or cache_size < 1:
+            raise ValueError("cache_size must be a positive integer.")
+
+        self.n = int(n)
+        self.obj = obj
+        self.grad = grad
+        self.con = con
+        self.jac = jac
+        self.meq = int(meq)
+        self.maxiter = int(maxiter)
+        self.acc = acc
+        self.r_step = finite_diff_rel_step
+        self.a_step = finite_diff_abs_step
+        self.cache_size = cache_size
+        self.callback = callback
+
+        self.x_scaler = check_update_scalar(x_scaler, 'x_scaler', self.n, 'optimization variables')
+        self.obj_scaler = check_update_scalar(obj_scaler, 'obj_scaler', 1, 'objective function f(x)')[0]
+        self.con_scaler = con_scaler
+
+        self.xl = xl
+        self.xu = xu
+        self._default_bounds = self._bounds = self._get_bounds(xl, xu)
+
+        self.workspace = None
+        if con is None:
+            self._allocate(0)
+
+    def _get_bounds(self, xl, xu):
+        '''
+        Return the actual bounds (lb, ub), the upper bounds marked with nans for infinite values (xu),
+        and the scaled bounds marked with nans for infinite values for the Fortran code (xl_scaled, xu_scaled).
+        '''
+        n = self.n
+        xl = np.full(n, -np.inf) if xl is None else check_update_scalar(xl, 'xl', n, 'optimization variables')
+        xu = np.full(n,  np.inf) if xu is None else check_update_scalar(xu, 'xu', n, 'optimization variables')
+        if any(xl > xu):
+            raise ValueError("The lower bounds (xl) must be less than or equal to the upper bounds (xu) for each variable.")
+        lb = np.copy(xl)
+        ub = np.copy(xu)
+        # Mark infinite bounds with nans; the Fortran code understands this
+        xl = np.where(isfinite(xl), xl, np.nan)
+        xu = np.where(isfinite(xu), xu, np.nan)
+        return lb, ub, xu, xl * self.x_scaler, xu * self.x_scaler
+
+    def _allocate(self, m):
+        '''
+        Allocate the workspace for a problem with m constraints.
+        '''
+        self.m = m
+        self.workspace = Workspace(self.n, m, self.meq)
+        self.con_scaler = check_update_scalar(self.con_scaler, 'con_scaler', self.workspace.la, 'constraints con(x)')
+
+    def _clip(self, x):
+        '''
+        Clip x to the bounds before calling the functions, since SLSQP sometimes exceeds the bounds by 1 or 2 ULP.
+        '''
+        lb, ub = self._bounds[:2]
+        if np.any(x < lb) or np.any(x > ub):
+            warnings.warn("At least one entry in x was outside the bounds during a minimize step. Clipping to the bounds....")
+            return np.clip(x, lb, ub)
+        return x
+
+    def _fd_grad(self, x):
+        '''
+        Compute the gradient of the objective at the given x using forward finite differences.
+        '''
+        h = _fd_step(x, self.r_step, self.a_step, self._bounds[2])
+        f0 = self.obj(x)
+        return (np.array(_fd_evaluate(self.obj, x, h), dtype=float) - f0) / h
+
+    def _fd_jac(self, x):
+        '''
+        Compute the Jacobian of the constraints at the given x using forward finite differences.
+        '''
+        h = _fd_step(x, self.r_step, self.a_step, self._bounds[2])
+        c0 = np.asarray(self.con(x), dtype=float)
+        c = np.array(_fd_evaluate(self.con, x, h), dtype=float).reshape(-1, c0.size)
+        return (c - c0).T / h
+
+    def _funcs(self, x):
+        '''
+        Evaluate the objective and constraints at the given x.
+        The dummy constraint c = [0.] is returned for unconstrained problems.
+        '''
+        x = self._clip(x)
+        f = 0.0 if self.obj is None else self.obj(x)
+        c = np.array([0.], dtype=float) if self.con is None else self.con(x)
+        return f, c
+
+    def _derivs(self, x):
+        '''
+        Evaluate the gradient and Jacobian at the given x.
+        The dummy Jacobian of zeros is returned for unconstrained problems.
+        '''
+        x = self._clip(x)
+        if self.obj is None:
+            g = np.zeros(self.n, dtype=float)
+        else:
+            g = self._fd_grad(x) if self.grad is None else self.grad(x)
+        if self.con is None:
+            j = np.zeros((1, self.n), dtype=float)
+        else:
+            j = self._fd_jac(x) if self.jac is None else self.jac(x)
+        return g, j
+
+    def solve(self, x0, xl=None, xu=None):
+        '''
+        Solve the problem from the initial guess x0, reusing the workspace.
+
+        Parameters
+        ----------
+        x0 : np.ndarray
+            Initial guess for the optimization variables of size `(n,)`.
+        xl, xu : float or np.ndarray, optional
+            Lower and upper bounds for this solve. If None, the bounds given to the solver are used.
+
+        Returns
+        -------
+        dict
+            Dictionary with the same keys as the results returned by ``optimize()``
+            except for the keys related to saving, hot starting, and visualization.
+            The arrays in the dictionary are copies and are not modified by later solves.
+        '''
+        start = time.time()
+        x = np.asfarray(x0).flatten()
+        if x.size != self.n:
+            raise ValueError(f"x0 must have size {self.n}, but has size {x.size}.")
+        if xl is None and xu is None:
+            self._bounds = self._default_bounds
+        else:
+            self._bounds = self._get_bounds(self.xl if xl is None else xl, self.xu if xu is None else xu)
+        lb, ub, _, xl_scaled, xu_scaled = self._bounds
+        x = np.clip(x, lb, ub)
+
+        prob = Problem(x, None, None, None, None, funcs=self._funcs, derivs=self._derivs, cache_size=self.cache_size)
+        fx, c = prob._funcs(x)
+        g,  j = prob._derivs(x)
+
+        if self.workspace is None:
+            self._allocate(len(c))
+        elif self.con is not None and len(c) != self.m:
+            raise ValueError(f"The number of constraints changed from {self.m} to {len(c)}. Create a new Solver for a different problem structure.")
+        ws = self.workspace
+        ws.reset(self.acc, self.maxiter)
+        g = np.append(g, 0.0)
+        a = np.concatenate((j, np.zeros([ws.la, 1])), 1)
+
+        iteration = None
+        if self.callback is not None:
+            def iteration(iter, majiter, ismajor, x, fx, c, g, a):
+                if ismajor:
+                    self.callback(np.copy(x))
+
+        x, fx, c, g, a, majiter, opt_time = _run_slsqp(ws, prob, x, fx, c, g, a, xl_scaled, xu_scaled,
+                                                       self.x_scaler, self.obj_scaler, self.con_scaler, iteration=iteration)
+        total_time = time.time() - start
+
+        results = _get_results(ws, prob, x, fx, c, g, a, majiter)
+        results['fev_time'] = prob.fev_time
+        results['gev_time'] = prob.gev_time
+        results['optimizer_time'] = opt_time
+        results['processing_time'] = total_time - prob.fev_time - prob.gev_time - opt_time
+        results['total_time'] = total_time
+        return results
+
+
+class BatchSolver:
+    '''
+    Solver for a batch of K independent problems with the same number of variables ``n``, constraints ``m``,
+    and equality constraints ``meq``, e.g., the same model calibrated for many samples.
+    The K SLSQP instances, each with its own workspace, are advanced in lockstep.
+    At each step, the points of all the instances that require the functions (or the derivatives) are stacked
+    and evaluated with a single vectorized call, so the overhead of calling the functions and of the
+    optimization loop is paid once per batch rather than once per problem.
+
+    The functions are called with the stacked points ``X`` of shape ``(k, n)`` and the indices ``idx``
+    of shape ``(k,)`` of the problems in the batch that the points belong to, and return the values for each point
+    (see the parameters below). Each instance gives the same results as ``Solver.solve()`` with the
+    corresponding functions for a single problem, if the vectorized functions return the same values.
+    The workspaces and buffers are allocated at the first solve and reused for the later solves
+    with the same or a smaller number of problems.
+
+    Parameters
+    ----------
+    n : int
+        Number of optimization variables.
+    m : int
+        Number of constraints.
+    funcs : callable
+        Function called as ``funcs(X, idx)`` that returns the objectives of shape ``(k,)``
+        and the constraints of shape ``(k, m)`` at the points X for the problems idx.
+    derivs : callable, optional
+        Function called as ``derivs(X, idx)`` that returns the gradients of shape ``(k, n)``
+        and the Jacobians of shape ``(k, m, n)`` at the points X for the problems idx.
+        If None, the derivatives are computed using forward finite differences,
+        evaluating all the perturbed points of all the problems with a single call to ``funcs``.
+    meq : int, default=0
+        Number of equality constraints. The first ``meq`` constraints are equalities.
+    xl, xu : float or np.ndarray, optional
+        Lower and upper bounds of shape ``(n,)`` for all the problems or ``(K, n)`` for each problem.
+        Can be overridden for each solve.
+    maxiter : int, default=100
+        Maximum number of major iterations.
+    acc : float, default=1.0E-6
+        Requested accuracy of the solution. Must be positive since the problems in the batch 
+        cannot share the exact line search used for ``acc`` < 0 (see ``acc`` in ``optimize()``).
+    finite_diff_abs_step : float, optional
+        Absolute step size for the finite differences. If None, ``finite_diff_rel_step`` is used.
+    finite_diff_rel_step : float, default=sqrt(machine epsilon)
+        Relative step size for the finite differences.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyslsqp import BatchSolver
+    >>> p = np.array([0., 1., 2.]) # Data for each problem
+    >>> def funcs(X, idx):
+    ...     return np.sum((X - p[idx, None])**2, axis=1), (X[:, 0] + X[:, 1] - 1.)[:, None]
+    >>> def derivs(X, idx):
+    ...     return 2*(X - p[idx, None]), np.ones((len(idx), 1, 2))
+    >>> solver = BatchSolver(2, 1, funcs, derivs, meq=1)
+    >>> results = solver.solve(np.zeros((3, 2)))
+    >>> results['success'], np.round(results['x'], 6)
+    (array([ True,  True,  True]), array([[0.5, 0.5],
+           [0.5, 0.5],
+           [0.5, 0.5]]))
+    >>> results['num_funcs_calls'] < results['nfev'].sum()
+    True
+    '''
+    def __init__(self, n, m, funcs, derivs=None, meq=0, xl=None, xu=None, maxiter=100, acc=1.0E-6,
+                 finite_diff_abs_step=None, finite_diff_rel_step=_epsilon):
+        if not isinstance(n, (int, np.integer)) or n < 1:
+            raise ValueError("n must be a positive integer.")
+        if not isinstance(m, (int, np.integer)) or m < 0:
+            raise ValueError("m must be a non-negative integer.")
+        if not isinstance(meq, (int, np.integer)) or meq < 0 or meq > m:
+            raise ValueError("meq must be a non-negative integer less than or equal to m.")
+        for name, func in [('funcs', funcs), ('derivs', derivs)]:
+            if func is not None and not callable(func):
+                raise ValueError(f"{name} must be a callable or None.")
+        if funcs is None:
+            raise ValueError("funcs must be provided.")
+        if not isinstance(maxiter, (int, np.integer)) or maxiter < 1:
+            raise ValueError("maxiter must be a positive integer.")
+        if acc < 0:
+            raise ValueError("acc must be positive for BatchSolver.")
+
+        self.n = int(n)
+        self.m = int(m)
+        self.meq = int(meq)
+        self.la = max(1, self.m)
+        self.funcs = funcs
+        self.derivs = derivs
+        self.xl = xl
+        self.xu = xu
+        self.maxiter = int(maxiter)
+        self.acc = acc
+        self.r_step = finite_diff_rel_step
+        self.a_step = finite_diff_abs_step
+
+        self.workspaces = []
+
+    def _get_bounds(self, xl, xu, K):
+        '''
+        Return the actual bounds and the bounds marked with nans for infinite values for the Fortran code, of shape (K, n).
+        '''
+        shape = (K, self.n)
+        bounds = []
+        for name, bound, default in [('xl', xl, -np.inf), ('xu', xu, np.inf)]:
+            bound = np.full(shape, default) if bound is None else np.asfarray(bound)
+            try:
+                bounds.append(np.array(np.broadcast_to(bound, shape)))
+            except ValueError:
+                raise ValueError(f"{name} must be a scalar, or an array of shape ({self.n},) or {shape}.")
+        lb, ub = bounds
+        if np.any(lb > ub):
+            raise ValueError("The lower bounds (xl) must be less than or equal to the upper bounds (xu) for each variable.")
+        return lb, ub, np.where(isfinite(lb), lb, np.nan), np.where(isfinite(ub), ub, np.nan)
+
+    def _evaluate_funcs(self, X, idx):
+        '''
+        Evaluate the objectives and constraints at the stacked points X for the problems idx.
+        '''
+        f, c = self.funcs(X, idx)
+        f = np.asarray(f, dtype=float).reshape(len(idx))
+        c = np.asarray(c if c is not None else np.zeros((len(idx), 0)), dtype=float).reshape(len(idx), self.m)
+        return f, c
+
+    def _evaluate_derivs(self, X, idx):
+        '''
+        Evaluate the gradients and Jacobians at the stacked points X for the problems idx,
+        using a single call to funcs for all the perturbed points if derivs is not given.
+        '''
+        k, n = X.shape
+        if self.derivs is not None:
+            g, j = self.derivs(X, idx)
+            g = np.asarray(g, dtype=float).reshape(k, n)
+            j = np.asarray(j if j is not None else np.zeros((k, 0, n)), dtype=float).reshape(k, self.m, n)
+            return g, j
+
+        # Forward finite differences with the step reversed for variables where a forward step would exceed the upper bound
+        h = _fd_step(X, self.r_step, self.a_step, self._bounds[3][idx])
+        # Rows k*(n+1) to k*(n+1)+n of the stacked points are the point X[k] and its n perturbed points
+        P = np.empty((k, n+1, n))
+        P[:, 0] = X
+        P[:, 1:] = _fd_points(X, h)
+        f, c = self._evaluate_funcs(P.reshape(k*(n+1), n), np.repeat(idx, n+1))
+        f = f.reshape(k, n+1)
+        c = c.reshape(k, n+1, self.m)
+        g = (f[:, 1:] - f[:, :1]) / h
+        j = (c[:, 1:] - c[:, :1]).transpose(0, 2, 1) / h[:, None, :]
+        return g, j
+
+    def _clip(self, X, idx):
+        '''
+        Clip the points to the bounds before calling the functions, since SLSQP sometimes exceeds the bounds by 1 or 2 ULP.
+        '''
+        lb, ub = self._bounds[0][idx], self._bounds[1][idx]
+        if np.any(X < lb) or np.any(X > ub):
+            warnings.warn("At least one entry in x was outside the bounds during a minimize step. Clipping to the bounds....")
+            return np.clip(X, lb, ub)
+        return X
+
+    def solve(self, X0, xl=None, xu=None):
+        '''
+        Solve the K problems from the initial guesses X0.
+
+        Parameters
+        ----------
+        X0 : np.ndarray
+            Initial guesses of shape ``(K, n)``.
+        xl, xu : float or np.ndarray, optional
+            Lower and upper bounds for this solve. If None, the bounds given to the solver are used.
+
+        Returns
+        -------
+        dict
+            Dictionary with the results of the K problems stacked along the first axis, with the keys
+            'x', 'objective', 'optimality', 'feasibility', 'constraints', 'multipliers', 'gradient', 'jacobian',
+            'num_majiter', 'nfev', 'ngev', 'status', 'message', and 'success' as in the results of ``optimize()``,
+            'num_funcs_calls' and 'num_derivs_calls' for the number of vectorized calls,
+            and 'fev_time', 'gev_time', 'optimizer_time', and 'total_time' for the whole batch.
+        '''
+        start = time.time()
+        n, m, meq, la = self.n, self.m, self.meq, self.la
+        X = np.array(X0, dtype=float).reshape(-1, n)
+        K = X.shape[0]
+        self._bounds = self._get_bounds(self.xl if xl is None else xl, self.xu if xu is None else xu, K)
+        lb, ub, xl_nan, xu_nan = self._bounds
+        X = np.clip(X, lb, ub)
+
+        while len(self.workspaces) < K:
+            self.workspaces.append(Workspace(n, m, meq))
+        workspaces = self.workspaces[:K]
+        for ws in workspaces:
+            ws.reset(self.acc, self.maxiter)
+
+        # Values at the latest points of each instance; the Jacobians have an extra zero column as required by SLSQP
+        F = np.zeros(K)
+        C = np.zeros((K, la))
+        G = np.zeros((K, n+1))
+        A = np.zeros((K, la, n+1))
+        nfev = np.ones(K, dtype=int)
+        ngev = np.ones(K, dtype=int)
+        num_majiter = np.zeros(K, dtype=int)
+        fev_time = gev_time = opt_time = 0.0
+
+        all_idx = np.arange(K)
+        f_start = time.time()
+        F[:], C[:, :m] = self._evaluate_funcs(self._clip(X, all_idx), all_idx)
+        fev_time += time.time() - f_start
+        g_start = time.time()
+        G[:, :n], A[:, :m, :n] = self._evaluate_derivs(self._clip(X, all_idx), all_idx)
+        gev_time += time.time() - g_start
+        num_funcs_calls = num_derivs_calls = 1
+
+        active = list(range(K))
+        while active:
+            need_funcs = []
+            need_derivs = []
+            opt_start = time.time()
+            for k in active:
+                ws = workspaces[k]
+                np.copyto(ws.c, C[k])
+                np.copyto(ws.g, G[k])
+                np.copyto(ws.a, A[k])
+                num_majiter[k] = ws.step(X[k], xl_nan[k], xu_nan[k], F[k], ws.c, ws.g, ws.a, num_majiter[k])
+                mode = int(ws.mode)
+                if mode == 1:
+                    need_funcs.append(k)
+                elif mode == -1:
+                    need_derivs.append(k)
+            opt_time += time.time() - opt_start
+
+            if need_funcs:
+                idx = np.array(need_funcs)
+                f_start = time.time()
+                F[idx], C[idx, :m] = self._evaluate_funcs(self._clip(X[idx], idx), idx)
+                fev_time += time.time() - f_start
+                nfev[idx] += 1
+                num_funcs_calls += 1
+            if need_derivs:
+                idx = np.array(need_derivs)
+                g_start = time.time()
+                G[idx, :n], A[idx, :m, :n] = self._evaluate_derivs(self._clip(X[idx], idx), idx)
+                gev_time += time.time() - g_start
+                ngev[idx] += 1
+                num_derivs_calls += 1
+            active = need_funcs + need_derivs
+
+        # Results of each instance, stacked along the first axis
+        instances = [_get_results(workspaces[k], None, X[k], F[k], C[k], G[k], A[k], num_majiter[k]) for k in range(K)]
+        results = {key: np.array([res[key] for res in instances]) for key in instances[0]}
+        results['message'] = [res['message'] for res in instances]
+        results['nfev'] = nfev
+        results['ngev'] = ngev
+        results['num_funcs_calls'] = num_funcs_calls
+        results['num_derivs_calls'] = num_derivs_calls
+        results['fev_time'] = fev_time
+        results['gev_time'] = gev_time
+        results['optimizer_time'] = opt_time
+        results['total_time'] = time.time() - start
+        return results
@@ -1,19 +1,34 @@
+import os
+import sys
+import json
+import subprocess
+import importlib.util
 import warnings
 import numpy as np
 import time
 
-try:
-    import matplotlib
-    matplotlib.use('TkAgg')
-    import matplotlib.pyplot as plt
+plt = None # Imported on first use by _import_pyplot() so that importing pyslsqp does not import matplotlib
 
-except ImportError:
-    warnings.warn("matplotlib not found, plotting disabled.")
-    plt = None
+def _import_pyplot():
+    '''
+    Import matplotlib.pyplot with the TkAgg backend on first use.
+    The backend is not changed if matplotlib.pyplot was already imported by the user.
+    '''
+    global plt
+    if plt is None:
+        try:
+            import matplotlib
+            if 'matplotlib.pyplot' not in sys.modules:
+                matplotlib.use('TkAgg')
+            import matplotlib.pyplot as pyplot
+        except ImportError:
+            raise ImportError("matplotlib not found, cannot visualize.")
+        plt = pyplot
+    return plt
 
 class Visualizer:
 
-    def __init__(self, visualize_vars, summary_filename, save_figname):
+    def __init__(self, visualize_vars, summary_filename, save_figname, update_interval=1, update_time=0.0, blit=True):
         '''
         Initialize the visualizer with the variables to visualize. 
         The variables should be a list of strings, where each string is the name of a variable to visualize. 
@@ -29,7 +44,11 @@ class Visualizer:
 
         Creates an interactive plot with the specified variables on the y-axis and the iteration number on the x-axis.
         The plots are stacked vertically in the order they are specified in the list.
-        The plot is updated with the latest values of the variables after each iteration.
+        The plot is updated with the latest values of the variables after every ``update_interval`` iterations
+        if at least ``update_time`` seconds have passed since the last update.
+        The values are stored in preallocated arrays that grow geometrically, and the axis limits are expanded 
+        geometrically so that the axes are redrawn only when the values leave the current limits.
+        Otherwise, only the lines are redrawn using blitting if it is supported by the backend.
 
         Parameters
         ----------
@@ -39,28 +58,35 @@ class Visualizer:
             Name of the summary file which is displayed in the title of the plot.
         save_figname : str
             Name of the file to save the plot.
+        update_interval : int, default=1
+            Number of iterations between plot updates.
+        update_time : float, default=0.0
+            Minimum time in seconds between plot updates.
+        blit : bool, default=True
+            If True, only the lines are redrawn when the axis limits do not change, if the backend supports blitting.
         '''
 
         v_start = time.time()
-        if plt is None:
-            raise ImportError("matplotlib not found, cannot visualize.")
+        _import_pyplot()
         self.visualize_vars = visualize_vars
         self.save_figname = save_figname
+        self.update_interval = max(int(update_interval), 1)
+        self.update_time = update_time
         plt.ion()
         lines_dict = {}
-        var_dict = {}
         n_plots = len(visualize_vars)
-        self.fig, self.axs = plt.subplots(n_plots, figsize=(10, 3*n_plots))
+        self.fig, self.axs = plt.subplots(n_plots, figsize=(10, 3*n_plots), squeeze=False)
+        self.axs = self.axs[:, 0]
         self.fig.suptitle(f'SLSQP Optimization [{summary_filename}]')
         for ax, var in zip(self.axs, visualize_vars):
             # ax.set_title(var)
             # ax.set_xlabel('Iteration')
             ax.set_ylabel(var)
-            var_dict[var] = []
             if var in ['optimality', 'feasibility']:
                 lines_dict[var], = ax.semilogy([], [], label=var)
             else:
                 lines_dict[var], = ax.plot([], [], label=var)
+            ax.set_xlim(0, 10)
             ax.legend()
 
         # self.fig.set_figwidth(8)
@@ -70,15 +96,86 @@ class Visualizer:
         plt.tight_layout(pad=3.0, h_pad=0.1, w_pad=0.1, rect=[0, 0, 1., 1.])
 
         self.lines_dict = lines_dict
-        self.var_dict = var_dict
+        self.data = np.zeros((64, n_plots))    # Preallocated history of the variables, doubled in size when full
+        self.num_points = 0
+        self.last_update = 0                    # Number of points plotted at the last update
+        self.last_update_time = 0.0
+        self.ylims = [None] * n_plots           # Data limits of the variables (positive values for log scale axes)
+        self.num_draws = 0                      # Number of full redraws of the figure
+        self.num_blits = 0                      # Number of updates that only redrew the lines
+
+        self.blit = blit and self.fig.canvas.supports_blit
+        self.background = None
+        if self.blit:
+            for line in self.lines_dict.values():
+                line.set_animated(True)
+            # Capture the background whenever the figure is fully redrawn, e.g., after resizing the window
+            self.fig.canvas.mpl_connect('draw_event', self._on_draw)
 
         self.vis_time = time.time() - v_start
         self.wait_time = 0.0
 
-    def update_plot(self, out_dict):
+    def _on_draw(self, event):
+        '''
+        Capture the background without the lines after a full redraw and draw the lines on top of it.
+        Draws while saving the figure to a file are ignored.
+        '''
+        if not self.blit or event.canvas is not self.fig.canvas:
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for ax, line in zip(self.axs, self.lines_dict.values()):
+            ax.draw_artist(line)
+
+    @staticmethod
+    def _get_value(var, out_dict):
+        '''
+        Return the value of the scalar variable var from the out_dict.
+        '''
+        if var in ['objective', 'optimality', 'feasibility']:
+            return out_dict[var]
+        elif var.startswith('jacobian['):
+            idx1, idx2 = map(int, var[9:-1].split(','))
+            return out_dict['jacobian'][idx1, idx2]
+        else:
+            return out_dict[var.split('[')[0]][int(var.split('[')[1][:-1])]
+
+    def _expand_limits(self):
+        '''
+        Expand the axis limits geometrically if the plotted values are outside the current limits.
+        Returns True if the limits of any axis changed.
+        '''
+        changed = False
+        num_points = self.num_points
+        for k, ax in enumerate(self.axs):
+            # Expand the x-axis to twice the number of iterations
+            if num_points - 1 > ax.get_xlim()[1]:
+                ax.set_xlim(0, 2 * (num_points - 1))
+                changed = True
+
+            if self.ylims[k] is None:
+                continue
+            lo, hi = self.ylims[k]
+            ymin, ymax = ax.get_ylim()
+            if lo >= ymin and hi <= ymax and self.num_draws > 0:
+                continue
+            # Leave a margin of half the data range (in log space for log scale axes) beyond the data limits
+            if ax.get_yscale() == 'log':
+                log_lo, log_hi = np.log10(lo), np.log10(hi)
+                span = max(log_hi - log_lo, 1.0)
+                ax.set_ylim(10**max(log_lo - 0.5*span, -300.), 10**min(log_hi + 0.5*span, 300.))
+            else:
+                span = max(hi - lo, 1e-8 * max(abs(lo), abs(hi)), 1e-12)
+                ax.set_ylim(lo - 0.5*span, hi + 0.5*span)
+            changed = True
+
+        return changed
+
+    def update_plot(self, out_dict, force=False):
         '''
         Update the plot with the latest values of the variables.
-        Appends the values of scalar iterates after each iteration in the var_dict attribute before updating the plot.
+        Appends the values of scalar iterates after each iteration to the preallocated ``data`` array 
+        and redraws the plot if ``update_interval`` iterations and ``update_time`` seconds have passed 
+        since the last update or if ``force`` is True.
         The out_dict should be a dictionary containing the following
         keys:
             - 'majiter'     : the number of major iterations
@@ -93,43 +190,78 @@ class Visualizer:
         '''
 
         v_start = time.time()
-        x_data = np.arange(out_dict['majiter']+1)
+        if out_dict is not None:
+            self._append([self._get_value(var, out_dict) for var in self.visualize_vars])
+
+        if force or (self.num_points - self.last_update >= self.update_interval 
+                     and time.time() - self.last_update_time >= self.update_time):
+            self._redraw()
+        self.vis_time += time.time() - v_start
+
+    def _append(self, values):
+        '''
+        Append the values of the variables from an iteration to the ``data`` array and update the data limits.
+        '''
+        if self.num_points == self.data.shape[0]:
+            self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        row = self.data[self.num_points]
+        for k, value in enumerate(values):
+            row[k] = value
+            value = float(row[k])   # Copied since some values are arrays updated in place by SLSQP
+            if not np.isfinite(value) or (value <= 0 and self.axs[k].get_yscale() == 'log'):
+                continue
+            lo, hi = self.ylims[k] if self.ylims[k] is not None else (value, value)
+            self.ylims[k] = (min(lo, value), max(hi, value))
+        self.num_points += 1
+
+    def _redraw(self):
+        '''
+        Redraw the plot with all the appended values.
+        '''
+        x_data = np.arange(self.num_points)
         for k, var in enumerate(self.visualize_vars):
-            if var in ['objective', 'optimality', 'feasibility']:
-                self.var_dict[var].append(out_dict[var]*1.0) # *1.0 is necessary so that the value is not a reference
-            elif var.startswith('jacobian['):
-                idx1, idx2 = map(int, var[9:-1].split(','))
-                self.var_dict[var].append(out_dict[var.split('[')[0]][idx1, idx2])
-            else:
-                if var.startswith('x['):
-                    idx = int(var[2:-1])
-                elif var.startswith('constraints['):
-                    idx = int(var[12:-1])
-                elif var.startswith('gradient['):
-                    idx = int(var[9:-1])
-                elif var.startswith('multipliers['):
-                    idx = int(var[12:-1])
-                self.var_dict[var].append(out_dict[var.split('[')[0]][idx])
-            
-            self.lines_dict[var].set_data(x_data, self.var_dict[var])
-                
-            # Rescale the plot
-            self.axs[k].relim()
-            self.axs[k].autoscale_view()
-
-        # time.sleep(0.5)
-
-        # Redraw the plot
-        self.fig.canvas.draw()
+            self.lines_dict[var].set_data(x_data, self.data[:self.num_points, k])
+
+        if self._expand_limits() or not self.blit or self.background is None:
+            # Redraw the full figure
+            self.fig.canvas.draw()
+            self.num_draws += 1
+        else:
+            # Redraw only the lines on top of the saved background
+            self.fig.canvas.restore_region(self.background)
+            for ax, line in zip(self.axs, self.lines_dict.values()):
+                ax.draw_artist(line)
+            self.fig.canvas.blit(self.fig.bbox)
+            self.num_blits += 1
         self.fig.canvas.flush_events()
 
-        self.vis_time += time.time() - v_start
-        
+        self.last_update = self.num_points
+        self.last_update_time = time.time()
+
+    def _finalize(self):
+        '''
+        Plot all the values, including those skipped by throttling, and draw the lines as regular artists 
+        so that they are included when the figure is saved or shown.
+        Called only at the end of the optimization.
+        '''
+        if self.num_points > self.last_update:
+            self.update_plot(None, force=True)
+        for line in self.lines_dict.values():
+            line.set_animated(False)
+        self.blit = False
+        # Fit the axis limits to the data, removing the margins left for the updates
+        for ax in self.axs:
+            ax.set_autoscale_on(True)
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.canvas.draw_idle()
+
     def save_plot(self, save_figname):
         '''
         Save the plot to a file.
         '''
         v_start = time.time()
+        self._finalize()
         # plt.gcf().set_size_inches(10, 3*len(self.visualize_vars))
         # self.fig.set_size_inches(10, 3*len(self.visualize_vars), forward=True)
         self.fig.savefig(save_figname,)
@@ -155,6 +287,183 @@ class Visualizer:
         plt.show()
         self.wait_time += time.time() - w_start
 
+class ProcessVisualizer:
+
+    def __init__(self, visualize_vars, summary_filename, save_figname, update_interval=1, update_time=0.0, headless=False):
+        '''
+        Visualizer that plots the optimization in a separate process so that the optimization never waits 
+        for drawing the plot or for the event loop of the plot window.
+        The values of the visualized variables are extracted after each major iteration and sent 
+        to the plotting process over a pipe, which is written without blocking.
+        Values that cannot be written immediately are buffered and sent with the next update.
+        The plotting process plots all the received values using a ``Visualizer`` with the same arguments, 
+        and skips drawing the updates it cannot keep up with.
+
+        If ``headless`` is True, the plotting process does not open a plot window and saves 
+        snapshots of the plot to ``save_figname`` after each update instead, e.g., as a PNG or PDF file 
+        depending on the extension, so that long optimizations can be monitored without a display.
+
+        Parameters
+        ----------
+        visualize_vars : list of str
+            List of variables to visualize. See ``Visualizer`` for the available variables.
+        summary_filename : str
+            Name of the summary file which is displayed in the title of the plot.
+        save_figname : str
+            Name of the file to save the plot.
+        update_interval : int, default=1
+            Number of iterations between plot updates.
+        update_time : float, default=0.0
+            Minimum time in seconds between plot updates.
+        headless : bool, default=False
+            If True, snapshots of the plot are saved to ``save_figname`` instead of showing the plot.
+        '''
+        v_start = time.time()
+        if importlib.util.find_spec('matplotlib') is None: # matplotlib is imported only by the plotting process
+            raise ImportError("matplotlib not found, cannot visualize.")
+        self.visualize_vars = visualize_vars
+        self.save_figname = save_figname
+        self.pending = bytearray()  # Messages waiting to be written to the pipe
+        self.closed = False
+
+        config = dict(visualize_vars=visualize_vars, summary_filename=summary_filename, save_figname=save_figname, 
+                      update_interval=update_interval, update_time=update_time, headless=headless)
+        # The plotting process is started as a new interpreter (instead of multiprocessing) 
+        # so that the main module of the user is not imported again by the plotting process
+        self.process = subprocess.Popen([sys.executable, '-c', 'from pyslsqp.visualize import _plot_process; _plot_process()', json.dumps(config)], 
+                                        stdin=subprocess.PIPE)
+        self.fd = self.process.stdin.fileno()
+        try:
+            os.set_blocking(self.fd, False)
+        except (AttributeError, OSError): # Pipes cannot be made non-blocking on some platforms
+            pass
+
+        self.vis_time = time.time() - v_start
+        self.wait_time = 0.0
+
+    def _send(self, message):
+        '''
+        Write the buffered messages and the new message to the pipe without blocking.
+        Stops sending messages if the plotting process has exited, e.g., if the plot window was closed.
+        '''
+        if self.closed:
+            return
+        self.pending += message
+        try:
+            while self.pending:
+                num_bytes = os.write(self.fd, self.pending)
+                del self.pending[:num_bytes]
+        except BlockingIOError:
+            pass
+        except (BrokenPipeError, OSError):
+            warnings.warn("The plotting process exited. The optimization continues without visualization.")
+            self.closed = True
+
+    def update_plot(self, out_dict):
+        '''
+        Send the latest values of the variables to the plotting process.
+        See ``Visualizer.update_plot`` for the keys of the out_dict.
+        '''
+        v_start = time.time()
+        values = [Visualizer._get_value(var, out_dict) for var in self.visualize_vars]
+        self._send(np.array([_UPDATE] + values, dtype=float).tobytes())
+        self.vis_time += time.time() - v_start
+
+    def _close(self, keep_open):
+        '''
+        Send the remaining values and the final message to the plotting process.
+        '''
+        message = np.zeros(len(self.visualize_vars) + 1)
+        message[0] = _KEEP if keep_open else _CLOSE
+        self._send(message.tobytes())
+        if not self.closed:
+            try:
+                os.set_blocking(self.fd, True)
+                self.process.stdin.write(self.pending)
+                self.process.stdin.close()
+            except (AttributeError, BrokenPipeError, OSError):
+                pass
+            self.closed = True
+
+    def close_plot(self):
+        '''
+        Close the plot after the plotting process saves the plot to ``save_figname``.
+        '''
+        v_start = time.time()
+        self._close(keep_open=False)
+        self.process.wait()
+        self.vis_time += time.time() - v_start
+
+    def keep_plot(self):
+        '''
+        Keep the plot open after the optimization is completed.
+        The plotting process saves the plot and keeps the plot window open until it is closed by the user
+        without blocking the optimization.
+        '''
+        v_start = time.time()
+        self._close(keep_open=True)
+        self.vis_time += time.time() - v_start
+
+# Types of messages sent to the plotting process
+_UPDATE, _CLOSE, _KEEP = 0., 1., 2.
+
+def _plot_process():
+    '''
+    Run the plotting process started by ``ProcessVisualizer``.
+    The configuration is read from the command line argument and the messages from stdin.
+    Each message is an array of float64 with the type of the message followed by the values of the variables.
+    A reader thread receives the messages so that the plot window stays responsive while waiting for the messages,
+    and all the received updates are plotted together.
+    '''
+    import queue
+    import threading
+
+    config = json.loads(sys.argv[1])
+    _import_pyplot()
+    if config['headless']:
+        plt.switch_backend('Agg')
+    vis = Visualizer(config['visualize_vars'], config['summary_filename'], config['save_figname'], 
+                     config['update_interval'], config['update_time'], blit=not config['headless'])
+
+    messages = queue.Queue()
+    message_size = 8 * (len(config['visualize_vars']) + 1)
+    def read():
+        while True:
+            message = sys.stdin.buffer.read(message_size)
+            if len(message) < message_size: # The optimization process exited without sending the final message
+                messages.put(np.array([_CLOSE]))
+                return
+            messages.put(np.frombuffer(message, dtype=float))
+
+    threading.Thread(target=read, daemon=True).start()
+
+    while True:
+        try:
+            message = messages.get(timeout=0.05)
+        except queue.Empty:
+            vis.fig.canvas.flush_events()
+            continue
+
+        # Append all the received updates before redrawing the plot
+        while message[0] == _UPDATE:
+            vis._append(message[1:])
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+        
+        if message[0] == _UPDATE:
+            if (vis.num_points - vis.last_update >= vis.update_interval 
+                and time.time() - vis.last_update_time >= vis.update_time):
+                vis._redraw()
+                if config['headless']:
+                    vis.fig.savefig(config['save_figname'])
+        elif message[0] == _KEEP and not config['headless']:
+            vis.keep_plot()
+            return
+        else:
+            vis.close_plot()
+            return
 
 def visualize(savefilename, visualize_vars, itr_start=0, itr_end=-1, major_only=False, save_figname=None):
     '''
@@ -228,8 +537,7 @@ def visualize(savefilename, visualize_vars, itr_start=0, itr_end=-1, major_only=
     '''
 
     v_start = time.time()
-    if plt is None:
-        raise ImportError("matplotlib not found, cannot visualize.")
+    _import_pyplot()
     from pyslsqp.postprocessing import load_variables
     if isinstance(visualize_vars, str):
         visualize_vars = [visualize_vars]
@@ -0,0 +1,46 @@
+'''
+This script tests the benchmark suite in the benchmarks directory.
+'''
+import os
+import sys
+import copy
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+def test_benchmarks():
+    import json
+    from problems import get_problems
+    from run_benchmarks import run_benchmarks, compare, get_baseline, DEFAULT_BASELINE, COUNTS, TIMES
+
+    results = run_benchmarks(repeat=1)
+    assert len(results['problems']) == len(get_problems())
+    for name, record in results['problems'].items():
+        assert record['success'] == True, name
+        if record['error'] is not None:
+            assert record['error'] < 1e-6, name
+
+    # The committed baseline has all the problems with only the counts, and the results have no regressions 
+    # compared to themselves. The counts depend on the Fortran build, so they are compared with the baseline 
+    # only by running benchmarks/run_benchmarks.py.
+    with open(DEFAULT_BASELINE, 'r') as f:
+        baseline = json.load(f)
+    assert set(baseline['problems']) == set(results['problems'])
+    for name, record in baseline['problems'].items():
+        assert all(isinstance(record[key], int) for key in COUNTS), name
+        assert not any(key in record for key in TIMES), name
+    assert get_baseline(results) == get_baseline(get_baseline(results))
+    assert compare(results, results) == []
+    assert compare(results, get_baseline(results)) == []
+
+    # Increased counts, increased times, and failures are reported as regressions
+    slower = copy.deepcopy(results)
+    slower['problems']['hs071']['nfev'] += 1
+    slower['problems']['hs100']['optimizer_time'] = 2 * results['problems']['hs100']['optimizer_time'] + 1.0
+    slower['problems']['qp_20_10_5']['success'] = False
+    regressions = compare(slower, results)
+    assert len(regressions) == 3
+    assert compare(slower, results, counts_only=True, count_tol=0.5) == [regressions[2]]
+
+if __name__ == "__main__":
+    test_benchmarks()
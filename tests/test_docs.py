@@ -243,7 +243,7 @@ def test_postprocessing_notebook():
     global_vars.update(execute_python_code_snippet(python_code[7], global_vars=global_vars))
     results = global_vars['results']
     assert results['success'] == True
-    check_timing(results)
+    check_timing(results, hot_start=True)
 
     assert_array_almost_equal(results['objective'], 0.5)
     assert_array_almost_equal(results['x'], [0.5, 0.5], decimal=11)
@@ -0,0 +1,36 @@
+'''
+This script tests that importing pyslsqp is fast by checking that the optional dependencies are imported only when used.
+'''
+import sys
+import subprocess
+
+def _import_times():
+    '''
+    Return the modules imported by ``import pyslsqp`` and the cumulative import times of numpy and pyslsqp in seconds,
+    measured in a new interpreter with ``-X importtime``.
+    '''
+    code = "import pyslsqp, sys; print(' '.join(sys.modules))"
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() in ['numpy', 'pyslsqp'] and cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) * 1e-6
+    return out.stdout.split(), times['numpy'], times['pyslsqp']
+
+def test_import_time():
+    modules, _, _ = _import_times()
+
+    # Plotting, HDF5 and multiprocessing modules are imported only when visualizing, saving, or using process executors
+    for module in ['matplotlib', 'h5py', 'multiprocessing']:
+        assert module not in modules
+
+    # The time to import pyslsqp excluding numpy should be less than the time to import numpy.
+    # The best of 3 runs is used to reduce the noise from the other processes.
+    runs = [_import_times()[1:] for _ in range(3)]
+    assert min(pyslsqp_time - numpy_time for numpy_time, pyslsqp_time in runs) < min(numpy_time for numpy_time, _ in runs)
+
+if __name__ == "__main__":
+    test_import_time()
@@ -1,6 +1,8 @@
 '''
 This script tests the optimize function in the pyslsqp module.
 '''
+import numpy as np
+import pytest
 
 def test_get_default_options():
     import numpy as np
@@ -24,15 +26,39 @@ def test_get_default_options():
                         'iprint': 1,
                         'finite_diff_abs_step': None,
                         'finite_diff_rel_step': np.sqrt(np.finfo(float).eps),
+                        'fd_executor': None,
+                        'fd_workers': None,
+                        'obj_batch': None,
+                        'con_batch': None,
+                        'jac_sparsity': None,
+                        'funcs': None,
+                        'derivs': None,
+                        'evaluate_all': None,
+                        'cache_size': 1,
+                        'cache_tol': 0.0,
+                        'eval_store': None,
+                        'eval_store_tag': '',
+                        'event_stream': None,
                         'summary_filename': 'slsqp_summary.out',
+                        'summary_format': 'table',
+                        'summary_flush_interval': 1,
                         'warm_start': False,
                         'hot_start': False,
+                        'hot_start_tol': 0.0,
                         'load_filename': None,
                         'save_itr': None,
                         'save_filename': 'slsqp_recorder.hdf5',
                         'save_vars': ['x', 'objective', 'optimality', 'feasibility', 'step', 'iter', 'majiter', 'ismajor', 'mode'],
+                        'save_backend': None,
+                        'save_layout': 'groups',
+                        'save_compression': None,
+                        'save_async': False,
+                        'save_queue_size': 16,
                         'visualize': False,
                         'visualize_vars': ['objective', 'optimality', 'feasibility'],
+                        'visualize_interval': 1,
+                        'visualize_min_time': 0.0,
+                        'visualize_mode': 'inline',
                         'keep_plot_open': False,
                         'save_figname': 'slsqp_plot.pdf',
                     }
@@ -212,7 +238,656 @@ def test_optimize():
     assert_almost_equal(res12['feasibility'], 0.0, decimal=7)
     assert_almost_equal(res12['x'], [1., 3., 5., 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2], decimal=3)
 
-import pytest
+def _fd_obj(x):
+    return np.sum(x**2)
+
+def _fd_con(x):
+    return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+
+def test_parallel_finite_difference():
+    from concurrent.futures import ThreadPoolExecutor
+    from numpy.testing import assert_array_equal, assert_almost_equal
+    from pyslsqp import optimize
+
+    # Finite difference derivatives evaluated in parallel should be identical to the serial ones
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=np.array([10.]*9 + [1.]), acc=1.0E-6, iprint=0,
+                   summary_filename='par_fd_slsqp.out')
+
+    res1 = optimize(x0, _fd_obj, **options)
+    res2 = optimize(x0, _fd_obj, fd_executor='thread', fd_workers=4, **options)
+    res3 = optimize(x0, _fd_obj, fd_executor='process', fd_workers=2, **options)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        res4 = optimize(x0, _fd_obj, fd_executor=executor, **options)
+
+    assert res1['success'] == True
+    assert_almost_equal(res1['x'], [1., 3., 5., 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2], decimal=3)
+    for res in [res2, res3, res4]:
+        assert res['success'] == True
+        assert res['nfev'] == res1['nfev']
+        assert res['ngev'] == res1['ngev']
+        assert_array_equal(res['x'], res1['x'])
+        assert_array_equal(res['gradient'], res1['gradient'])
+        assert_array_equal(res['jacobian'], res1['jacobian'])
+        assert res['gev_time'] > 0
+
+    with pytest.raises(ValueError):
+        optimize(x0, _fd_obj, fd_executor='gpu', **options)
+    with pytest.raises(ValueError):
+        optimize(x0, _fd_obj, fd_executor='thread', fd_workers=0, **options)
+
+    # The executor is not created if an option is invalid, and is shut down if a function raises an exception
+    import threading, multiprocessing
+    num_threads = threading.active_count()
+    num_processes = len(multiprocessing.active_children())
+    for fd_executor in ['thread', 'process']:
+        with pytest.raises(ValueError):
+            optimize(x0, _fd_obj, fd_executor=fd_executor, cache_size=0, **options)
+        with pytest.raises(ValueError):
+            optimize(x0, _fd_obj, fd_executor=fd_executor, save_itr='every', **options)
+        with pytest.raises(RuntimeError):
+            optimize(x0, _fd_fail, fd_executor=fd_executor, **options)
+        assert threading.active_count() == num_threads
+        assert len(multiprocessing.active_children()) == num_processes
+
+def _fd_fail(x):
+    # Fails at the points perturbed in the first variable from x0 = np.ones(10)
+    if x[0] != 1.:
+        raise RuntimeError("Evaluation failed.")
+    return np.sum(x**2)
+
+def test_batch_finite_difference():
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+
+    ncalls = {'obj_batch': 0, 'con_batch': 0}
+    def obj_batch(X):
+        ncalls['obj_batch'] += 1
+        return np.sum(X**2, axis=1)
+    def con_batch(X):
+        ncalls['con_batch'] += 1
+        return np.stack([X[:, 0] - 1., X[:, 1] - 3., X[:, 2] - 5.], axis=1)
+
+    x0 = np.ones(10)
+    options = dict(meq=2, xl=0.2, xu=np.array([10.]*9 + [1.]), acc=1.0E-6, iprint=0,
+                   summary_filename='batch_fd_slsqp.out')
+
+    res1 = optimize(x0, _fd_obj, con=_fd_con, **options)
+    # Vectorized functions used only for finite differencing
+    res2 = optimize(x0, _fd_obj, con=_fd_con, obj_batch=obj_batch, con_batch=con_batch, **options)
+    assert ncalls['obj_batch'] == res2['ngev']
+    assert ncalls['con_batch'] == res2['ngev']
+    # Vectorized functions used for both function evaluations and finite differencing
+    res3 = optimize(x0, obj_batch=obj_batch, con_batch=con_batch, **options)
+
+    for res in [res2, res3]:
+        assert res['success'] == True
+        assert res['nfev'] == res1['nfev']
+        assert res['ngev'] == res1['ngev']
+        assert_almost_equal(res['objective'], res1['objective'], decimal=11)
+        assert_almost_equal(res['x'], res1['x'], decimal=11)
+        assert_almost_equal(res['gradient'], res1['gradient'], decimal=11)
+        assert_almost_equal(res['jacobian'], res1['jacobian'], decimal=11)
+
+    with pytest.raises(ValueError):
+        optimize(x0, _fd_obj, obj_batch=lambda X: np.sum(X**2), **options)
+
+def test_complex_step():
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+
+    def obj(x):
+        return np.sum(x**2) + np.sin(x[0])
+    def grad(x):
+        g = 2*x
+        g[0] += np.cos(x[0])
+        return g
+    def con(x):
+        return np.array([x[0]*x[1] - 1., x[2]**3 - 5.])
+    def jac(x):
+        j = np.zeros((2, 10))
+        j[0, 0], j[0, 1] = x[1], x[0]
+        j[1, 2] = 3*x[2]**2
+        return j
+    def obj_batch(X):
+        return np.sum(X**2, axis=1) + np.sin(X[:, 0])
+    def con_batch(X):
+        return np.stack([X[:, 0]*X[:, 1] - 1., X[:, 2]**3 - 5.], axis=1)
+
+    x0 = np.ones(10)
+    options = dict(meq=1, xl=0.2, xu=10., iprint=0, summary_filename='cs_slsqp.out')
+
+    res1 = optimize(x0, obj, grad=grad, con=con, jac=jac, **options)
+    res2 = optimize(x0, obj, grad='cs', con=con, jac='cs', **options)
+    res3 = optimize(x0, obj_batch=obj_batch, grad='cs', con_batch=con_batch, jac='cs', **options)
+    res4 = optimize(x0, obj, grad='cs', con=con, jac='cs', fd_executor='thread', **options)
+
+    assert res1['success'] == True
+    for res in [res2, res3, res4]:
+        assert res['success'] == True
+        assert res['num_majiter'] == res1['num_majiter']
+        assert res['nfev'] == res1['nfev']
+        assert res['ngev'] == res1['ngev']
+        assert_almost_equal(res['objective'], res1['objective'], decimal=10)
+        assert_almost_equal(res['x'], res1['x'], decimal=10)
+        assert_almost_equal(res['gradient'], res1['gradient'], decimal=10)
+        assert_almost_equal(res['jacobian'], res1['jacobian'], decimal=10)
+
+    with pytest.raises(ValueError):
+        optimize(x0, obj, grad='fd', **options)
+
+def test_sparse_jacobian():
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+    from pyslsqp.main import get_column_groups
+
+    # Banded (tridiagonal-like) constraint Jacobian with m = n-2 rows and a bandwidth of 3
+    n = 30
+    ncalls = {'con': 0}
+    def con(x):
+        ncalls['con'] += 1
+        return x[:-2] + x[1:-1]**2 + x[2:] - 1.
+    def con_batch(X):
+        return X[:, :-2] + X[:, 1:-1]**2 + X[:, 2:] - 1.
+    def obj(x):
+        return np.sum((x - 2.)**2)
+    
+    rows = np.repeat(np.arange(n-2), 3)
+    cols = (np.arange(n-2)[:, None] + np.arange(3)).flatten()
+    mask = np.zeros((n-2, n), dtype=bool)
+    mask[rows, cols] = True
+
+    groups, colors = get_column_groups(rows, cols, n)
+    assert len(groups) == 3
+    assert sorted(np.concatenate(groups)) == list(range(n))
+    # No two columns in a group share a nonzero row
+    for group in groups:
+        assert np.all(mask[:, group].sum(axis=1) <= 1)
+
+    x0 = np.ones(n)
+    options = dict(meq=n-2, xl=0., xu=np.array([10.]*(n-1) + [1.]), iprint=0, summary_filename='sparse_slsqp.out')
+
+    res1 = optimize(x0, obj, con=con, **options)
+    ncalls['con'] = 0
+    res2 = optimize(x0, obj, con=con, jac_sparsity=(rows, cols), **options)
+    # nfev calls to con() for function evaluations and (1 + number of groups) calls for each Jacobian
+    assert ncalls['con'] == res2['nfev'] + res2['ngev'] * (1 + len(groups))
+    res3 = optimize(x0, obj, con=con, jac_sparsity=mask, **options)
+    res4 = optimize(x0, obj, con=con, jac_sparsity=mask, fd_executor='thread', **options)
+    res5 = optimize(x0, obj, con_batch=con_batch, jac_sparsity=mask, **options)
+    res6 = optimize(x0, obj, con=con, jac='cs', jac_sparsity=mask, **options)
+
+    assert res1['success'] == True
+    for res in [res2, res3, res4, res5, res6]:
+        assert res['success'] == True
+        assert_almost_equal(res['objective'], res1['objective'], decimal=6)
+        assert_almost_equal(res['x'], res1['x'], decimal=4)
+        assert_almost_equal(res['jacobian'], res1['jacobian'], decimal=4)
+        assert np.all(res['jacobian'][~mask] == 0.)
+
+    with pytest.raises(ValueError):
+        optimize(x0, obj, con=con, jac_sparsity=mask[:, :-1], **options)
+    with pytest.raises(ValueError):
+        optimize(x0, obj, con=con, jac_sparsity=(rows + 1, cols), **options)
+
+    # jac_sparsity is rejected where the Jacobian is not finite-differenced or complex-stepped through con
+    def jac(x):
+        return np.where(mask, 1., 0.)
+    def funcs(x):
+        return obj(x), con(x)
+    def derivs(x):
+        return 2*x, jac(x)
+    def evaluate_all(x):
+        return obj(x), con(x), 2*x, jac(x)
+    invalid_options = [dict(obj=obj, con=con, jac=jac), dict(obj=obj), dict(obj=obj, con=con, derivs=derivs),
+                       dict(funcs=funcs), dict(funcs=funcs, derivs=derivs), dict(evaluate_all=evaluate_all)]
+    for funcs_options in invalid_options:
+        with pytest.raises(ValueError, match="jac_sparsity"):
+            optimize(x0, jac_sparsity=mask, **funcs_options, **options)
+
+def test_fused_evaluation():
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+
+    ncalls = {'funcs': 0, 'derivs': 0, 'evaluate_all': 0}
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def con(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jac(x):
+        return np.eye(3, 10)
+    def funcs(x):
+        ncalls['funcs'] += 1
+        return obj(x), con(x)
+    def derivs(x):
+        ncalls['derivs'] += 1
+        return grad(x), jac(x)
+    def evaluate_all(x):
+        ncalls['evaluate_all'] += 1
+        return obj(x), con(x), grad(x), jac(x)
+
+    x0 = np.ones(10)
+    options = dict(meq=2, xl=0.2, xu=10., acc=1.0E-6, iprint=0, summary_filename='fused_slsqp.out')
+
+    res1 = optimize(x0, obj, grad=grad, con=con, jac=jac, **options)
+    res2 = optimize(x0, funcs=funcs, derivs=derivs, **options)
+    assert ncalls['funcs'] == res2['nfev']
+    assert ncalls['derivs'] == res2['ngev']
+    res3 = optimize(x0, evaluate_all=evaluate_all, **options)
+    assert ncalls['evaluate_all'] == res3['nfev']
+    res4 = optimize(x0, obj, con=con, derivs=derivs, **options)
+
+    for res in [res2, res3, res4]:
+        assert res['success'] == True
+        assert res['num_majiter'] == res1['num_majiter']
+        assert res['nfev'] == res1['nfev']
+        assert_almost_equal(res['x'], res1['x'], decimal=11)
+        assert_almost_equal(res['jacobian'], res1['jacobian'], decimal=11)
+    assert res2['ngev'] == res1['ngev']
+    assert res4['ngev'] == res1['ngev']
+    assert res3['ngev'] == res3['nfev'] # derivatives are computed at every function evaluation
+    assert res3['gev_time'] == 0.0
+
+    # Finite differences with fused functions
+    ncalls['funcs'] = 0
+    res5 = optimize(x0, funcs=funcs, **options)
+    res6 = optimize(x0, obj, con=con, **options)
+    assert ncalls['funcs'] == res5['nfev'] + res5['ngev'] * 11
+    assert res5['success'] == True
+    assert_almost_equal(res5['x'], res6['x'], decimal=11)
+    assert_almost_equal(res5['gradient'], res6['gradient'], decimal=11)
+    assert_almost_equal(res5['jacobian'], res6['jacobian'], decimal=11)
+
+    # Unconstrained problem with fused functions
+    res7 = optimize(x0, evaluate_all=lambda x: (obj(x), np.array([]), grad(x), np.zeros((0, 10))), iprint=0)
+    res8 = optimize(x0, funcs=lambda x: (obj(x), []), iprint=0)
+    for res in [res7, res8]:
+        assert res['success'] == True
+        assert res['constraints'].shape == (0,)
+        assert res['jacobian'].shape == (0, 10)
+        assert_almost_equal(res['x'], np.zeros(10), decimal=7)
+
+    with pytest.raises(ValueError):
+        optimize(x0, obj, funcs=funcs, **options)
+    with pytest.raises(ValueError):
+        optimize(x0, funcs=funcs, grad=grad, **options)
+    with pytest.raises(ValueError):
+        optimize(x0, evaluate_all=evaluate_all, derivs=derivs, **options)
+
+def test_evaluation_cache():
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+    from pyslsqp.main import Problem
+
+    obj  = lambda x: np.sum(x**2)
+    con  = lambda x: x[:2] - 1.
+    grad = lambda x: 2*x
+    jac  = lambda x: np.eye(2, 3)
+
+    x0, x1, x2, x3 = np.zeros(3), np.ones(3), 2*np.ones(3), 3*np.ones(3)
+    prob = Problem(x0, obj, con, grad, jac, cache_size=3)
+    # Problem evaluates lazily
+    assert (prob.nfev, prob.ngev) == (0, 0)
+    prob._funcs(x0)
+    prob._derivs(x0)
+    assert (prob.nfev, prob.ngev) == (1, 1)
+    prob._funcs(x1)
+    prob._funcs(x2)
+    # x0 is still in the cache
+    assert prob._funcs(x0)[0] == 0.
+    assert prob.nfev == 3
+    # x1 is the least recently used point and is evicted when x3 is added
+    prob._funcs(x3)
+    prob._funcs(x0)
+    prob._funcs(x2)
+    assert prob.nfev == 4
+    assert prob._funcs(x1)[0] == 3.
+    assert prob.nfev == 5
+    # -0.0 and 0.0 are matched
+    prob._derivs(-x0)
+    assert prob.ngev == 1
+    assert prob.cache_hits == 4
+    assert prob.cache_misses == 6
+
+    # Tolerance-based matching
+    prob = Problem(x0, obj, con, grad, jac, cache_size=2, cache_tol=1e-10)
+    prob._funcs(x0)
+    assert prob._funcs(x0 + 1e-11)[0] == 0.
+    assert prob._funcs(x0 + 1e-9)[0] > 0.
+    assert prob.nfev == 2
+
+    # Larger caches do not change the optimization results
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=10., iprint=0, summary_filename='cache_slsqp.out')
+    res1 = optimize(x0, _fd_obj, **options)
+    res2 = optimize(x0, _fd_obj, cache_size=10, **options)
+    assert res1['success'] == True
+    assert res2['success'] == True
+    assert res2['nfev'] <= res1['nfev']
+    assert res1['cache_misses'] == res1['nfev'] + res1['ngev']
+    assert res2['cache_misses'] == res2['nfev'] + res2['ngev']
+    assert_almost_equal(res2['x'], res1['x'], decimal=11)
+
+    with pytest.raises(ValueError):
+        optimize(x0, _fd_obj, cache_size=0, **options)
+
+def test_evaluation_store():
+    import os
+    import h5py
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+
+    ncalls = {'obj': 0}
+    def obj(x):
+        ncalls['obj'] += 1
+        return np.sum(x**2)
+    
+    if os.path.exists('eval_store.hdf5'):
+        os.remove('eval_store.hdf5')
+
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=10., iprint=0, summary_filename='store_slsqp.out', 
+                   eval_store='eval_store.hdf5', eval_store_tag='v1')
+
+    res1 = optimize(x0, obj, **options)
+    assert res1['success'] == True
+    assert res1['store_hits'] == 0
+
+    # Rerun with the same options reuses all evaluations
+    ncalls['obj'] = 0
+    res2 = optimize(x0, obj, **options)
+    assert ncalls['obj'] == 0
+    assert res2['nfev'] == 0
+    assert res2['ngev'] == 0
+    assert res2['store_hits'] == res1['nfev'] + res1['ngev']
+    assert_array_equal(res2['x'], res1['x'])
+
+    # Rerun with a different scaling reuses the evaluations at the common points
+    res3 = optimize(x0, obj, x_scaler=2., **options)
+    assert res3['success'] == True
+    assert res3['store_hits'] > 0
+
+    # A different tag does not reuse the saved evaluations
+    options['eval_store_tag'] = 'v2'
+    res4 = optimize(x0, obj, **options)
+    assert res4['store_hits'] == 0
+    assert res4['nfev'] == res1['nfev']
+
+    # The store is closed if the optimization raises an exception, 
+    # and the evaluations saved before the exception are reused when it is opened again
+    def failing_obj(x):
+        if ncalls['obj'] == 20:
+            raise RuntimeError("Evaluation failed.")
+        return obj(x)
+    options['eval_store_tag'] = 'v3'
+    ncalls['obj'] = 0
+    # The traceback kept in excinfo keeps the local variables of optimize (including the store) alive
+    with pytest.raises(RuntimeError, match="Evaluation failed.") as excinfo:
+        optimize(x0, failing_obj, **options)
+    res5 = optimize(x0, obj, **options)
+    assert res5['store_hits'] == 3
+    assert_array_equal(res5['x'], res1['x'])
+    # The file can be truncated only if no handle to it is left open
+    h5py.File('eval_store.hdf5', 'w').close()
+
+def test_summary_formats():
+    import json
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+
+    def obj(x):
+        return np.sum(x**2)
+
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=10., iprint=0)
+    res1 = optimize(x0, obj, summary_filename='table_slsqp.out', **options)
+    res2 = optimize(x0, obj, summary_filename='csv_slsqp.out', summary_format='csv', summary_flush_interval=0, **options)
+    res3 = optimize(x0, obj, summary_filename='jsonl_slsqp.out', summary_format='jsonl', summary_flush_interval=3, **options)
+
+    table = np.loadtxt('table_slsqp.out', skiprows=1)
+    csv = np.loadtxt('csv_slsqp.out', delimiter=',', skiprows=1)
+    with open('jsonl_slsqp.out') as f:
+        rows = [json.loads(line) for line in f]
+    assert table.shape == csv.shape == (res1['num_majiter'] + 1, 9)
+    assert len(rows) == res3['num_majiter'] + 1
+    assert list(rows[-1].keys()) == ['majiter', 'nfev', 'ngev', 'objective', 'gnorm', 'cnorm', 'feasibility', 'optimality', 'step']
+    assert rows[-1]['nfev'] == res2['nfev'] == csv[-1, 1]
+    assert_almost_equal(csv[:, 3], table[:, 3], decimal=5)
+    assert_almost_equal(rows[-1]['objective'], res3['objective'])
+
+    # The summary file is closed and the written rows are kept even if the optimization raises an exception
+    def failing_obj(x):
+        if np.any(x != x0):
+            raise RuntimeError('Model failed')
+        return obj(x)
+    with pytest.raises(RuntimeError):
+        optimize(x0, failing_obj, grad=lambda x: 2*x, summary_filename='fail_slsqp.out', summary_flush_interval=0, **options)
+    assert np.loadtxt('fail_slsqp.out', skiprows=1).shape == (9,)
+
+    with pytest.raises(ValueError):
+        optimize(x0, obj, summary_format='xml', **options)
+
+def test_headless_visualization():
+    import os
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    pytest.importorskip('matplotlib')
+
+    def obj(x):
+        return np.sum((x - np.arange(10))**4)
+    
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=10., iprint=0)
+    if os.path.exists('headless_slsqp.png'):
+        os.remove('headless_slsqp.png')
+
+    # The plot is drawn by a separate process that saves the snapshots to the figure without a display
+    res1 = optimize(x0, obj, summary_filename='headless_slsqp.out', **options)
+    res2 = optimize(x0, obj, summary_filename='headless_slsqp.out', visualize=True, visualize_mode='headless', 
+                    visualize_vars=['objective', 'optimality', 'x[1]', 'jacobian[0,1]'], save_figname='headless_slsqp.png', **options)
+    assert os.path.exists('headless_slsqp.png')
+    assert res2['success'] == True
+    assert_array_equal(res2['x'], res1['x'])
+
+    with pytest.raises(ValueError):
+        optimize(x0, obj, visualize=True, visualize_mode='window', **options)
+
+    # The plotting process is stopped if the optimization raises an exception
+    def failing_obj(x):
+        if x[0] != 1.:
+            raise RuntimeError("Evaluation failed.")
+        return obj(x)
+    os.remove('headless_slsqp.png')
+    with pytest.raises(RuntimeError, match="Evaluation failed.") as excinfo:
+        optimize(x0, failing_obj, summary_filename='headless_slsqp.out', visualize=True, visualize_mode='headless', 
+                 save_figname='headless_slsqp.png', **options)
+    visualizer = [entry.locals['visualizer'] for entry in excinfo.traceback if 'visualizer' in entry.locals][0]
+    assert visualizer.process.poll() == 0
+    assert os.path.exists('headless_slsqp.png')
+
+def test_event_stream():
+    from pyslsqp import optimize
+    from pyslsqp.events import EventStream
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+
+    events = []
+    majors = []
+    stream = EventStream()
+    stream.subscribe(events.append)
+    stream.subscribe(majors.append, 'major_iter')
+
+    x0 = np.ones(10)
+    res = optimize(x0, obj, grad=grad, con=_fd_con, meq=2, xl=0.2, xu=10., iprint=0, summary_filename='events_slsqp.out', 
+                   save_itr='all', save_filename='events_slsqp', save_backend='npy', event_stream=stream)
+    
+    types = [event.type for event in events]
+    ends = [event for event in events if event.type == 'eval_end']
+    assert types.count('eval_start') == len(ends) == res['nfev'] + res['ngev']
+    assert sum(event.data['kind'] == 'funcs' for event in ends) == res['nfev']
+    assert all(event.nbytes == x0.nbytes for event in events if event.type == 'eval_start')
+    assert types.count('solver_call') == types.count('record_write') - 1 # The 0th iteration is saved before calling SLSQP
+    assert types.count('plot_update') == 0
+    assert len(majors) == types.count('major_iter') == res['num_majiter']
+    assert [event.majiter for event in majors] == list(range(1, res['num_majiter'] + 1))
+    assert majors[-1].data['objective'] == res['objective']
+    assert majors[-1].data['nfev'] == res['nfev']
+
+    # Timestamps are ordered and the durations are consistent with the timings in the results
+    assert all(event.end >= event.start for event in events)
+    assert all(e1.start <= e2.start for e1, e2 in zip(events[:-1], events[1:]))
+    fev_time = sum(event.duration for event in ends if event.data['kind'] == 'funcs') * 1e-9
+    assert fev_time <= res['fev_time'] + 1e-3
+
+    with pytest.raises(ValueError):
+        stream.subscribe(print, 'major_iteration')
+    with pytest.raises(TypeError):
+        optimize(x0, obj, iprint=0, event_stream=print)
+
+def test_solver():
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize, Solver
+
+    # Solver.solve() should give results identical to optimize() for the same options
+    x0 = np.ones(10)
+    options = dict(con=_fd_con, meq=2, xl=0.2, xu=10., acc=1.0E-8)
+    res = optimize(x0, _fd_obj, iprint=0, summary_filename='solver_slsqp.out', **options)
+    solver = Solver(10, _fd_obj, **options)
+    w = solver.workspace
+    assert w is None # Allocated at the first solve after evaluating the constraints
+    for _ in range(2):
+        res_s = solver.solve(x0)
+        for key in ['x', 'objective', 'optimality', 'feasibility', 'constraints', 'multipliers', 'gradient', 'jacobian',
+                    'num_majiter', 'nfev', 'ngev', 'status', 'success']:
+            assert_array_equal(res_s[key], res[key])
+        # The workspace is allocated once and reused
+        assert w is None or solver.workspace is w
+        w = solver.workspace
+
+    # Results of a previous solve are not modified by the later solves
+    multipliers = res_s['multipliers'] * 1.0
+    res_b = solver.solve(x0, xu=2.)
+    assert_array_equal(res_s['multipliers'], multipliers)
+    assert np.all(res_b['x'] <= 2.)
+    res_b = optimize(x0, _fd_obj, iprint=0, summary_filename='solver_slsqp.out', **{**options, 'xu': 2.})
+    assert_array_equal(solver.solve(x0, xu=2.)['x'], res_b['x'])
+    assert_array_equal(solver.solve(x0)['x'], res['x']) # Bounds given to the solver are used if not overridden
+
+    # SLSQP jumps its major iteration counter from 4 to 9 when exiting on this problem.
+    # The count is corrected in the results without modifying the counter in the workspace.
+    options = dict(grad=lambda x: 2*x, con=lambda x: np.array([x[0] - 1., x[1] - 3., x[2] - 5.]), jac=lambda x: np.eye(3, 10),
+                   meq=2, xl=0.2, xu=10., x_scaler=0.02, obj_scaler=100., con_scaler=0.02)
+    with pytest.warns(UserWarning, match='jumped from 4 to 9'):
+        res = optimize(x0, lambda x: np.sum(x**2), iprint=0, summary_filename='solver_slsqp.out', **options)
+    solver = Solver(10, lambda x: np.sum(x**2), **options)
+    with pytest.warns(UserWarning, match='jumped from 4 to 9'):
+        res_s = solver.solve(x0)
+    assert res['num_majiter'] == res_s['num_majiter'] == 5
+    assert solver.workspace.majiter == 9
+    assert_array_equal(res_s['x'], res['x'])
+
+    # Unconstrained problem with data updated between the solves
+    p = np.zeros(3)
+    solver = Solver(3, obj=lambda x: np.sum((x - p)**2), grad=lambda x: 2*(x - p))
+    for k in range(3):
+        p[:] = k
+        res_u = solver.solve(np.zeros(3))
+        assert res_u['success']
+        assert np.allclose(res_u['x'], k)
+
+    with pytest.raises(ValueError):
+        Solver(3)
+    with pytest.raises(ValueError):
+        Solver(3, obj=_fd_obj, maxiter=0)
+    with pytest.raises(ValueError):
+        solver.solve(np.zeros(4))
+
+def test_batch_solver():
+    from numpy.testing import assert_array_equal
+    from pyslsqp import Solver, BatchSolver
+
+    # Each instance of the batch should give results identical to Solver.solve() for the same problem
+    K, n, m = 6, 3, 2
+    P = np.linspace(-1., 2., K*n).reshape(K, n)
+    X0 = np.linspace(0., 1., K*n).reshape(K, n)[::-1]
+    xu = np.array([2., 2., 0.5])
+
+    def funcs(X, idx):
+        f = np.sum((X - P[idx])**2, axis=1) + X[:, 0]*X[:, 1]
+        c = np.stack([X[:, 0] + X[:, 1] + X[:, 2] - 1., 4. - X[:, 0]**2 - X[:, 1]**2], axis=1)
+        return f, c
+    def derivs(X, idx):
+        g = 2*(X - P[idx]) + X[:, [1, 0, 2]] * np.array([1., 1., 0.])
+        j = np.zeros((len(idx), m, n))
+        j[:, 0] = 1.
+        j[:, 1, :2] = -2*X[:, :2]
+        return g, j
+
+    for batch_derivs in [derivs, None]:
+        batch = BatchSolver(n, m, funcs, batch_derivs, meq=1, xl=-2., xu=xu)
+        for _ in range(2):
+            res = batch.solve(X0)
+            assert res['num_funcs_calls'] < res['nfev'].sum()
+            assert len(batch.workspaces) == K
+            for k in range(K):
+                kw = dict(obj=lambda x: funcs(x[None], [k])[0][0], con=lambda x: funcs(x[None], [k])[1][0], meq=1, xl=-2., xu=xu)
+                if batch_derivs is not None:
+                    kw.update(grad=lambda x: derivs(x[None], [k])[0][0], jac=lambda x: derivs(x[None], [k])[1][0])
+                res_k = Solver(n, **kw).solve(X0[k])
+                assert res['success'][k]
+                for key in ['x', 'objective', 'optimality', 'feasibility', 'constraints', 'multipliers', 'gradient', 'jacobian',
+                            'num_majiter', 'nfev', 'ngev', 'status']:
+                    assert_array_equal(res[key][k], res_k[key])
+
+    # Unconstrained problems with bounds for each problem
+    batch = BatchSolver(n, 0, lambda X, idx: (np.sum((X - P[idx])**2, axis=1), None), meq=0)
+    res = batch.solve(np.zeros((K, n)), xl=-np.ones((K, n)), xu=np.ones((K, n)))
+    assert np.all(res['success'])
+    assert np.allclose(res['x'], np.clip(P, -1., 1.), atol=1e-3)
+    assert res['constraints'].shape == (K, 0)
+
+    with pytest.raises(ValueError):
+        BatchSolver(n, 1, funcs, meq=2)
+    # The exact line search (acc < 0) is not supported
+    with pytest.raises(ValueError):
+        BatchSolver(n, 1, funcs, acc=-1e-6)
+    with pytest.raises(ValueError):
+        batch.solve(np.zeros((K, n)), xl=np.zeros(K))
+
+def test_concurrent_optimize():
+    from concurrent.futures import ThreadPoolExecutor
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+
+    # The SLSQP wrapper releases the GIL and keeps no global state,
+    # so concurrent optimizations on threads should be identical to the serial ones
+    rng = np.random.default_rng(0)
+    n, m = 30, 10
+    H = rng.standard_normal((n, n))
+    H = H @ H.T + n * np.eye(n)
+    A = rng.standard_normal((m, n))
+
+    def run(k):
+        q = np.linspace(-1., 1., n) * (k + 1)
+        obj  = lambda x: 0.5 * x @ H @ x + q @ x
+        grad = lambda x: H @ x + q
+        con  = lambda x: A @ x - 1.
+        jac  = lambda x: A
+        return optimize(np.zeros(n), obj, grad=grad, con=con, jac=jac, meq=3, xl=-5., xu=5., iprint=0,
+                        summary_filename=f'concurrent_slsqp_{k}.out')
+
+    serial = [run(k) for k in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        concurrent = list(executor.map(run, range(8)))
+    for res_s, res_c in zip(serial, concurrent):
+        assert res_s['success']
+        for key in ['x', 'objective', 'optimality', 'feasibility', 'multipliers', 'num_majiter', 'nfev', 'ngev']:
+            assert_array_equal(res_c[key], res_s[key])
 
 @pytest.mark.visualize
 def test_visualize():
@@ -261,6 +936,29 @@ def test_visualize():
         assert_almost_equal(res2['feasibility'], 0.0, decimal=7)
         assert_almost_equal(res2['x'], [1., 3., 5., 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2], decimal=3)
 
+@pytest.mark.visualize
+def test_visualizer_throttling():
+    from numpy.testing import assert_array_equal
+    from pyslsqp.visualize import Visualizer
+
+    vis = Visualizer(['objective', 'optimality', 'x[1]', 'jacobian[0,1]'], 'throttled_slsqp.out', 'throttled_slsqp.pdf', update_interval=10)
+    n_itr = 1000
+    for k in range(n_itr):
+        out_dict = {'majiter': k, 'objective': 1. / (k + 1), 'optimality': 10.**(-k/100), 
+                    'x': np.array([0., k]), 'jacobian': np.array([[0., -k]])}
+        vis.update_plot(out_dict)
+
+    # All the values are stored but the plot is updated only every 10 iterations
+    assert vis.num_points == n_itr
+    assert vis.data.shape[0] >= n_itr
+    assert_array_equal(vis.data[:n_itr, 2], np.arange(n_itr))
+    assert vis.num_draws + vis.num_blits == n_itr // 10
+    # Axis limits are expanded geometrically so most updates only redraw the lines
+    if vis.blit:
+        assert vis.num_draws < 50
+    vis.close_plot()
+    assert_array_equal(vis.lines_dict['jacobian[0,1]'].get_ydata(), -np.arange(n_itr))
+
 def test_warm_and_hot_start():
     import numpy as np
     from numpy.testing import assert_almost_equal
@@ -330,9 +1028,85 @@ def test_warm_and_hot_start():
     assert res3['nfev_reused_in_hotstart'] == 6
     assert res3['ngev_reused_in_hotstart'] == 5
 
+    # A fully hot-started optimization does not call any of the user functions
+    def fail(x):
+        raise RuntimeError("User functions must not be called in a fully hot-started optimization.")
+    res4 = optimize(x0, fail, grad=fail, con=fail, jac=fail, meq=2, xl=0.2, xu=10., acc=1.0E-6,
+                    summary_filename='hot_eqineq_slsqp.out', hot_start=True, load_filename='save_eqineq_slsqp.hdf5',
+                    x_scaler=0.02, obj_scaler=100., con_scaler=0.02)
     
+    assert res4['success'] == True
+    assert_almost_equal(res4['x'], res3['x'], decimal=11)
+    assert res4['nfev_reused_in_hotstart'] == 6
+    assert res4['ngev_reused_in_hotstart'] == 5
+
+
+def test_hot_start_after_divergence():
+    import h5py
+    from numpy.testing import assert_almost_equal
+    from pyslsqp import optimize
+
+    ncalls = {'obj': 0}
+    def obj(x):
+        ncalls['obj'] += 1
+        return (1 - x[0])**2 + 100 * (x[1] - x[0]**2)**2
+    def grad(x):
+        return np.array([-2 * (1 - x[0]) - 400 * x[0] * (x[1] - x[0]**2), 200 * (x[1] - x[0]**2)])
+    def con(x):
+        return np.array([1 - x[0]**2 - x[1]**2])
+    def jac(x):
+        return np.array([[-2 * x[0], -2 * x[1]]])
+    
+    x0 = np.array([-1.2, 1.])
+    options = dict(grad=grad, con=con, jac=jac, iprint=0)
+
+    res1 = optimize(x0, obj, acc=1.0E-4, summary_filename='div_slsqp.out', save_itr='all', save_filename='div_slsqp.hdf5',
+                    save_vars=['x', 'objective', 'constraints', 'gradient', 'jacobian'], **options)
+    res2 = optimize(x0, obj, acc=1.0E-10, summary_filename='div_ref_slsqp.out', **options)
+    assert res2['nfev'] > res1['nfev']
+
+    # The tighter tolerance continues the optimization beyond the saved iterations
+    ncalls['obj'] = 0
+    res3 = optimize(x0, obj, acc=1.0E-10, summary_filename='div_hot_slsqp.out', 
+                    hot_start=True, load_filename='div_slsqp.hdf5', **options)
+    assert res3['success'] == True
+    assert res3['nfev'] == res2['nfev']
+    assert res3['nfev_reused_in_hotstart'] == res1['nfev']
+    assert ncalls['obj'] == res3['nfev'] - res3['nfev_reused_in_hotstart']
+    assert_almost_equal(res3['x'], res2['x'], decimal=11)
+
+    # Perturb the saved iterates and remove the modes to mimic files saved by older versions
+    with h5py.File('div_slsqp.hdf5', 'a') as file:
+        for k in range(res1['nfev'] + res1['ngev']):
+            group = file[f'iter_{k}']
+            x = group['x'][()]
+            del group['x'], group['mode']
+            group['x'] = x * (1 + 1e-14) if k > 0 else x
+
+    res4 = optimize(x0, obj, acc=1.0E-4, summary_filename='div_hot_slsqp.out', 
+                    hot_start=True, load_filename='div_slsqp.hdf5', **options)
+    assert res4['nfev_reused_in_hotstart'] == 1
+    res5 = optimize(x0, obj, acc=1.0E-4, summary_filename='div_hot_slsqp.out', hot_start_tol=1e-10,
+                    hot_start=True, load_filename='div_slsqp.hdf5', **options)
+    assert res5['nfev_reused_in_hotstart'] == res1['nfev']
+    assert res5['ngev_reused_in_hotstart'] == res1['ngev']
+    assert_almost_equal(res5['x'], res1['x'], decimal=11)
+
 if __name__ == "__main__":
     test_optimize()
     test_visualize()
+    test_visualizer_throttling()
+    test_headless_visualization()
     test_get_default_options()
-    test_warm_and_hot_start()
\ No newline at end of file
+    test_warm_and_hot_start()
+    test_parallel_finite_difference()
+    test_batch_finite_difference()
+    test_complex_step()
+    test_sparse_jacobian()
+    test_fused_evaluation()
+    test_evaluation_cache()
+    test_evaluation_store()
+    test_hot_start_after_divergence()
+    test_solver()
+    test_concurrent_optimize()
+    test_batch_solver()
\ No newline at end of file
@@ -0,0 +1,154 @@
+'''
+This script tests the parallel module.
+'''
+import os
+import numpy as np
+import pytest
+
+def _obj(x):
+    return np.sum(x**2)
+
+def _con(x):
+    return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+
+def test_optimize_many(tmp_path):
+    import multiprocessing
+    from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize, optimize_many
+    from pyslsqp.parallel import _import_cloudpickle
+
+    summary_filename = str(tmp_path / 'many_slsqp.out')
+    problems = [{'x0': np.full(10, k + 1.), 'obj': _obj, 'con': _con, 'meq': 2, 'xl': 0.2} for k in range(4)]
+    serial = [optimize(iprint=0, summary_filename=summary_filename, **problem) for problem in problems]
+
+    # Lambdas and closures can be used with forked worker processes, threads, or cloudpickle
+    problems[1]['obj'] = lambda x: np.sum(x**2)
+    executors = ['thread', None, ThreadPoolExecutor(max_workers=2)]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        executors.append('fork')
+    if _import_cloudpickle() is not None:
+        executors.append('process')
+        executors.append(ProcessPoolExecutor(max_workers=2)) # Problems are pickled for a given process executor
+    for executor in executors:
+        results = optimize_many(problems, workers=2, executor=executor, summary_filename=summary_filename)
+        assert len(results) == len(problems)
+        for k, (res, ref) in enumerate(zip(results, serial)):
+            for key in ['x', 'objective', 'multipliers', 'nfev', 'ngev', 'num_majiter']:
+                assert_array_equal(res[key], ref[key])
+            # Each run writes to its own summary file
+            assert res['summary_filename'] == str(tmp_path / f'many_slsqp_{k}.out')
+            assert os.path.exists(res['summary_filename'])
+    for executor in executors:
+        if isinstance(executor, Executor):
+            executor.shutdown()
+
+    # Problems as tuples of positional arguments, and per-run recorder files
+    results = optimize_many([(np.ones(10), _obj, None, _con, None, 2)] * 2, executor='process', maxiter=50,
+                            summary_filename=summary_filename, save_itr='major', save_backend='npy',
+                            save_filename=str(tmp_path / 'many_slsqp'))
+    assert [res['save_filename'] for res in results] == [str(tmp_path / f'many_slsqp_{k}') for k in range(2)]
+    assert all(os.path.isdir(res['save_filename']) for res in results)
+    assert_array_equal(results[0]['x'], results[1]['x'])
+
+    # Parameter grid
+    def problem(a, b):
+        return {'x0': np.zeros(2), 'obj': lambda x: np.sum((x - a)**2), 'con': lambda x: np.array([b - x[0] - x[1]])}
+    results = optimize_many(problem, params={'a': [0., 1.], 'b': [1., 3.]}, summary_filename=summary_filename)
+    assert [res['params'] for res in results] == [{'a': 0., 'b': 1.}, {'a': 0., 'b': 3.}, {'a': 1., 'b': 1.}, {'a': 1., 'b': 3.}]
+    assert_array_equal(np.round(results[2]['x'], 6), [0.5, 0.5])
+    assert_array_equal(np.round(results[3]['x'], 6), [1., 1.])
+
+    with pytest.raises(ValueError):
+        optimize_many([{'obj': _obj}])
+    with pytest.raises(ValueError):
+        optimize_many([{'x0': np.ones(2), 'objective': _obj}])
+    with pytest.raises(ValueError):
+        optimize_many(problems, executor='mpi')
+
+    # acc < 0 is rejected with thread executors
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for thread_executor in ['thread', executor]:
+            with pytest.raises(ValueError, match="thread-safe"):
+                optimize_many(problems, executor=thread_executor, acc=-1e-6)
+        with pytest.raises(ValueError, match="thread-safe"):
+            optimize_many(problems[:1] + [{**problems[1], 'acc': -1e-6}], executor=executor)
+    results = optimize_many(problems[:2], executor=None, acc=-1e-6, summary_filename=summary_filename)
+    assert len(results) == 2
+
+def test_multistart():
+    import importlib.util
+    import multiprocessing
+    from numpy.testing import assert_array_equal
+    from pyslsqp import multistart
+    from pyslsqp.parallel import sample_starts, _import_cloudpickle
+
+    # Latin hypercube samples have one point in each of the num_starts intervals of each variable
+    X = sample_starts(10, [0., -1.], [1., 1.], seed=0)
+    assert X.shape == (10, 2)
+    assert_array_equal(np.sort(np.floor(X[:, 0] * 10)), np.arange(10))
+    assert_array_equal(np.sort(np.floor((X[:, 1] + 1) * 5)), np.arange(10))
+    assert_array_equal(sample_starts(10, [0., -1.], [1., 1.], seed=0), X)
+
+    # Rastrigin-like function with a grid of local minima and the global minimum at the origin
+    obj  = lambda x: np.sum(x**2 - 2*np.cos(2*np.pi*x))
+    grad = lambda x: 2*x + 4*np.pi*np.sin(2*np.pi*x)
+    con  = lambda x: np.array([x[0] + x[1] + 3.])
+    options = dict(obj=obj, grad=grad, con=con, xl=-2.5, xu=2.5, x0=np.full(2, 1.8), num_starts=20, seed=1)
+    serial = multistart(executor=None, **options)
+    assert serial['num_solved'] == 21 and not serial['target_reached']
+    assert_array_equal(serial['starts'][0], [1.8, 1.8])
+    assert_array_equal(np.round(serial['x'], 4), [0., 0.])
+    assert serial['objective'] == serial['best']['objective'] == serial['minima'][0]['objective']
+    assert sum(minimum['num_hits'] for minimum in serial['minima']) == sum(res['success'] for res in serial['results'])
+    assert all(m1['objective'] <= m2['objective'] for m1, m2 in zip(serial['minima'][:-1], serial['minima'][1:]))
+    assert all(np.max(np.abs(m1['x'] - m2['x'])) > 1e-3 for m1, m2 in zip(serial['minima'][:-1], serial['minima'][1:]))
+
+    # The functions are lambdas, so the 'process' executor requires cloudpickle
+    executors = ['thread']
+    if 'fork' in multiprocessing.get_all_start_methods():
+        executors.append('fork')
+    if _import_cloudpickle() is not None:
+        executors.append('process')
+    for executor in executors:
+        res = multistart(executor=executor, workers=2, **options)
+        for res_s, res_p in zip(serial['results'], res['results']):
+            assert res_p['start'] == res_s['start']
+            assert_array_equal(res_p['x'], res_s['x'])
+
+    # Early stopping once the target objective is reached
+    res = multistart(executor=None, target=-3.99, **options)
+    assert res['target_reached'] and res['objective'] <= -3.99
+    assert res['num_solved'] < 21
+    assert res['results'][-1] is None
+    res = multistart(executor='thread', workers=2, target=-3.99, **options)
+    assert res['target_reached'] and res['objective'] <= -3.99
+
+    # Given starting points
+    res = multistart(obj, grad, xl=-2.5, xu=2.5, sampling=np.array([[1.1, 1.1], [-0.1, 0.1]]), executor=None)
+    assert res['num_solved'] == 2 and res['best']['start'] == 1
+
+    if importlib.util.find_spec('scipy') is not None:
+        res = multistart(executor=None, sampling='sobol', **options)
+        assert res['num_solved'] == 21
+
+    with pytest.raises(ValueError):
+        multistart(obj, xl=-np.inf, xu=np.ones(2), executor=None)
+    with pytest.raises(ValueError):
+        multistart(obj, xl=-1., xu=1., executor=None)
+    with pytest.raises(ValueError):
+        multistart(obj, xl=-np.ones(2), xu=np.ones(2), sampling='halton', executor=None)
+    with pytest.raises(ValueError, match="thread-safe"):
+        multistart(obj, xl=-np.ones(2), xu=np.ones(2), executor='thread', acc=-1e-6)
+    with pytest.raises(ValueError, match="starting point"):
+        multistart(obj, xl=-np.ones(2), xu=np.ones(2), num_starts=0, executor=None)
+    with pytest.raises(ValueError, match="starting point"):
+        multistart(obj, xl=-np.ones(2), xu=np.ones(2), sampling=np.zeros((0, 2)), executor=None)
+    res = multistart(obj, grad, xl=-np.ones(2), xu=np.ones(2), x0=np.full(2, 0.5), num_starts=0, executor=None)
+    assert res['num_solved'] == 1 and res['best']['start'] == 0
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as tmpdir:
+        test_optimize_many(pathlib.Path(tmpdir))
+    test_multistart()
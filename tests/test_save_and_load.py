@@ -126,5 +126,366 @@ def test_save_and_load():
     assert results['summary_filename'] == 'save_load_slsqp.out'
     assert results['save_filename'] == 'save_load_slsqp.hdf5'
 
+def test_columnar_layout():
+    import h5py
+    import numpy as np
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    from pyslsqp.save_and_load import load_variables, load_results, print_file_contents
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def coneqineq(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jaceqineq(x):
+        return np.eye(3, 10)
+    
+    x0 = np.ones(10)
+    save_vars = ['iter', 'majiter', 'mode', 'x', 'objective', 'constraints', 'gradient', 'jacobian']
+    options = dict(grad=grad, con=coneqineq, jac=jaceqineq, meq=2, xl=0.2, xu=10., acc=1.0E-6, 
+                   x_scaler=0.02, obj_scaler=100., con_scaler=0.02, save_vars=save_vars)
+
+    for save_itr in ['all', 'major']:
+        optimize(x0, obj, summary_filename='groups_slsqp.out', save_itr=save_itr, save_filename='groups_slsqp.hdf5', **options)
+        optimize(x0, obj, summary_filename='columnar_slsqp.out', save_itr=save_itr, save_filename='columnar_slsqp.hdf5', 
+                 save_layout='columnar', save_compression='gzip', **options)
+        
+        with h5py.File('columnar_slsqp.hdf5', 'r') as file:
+            assert not any(key.startswith('iter_') for key in file.keys())
+            num_saves = 11 if save_itr == 'all' else 6
+            assert file['iterates']['x'].shape == (num_saves, 10)
+            assert file['iterates']['jacobian'].shape == (num_saves, 3, 10)
+            assert file['iterates']['x'].compression == 'gzip'
+        print_file_contents('columnar_slsqp.hdf5')
+
+        # Both layouts are loaded identically
+        vars = ['iter', 'majiter', 'mode', 'x', 'x[1]', 'objective', 'constraints[2]', 'jacobian[1,1]']
+        for kwargs in [{}, {'itr_start': -2, 'itr_end': -1}, {'major_only': True}, {'itr_start': 1, 'itr_end': 3, 'major_only': True}]:
+            groups_data = load_variables('groups_slsqp.hdf5', vars, **kwargs)
+            columnar_data = load_variables('columnar_slsqp.hdf5', vars, **kwargs)
+            for var in vars:
+                assert_array_equal(columnar_data[var], groups_data[var])
+        assert load_results('columnar_slsqp.hdf5')['nfev'] == load_results('groups_slsqp.hdf5')['nfev']
+    
+    # Warm and hot starting from a columnar file
+    optimize(x0, obj, summary_filename='columnar_slsqp.out', save_itr='all', save_filename='columnar_slsqp.hdf5', 
+             save_layout='columnar', **options)
+    res = optimize(x0, obj, summary_filename='columnar_slsqp.out', hot_start=True, load_filename='columnar_slsqp.hdf5', **options)
+    assert res['nfev_reused_in_hotstart'] == 6
+    assert res['ngev_reused_in_hotstart'] == 5
+    res = optimize(x0, obj, summary_filename='columnar_slsqp.out', warm_start=True, load_filename='columnar_slsqp.hdf5', **options)
+    assert res['num_majiter'] == 1
+
+    # Unconstrained problems save empty constraints
+    optimize(x0, obj, grad=grad, save_itr='all', save_filename='columnar_slsqp.hdf5', save_layout='columnar', save_vars=save_vars)
+    assert load_variables('columnar_slsqp.hdf5', 'constraints')['constraints'][0].shape == (0,)
+    
+    try:
+        optimize(x0, obj, grad=grad, save_itr='all', save_layout='rows')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Invalid save_layout must raise a ValueError.")
+
+def test_async_recorder():
+    import numpy as np
+    import pytest
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    from pyslsqp.save_and_load import load_variables, load_results
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def coneqineq(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jaceqineq(x):
+        return np.eye(3, 10)
+    
+    x0 = np.ones(10)
+    save_vars = ['iter', 'majiter', 'mode', 'x', 'objective', 'constraints', 'gradient', 'jacobian']
+    options = dict(grad=grad, con=coneqineq, jac=jaceqineq, meq=2, xl=0.2, xu=10., acc=1.0E-6, 
+                   x_scaler=0.02, obj_scaler=100., con_scaler=0.02, save_vars=save_vars, save_itr='all')
+
+    for save_layout in ['groups', 'columnar']:
+        res1 = optimize(x0, obj, summary_filename='sync_slsqp.out', save_filename='sync_slsqp.hdf5', 
+                        save_layout=save_layout, **options)
+        # A queue of size 1 makes the optimization wait for the writer
+        res2 = optimize(x0, obj, summary_filename='async_slsqp.out', save_filename='async_slsqp.hdf5', 
+                        save_layout=save_layout, save_async=True, save_queue_size=1, **options)
+        
+        assert 'recorder_write_time' not in res1
+        assert res2['recorder_write_time'] > 0
+        assert res2['recorder_wait_time'] >= 0
+        assert load_results('async_slsqp.hdf5')['recorder_write_time'] == res2['recorder_write_time']
+
+        # Snapshots of the variables are saved, not references to the arrays updated during the optimization
+        sync_data = load_variables('sync_slsqp.hdf5', save_vars)
+        async_data = load_variables('async_slsqp.hdf5', save_vars)
+        for var in save_vars:
+            assert_array_equal(async_data[var], sync_data[var])
+
+    # Errors in the writer thread are raised in the main thread
+    with pytest.raises(RuntimeError):
+        optimize(x0, obj, summary_filename='async_slsqp.out', save_filename='async_slsqp.hdf5', 
+                 save_layout='columnar', save_compression='invalid', save_async=True, **options)
+    
+    with pytest.raises(ValueError):
+        optimize(x0, obj, summary_filename='async_slsqp.out', save_filename='async_slsqp.hdf5', 
+                 save_async=True, save_queue_size=0, **options)
+
+    # If the optimization raises an exception, the queued iterations are written, the writer thread is stopped, 
+    # and the file is closed with the index of the saved iterations
+    import threading
+    import h5py
+    nfev = {'count': 0}
+    def failing_obj(x):
+        nfev['count'] += 1
+        if nfev['count'] == 4:
+            raise RuntimeError("Evaluation failed.")
+        return obj(x)
+    
+    num_threads = threading.active_count()
+    for save_backend in ['hdf5', 'npy']:
+        save_filename = 'async_slsqp.hdf5' if save_backend == 'hdf5' else 'async_slsqp_npy'
+        nfev['count'] = 0
+        # The traceback kept in excinfo keeps the local variables of optimize (including the file) alive
+        with pytest.raises(RuntimeError, match="Evaluation failed.") as excinfo:
+            optimize(x0, failing_obj, summary_filename='async_slsqp.out', save_filename=save_filename, save_backend=save_backend,
+                     save_layout='columnar', save_async=True, **options)
+        assert threading.active_count() == num_threads
+        data = load_variables(save_filename, ['iter', 'majiter'])
+        assert_array_equal(data['iter'], [0, 1, 2, 3])
+        assert_array_equal(data['majiter'], [0, 1, 1, 1])
+        assert_array_equal(load_variables(save_filename, ['iter'], major_only=True)['iter'], [0, 1])
+    # The file can be truncated only if no handle to it is left open
+    h5py.File('async_slsqp.hdf5', 'w').close()
+
+def test_indexed_loading():
+    import h5py
+    import numpy as np
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    from pyslsqp.save_and_load import load_variables
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def coneqineq(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jaceqineq(x):
+        return np.eye(3, 10)
+    
+    x0 = np.ones(10)
+    save_vars = ['x', 'objective', 'constraints', 'jacobian']
+    options = dict(grad=grad, con=coneqineq, jac=jaceqineq, meq=2, xl=0.2, xu=10., acc=1.0E-6, 
+                   x_scaler=0.02, obj_scaler=100., con_scaler=0.02, save_vars=save_vars, save_itr='all')
+    vars = ['iter', 'majiter', 'x', 'x[1]', 'objective', 'constraints', 'jacobian', 'jacobian[1,1]']
+
+    for save_layout in ['groups', 'columnar']:
+        optimize(x0, obj, summary_filename='index_slsqp.out', save_filename='index_slsqp.hdf5', save_layout=save_layout, **options)
+        
+        with h5py.File('index_slsqp.hdf5', 'r') as file:
+            assert file['index']['num_saves'][()] == 11
+            assert_array_equal(file['index']['major_rows'][()], [0, 1, 4, 6, 8, 10])
+            assert_array_equal(file['index']['major_iters'][()], [0, 1, 2, 3, 4, 5])
+
+        # Iterates are returned as stacked arrays
+        data = load_variables('index_slsqp.hdf5', vars, itr_start=1, itr_end=3, major_only=True)
+        assert_array_equal(data['majiter'], [1, 2, 3])
+        assert_array_equal(data['iter'], [1, 4, 6])
+        assert data['x'].shape == (3, 10)
+        assert data['jacobian'].shape == (3, 3, 10)
+        assert_array_equal(data['x[1]'], data['x'][:, 1])
+        assert_array_equal(data['jacobian[1,1]'], [1., 1., 1.])
+        data = load_variables('index_slsqp.hdf5', vars)
+        assert data['constraints'].shape == (11, 3)
+
+        # Files without an index, e.g., from interrupted optimizations, are loaded by scanning the saved iterations
+        indexed_data = [load_variables('index_slsqp.hdf5', vars, **kwargs) for kwargs in [{}, {'major_only': True}]]
+        with h5py.File('index_slsqp.hdf5', 'a') as file:
+            del file['index']
+        for kwargs, data in zip([{}, {'major_only': True}], indexed_data):
+            scanned_data = load_variables('index_slsqp.hdf5', vars, **kwargs)
+            for var in vars:
+                assert_array_equal(scanned_data[var], data[var])
+
+def test_iter_variables():
+    import numpy as np
+    import pytest
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    from pyslsqp.save_and_load import load_variables, iter_variables
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def coneqineq(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jaceqineq(x):
+        return np.eye(3, 10)
+    
+    x0 = np.ones(10)
+    options = dict(grad=grad, con=coneqineq, jac=jaceqineq, meq=2, xl=0.2, xu=10., acc=1.0E-6, 
+                   x_scaler=0.02, obj_scaler=100., con_scaler=0.02, save_vars=['x', 'objective', 'jacobian'], save_itr='all')
+    vars = ['iter', 'x', 'objective', 'jacobian', 'jacobian[2,2]']
+
+    for save_layout in ['groups', 'columnar']:
+        optimize(x0, obj, summary_filename='iter_slsqp.out', save_filename='iter_slsqp.hdf5', save_layout=save_layout, **options)
+        for kwargs in [{}, {'itr_start': 2, 'itr_end': -2}, {'major_only': True}]:
+            data = load_variables('iter_slsqp.hdf5', vars, **kwargs)
+            
+            # One iteration at a time
+            iterates = list(iter_variables('iter_slsqp.hdf5', vars, **kwargs))
+            assert len(iterates) == len(data['iter'])
+            for var in vars:
+                assert_array_equal(np.array([iterate[var] for iterate in iterates]), data[var])
+            
+            # Blocks of iterations
+            for chunk in [1, 4, 100]:
+                blocks = list(iter_variables('iter_slsqp.hdf5', vars, chunk=chunk, **kwargs))
+                assert len(blocks) == -(-len(data['iter']) // chunk)
+                assert all(len(block['x']) <= chunk for block in blocks)
+                for var in vars:
+                    assert_array_equal(np.concatenate([block[var] for block in blocks]), data[var])
+
+        # Statistics over the history without loading all iterations
+        max_abs_jac = 0.
+        for block in iter_variables('iter_slsqp.hdf5', 'jacobian', chunk=3):
+            max_abs_jac = max(max_abs_jac, np.max(np.abs(block['jacobian'])))
+        assert max_abs_jac == 1.
+
+    # The inputs are checked when iter_variables() is called, before the iteration starts
+    with pytest.raises(ValueError):
+        iter_variables('iter_slsqp.hdf5', vars, chunk=0)
+    with pytest.raises(ValueError):
+        iter_variables(1, vars)
+    with pytest.raises(ValueError):
+        iter_variables('iter_slsqp.hdf5', 'gradient')
+    with pytest.raises(ValueError):
+        iter_variables('iter_slsqp.hdf5', vars, itr_start=1000)
+
+def test_npy_backend():
+    import os
+    import sys
+    import subprocess
+    import numpy as np
+    from numpy.testing import assert_array_equal
+    from pyslsqp import optimize
+    from pyslsqp.save_and_load import load_variables, load_results, load_attributes, iter_variables, \
+                                      print_file_contents, NpyFile, get_num_saves
+
+    def obj(x):
+        return np.sum(x**2)
+    def grad(x):
+        return 2*x
+    def coneqineq(x):
+        return np.array([x[0] - 1., x[1] - 3., x[2] - 5.])
+    def jaceqineq(x):
+        return np.eye(3, 10)
+    
+    x0 = np.ones(10)
+    save_vars = ['iter', 'majiter', 'mode', 'x', 'objective', 'constraints', 'gradient', 'jacobian']
+    options = dict(grad=grad, con=coneqineq, jac=jaceqineq, meq=2, xl=0.2, xu=10., acc=1.0E-6, 
+                   x_scaler=0.02, obj_scaler=100., con_scaler=0.02, save_vars=save_vars)
+    vars = ['iter', 'majiter', 'mode', 'x', 'x[1]', 'objective', 'jacobian', 'jacobian[1,1]']
+
+    for save_itr in ['all', 'major']:
+        for save_async in [False, True]:
+            optimize(x0, obj, summary_filename='npy_slsqp.out', save_itr=save_itr, save_filename='npy_slsqp.hdf5', 
+                     save_layout='columnar', save_async=save_async, **options)
+            res = optimize(x0, obj, summary_filename='npy_slsqp.out', save_itr=save_itr, save_filename='npy_slsqp', 
+                           save_backend='npy', save_async=save_async, **options)
+            assert res['save_filename'] == 'npy_slsqp'
+            assert os.path.isdir('npy_slsqp')
+            print_file_contents('npy_slsqp')
+
+            for kwargs in [{}, {'itr_start': -3, 'itr_end': -2}, {'major_only': True}]:
+                hdf5_data = load_variables('npy_slsqp.hdf5', vars, **kwargs)
+                npy_data = load_variables('npy_slsqp', vars, **kwargs)
+                for var in vars:
+                    assert_array_equal(npy_data[var], hdf5_data[var])
+                blocks = list(iter_variables('npy_slsqp', vars, chunk=4, **kwargs))
+                for var in vars:
+                    assert_array_equal(np.concatenate([block[var] for block in blocks]), hdf5_data[var])
+
+            hdf5_results, npy_results = load_results('npy_slsqp.hdf5'), load_results('npy_slsqp')
+            assert hdf5_results.keys() == npy_results.keys()
+            for key in ['x', 'objective', 'jacobian', 'nfev', 'num_majiter', 'success', 'message']:
+                assert_array_equal(npy_results[key], hdf5_results[key])
+            
+            hdf5_attrs, npy_attrs = load_attributes('npy_slsqp.hdf5'), load_attributes('npy_slsqp')
+            assert list(hdf5_attrs.keys()) == list(npy_attrs.keys())
+            assert npy_attrs['save_vars'] == hdf5_attrs['save_vars']
+            assert_array_equal(npy_attrs['x0'], x0)
+
+    # Major iterations with the default saved variables and finite differences
+    res = optimize(x0, obj, con=coneqineq, meq=2, xl=0.2, summary_filename='npy_slsqp.out', 
+                   save_itr='major', save_filename='npy_slsqp_major', save_backend='npy')
+    data = load_variables('npy_slsqp_major', ['x', 'objective', 'majiter', 'ismajor'])
+    assert len(data['x']) == get_num_saves(NpyFile('npy_slsqp_major', 'r')) == res['num_majiter'] + 1
+    assert all(data['ismajor'])
+    assert_array_equal(data['x'][-1], res['x'])
+    assert_array_equal(load_results('npy_slsqp_major')['x'], res['x'])
+
+    # Saved variables are memory-mapped
+    with NpyFile('npy_slsqp', 'r') as file:
+        assert isinstance(file['iterates']['x'], np.memmap)
+
+    # Warm and hot starting from an npy directory
+    optimize(x0, obj, summary_filename='npy_slsqp.out', save_itr='all', save_filename='npy_slsqp', save_backend='npy', **options)
+    res = optimize(x0, obj, summary_filename='npy_slsqp.out', hot_start=True, load_filename='npy_slsqp', 
+                   save_itr='all', save_filename='npy_slsqp', save_backend='npy', **options)
+    assert res['save_filename'] == 'npy_slsqp_hot'
+    assert res['nfev_reused_in_hotstart'] == 6
+    assert res['ngev_reused_in_hotstart'] == 5
+    res = optimize(x0, obj, summary_filename='npy_slsqp.out', warm_start=True, load_filename='npy_slsqp', **options)
+    assert res['num_majiter'] == 1
+
+    # Directories from interrupted optimizations can be loaded
+    file = NpyFile('npy_interrupted', 'w')
+    for k in range(3):
+        file.save_iteration(k, ['x', 'constraints'], {'x': k * np.ones(4), 'constraints': np.zeros(0)})
+    for f in file.var_files.values():
+        f.flush()
+    with NpyFile('npy_interrupted', 'r') as read_file:
+        assert get_num_saves(read_file) == 3
+        assert_array_equal(read_file['iterates']['x'][2], [2., 2., 2., 2.])
+        assert read_file['iterates']['constraints'].shape == (3, 0)
+    file.close()
+
+    # Saving, loading and hot starting without h5py
+    code = '''
+import os
+import sys
+sys.modules['h5py'] = None
+import numpy as np
+from pyslsqp import optimize
+from pyslsqp.postprocessing import load_variables
+def fail(x):
+    raise RuntimeError
+obj = lambda x: np.sum(x**2)
+grad = lambda x: 2*x
+options = dict(xl=0.2, xu=10., iprint=0, save_vars=['x', 'objective', 'constraints', 'gradient', 'jacobian'])
+# The npy backend is used by default if h5py is not installed
+res1 = optimize(np.ones(4), obj, grad=grad, save_itr='all', save_filename='npy_no_h5py', **options)
+assert os.path.isfile(os.path.join('npy_no_h5py', 'header.json'))
+res2 = optimize(np.ones(4), fail, grad=fail, hot_start=True, load_filename='npy_no_h5py', **options)
+assert np.array_equal(res1['x'], res2['x'])
+assert len(load_variables('npy_no_h5py', 'x')['x']) == res1['nfev'] + res1['ngev']
+'''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, '-c', code], check=True, env=env)
+
 if __name__ == '__main__':
     test_save_and_load()
+    test_columnar_layout()
+    test_async_recorder()
+    test_indexed_loading()
+    test_iter_variables()
+    test_npy_backend()